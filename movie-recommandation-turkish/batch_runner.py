@@ -0,0 +1,286 @@
+"""
+Kayıtlı soruları toplu (batch) olarak graftan geçiren çalıştırıcı.
+
+Regresyon kontrolleri ve önceden öneri üretmek için binlerce soruyu Streamlit
+arayüzü olmadan çalıştırmak gerekir. Bu modül:
+
+- Soruları JSONL'den okur (satır başına `{"id": ..., "question": ...}`; `id`
+  verilmezse sorunun hash'i kullanılır).
+- Derlenmiş grafı (`app.ainvoke`) sabit sayıda asenkron işçiyle, sınırlı
+  eşzamanlılıkla çalıştırır.
+- OpenRouter istek limitine takılmamak için tüm LLM çağrılarını paylaşılan bir
+  token bucket'tan geçirir (bkz. rate_limit.py, `--rps`/`--burst`).
+- Her cevabı, intent'i, getirilen filmleri ve node bazında süreleri biten her
+  sorudan hemen sonra çıktı JSONL'ine ekler. Çıktı dosyası aynı zamanda
+  checkpoint'tir: yarıda kalan bir çalıştırma aynı komutla yeniden
+  başlatıldığında tamamlanmış sorular atlanır, hatalı olanlar tekrar denenir.
+  Tekrar denenen soru dosyaya yeni bir satır olarak eklenir; çalıştırma sonunda
+  dosya sıkıştırılır ve her id için sadece son satır kalır (yarıda kalan bir
+  dosyada da aynı id'nin son satırı geçerlidir).
+
+Kullanım:
+    python batch_runner.py questions.jsonl --output answers.jsonl --concurrency 8 --rps 2
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+from typing import Optional
+
+import resources
+
+# Her soru kendi trace'iyle çalışır; node süreleri trace span'lerinden okunur.
+# Gecikme özeti benchmark ile aynı yardımcıyla hesaplanır.
+from instrumentation import start_trace, summarize
+
+
+logger = logging.getLogger(__name__)
+
+# Kaç soruda bir ilerleme loglanacağı.
+PROGRESS_EVERY = 50
+
+
+def item_id(item: dict) -> str:
+    # Açık bir id yoksa soru metninden kararlı bir id türetilir (resume için).
+    if item.get("id") is not None:
+        return str(item["id"])
+    return hashlib.sha1(item["question"].encode("utf-8")).hexdigest()[:16]
+
+
+def load_questions(path: str) -> list[dict]:
+    """JSONL dosyasındaki soruları `{"id", "question"}` sözlükleri olarak okur."""
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            question = (record.get("question") or record.get("message") or "").strip()
+            if not question:
+                logger.warning("%s:%d soru alanı boş, atlandı.", path, line_no)
+                continue
+            items.append({"id": item_id({"id": record.get("id"), "question": question}), "question": question})
+    return items
+
+
+def load_checkpoint(path: str, retry_errors: bool = True) -> set[str]:
+    """Çıktı dosyasında tamamlanmış görünen soru id'leri.
+
+    Args:
+        path: Önceki çalıştırmanın çıktı JSONL'i (yoksa boş küme döner).
+        retry_errors: True ise hatayla biten sorular tamamlanmış sayılmaz.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Süreç yazma sırasında öldüyse son satır yarım kalmış olabilir.
+                continue
+            if record.get("status") == "ok" or not retry_errors:
+                done.add(record["id"])
+    return done
+
+
+def compact_output(path: str) -> int:
+    """Çıktı dosyasında her id için sadece son kaydı bırakır; atılan satır sayısını döndürür.
+
+    Kayıtlar son görüldükleri sırayla yazılır; yarım (bozuk) satırlar da atılır.
+    """
+    records, total = {}, 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            total += 1
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            # Son satır kazanır: önceki kayıt silinip sona yeniden eklenir.
+            records.pop(record["id"], None)
+            records[record["id"]] = line if line.endswith("\n") else line + "\n"
+    dropped = total - len(records)
+    if dropped:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(records.values())
+        os.replace(tmp_path, path)
+    return dropped
+
+
+def _span_timings(trace) -> dict:
+    # Aynı adlı span'lerin (ör. birden çok LLM çağrısı) toplam süresi, ms.
+    timings = {}
+    for record in trace.spans:
+        timings[record["name"]] = timings.get(record["name"], 0.0) + record.get("duration_ms", 0.0)
+    return {name: round(ms, 2) for name, ms in timings.items()}
+
+
+async def run_item(app, item: dict, timeout: Optional[float] = None) -> dict:
+    """Tek bir soruyu grafta çalıştırıp çıktı kaydını üretir (hata fırlatmaz)."""
+    from graph.state import GraphState
+
+    record = {"id": item["id"], "question": item["question"]}
+    started = time.perf_counter()
+    trace = None
+    try:
+        with start_trace(batch_id=item["id"], message_chars=len(item["question"])) as trace:
+            with resources.snapshot_lease():
+                state = await asyncio.wait_for(app.ainvoke(GraphState(message=item["question"])), timeout)
+    except Exception as e:
+        record.update(status="error", error=f"{type(e).__name__}: {e}")
+    else:
+        movies = []
+        for doc in state.get("retrieved_docs") or []:
+            name = doc.metadata.get("name")
+            if name and name not in movies:
+                movies.append(name)
+        record.update(
+            status="ok",
+            intent=state.get("intent"),
+            answer=state.get("answer"),
+            movies=movies,
+        )
+    record["trace_id"] = trace.trace_id if trace else None
+    record["seconds"] = round(time.perf_counter() - started, 4)
+    record["timings_ms"] = _span_timings(trace) if trace else {}
+    return record
+
+
+async def run_batch(
+    items: list[dict],
+    output_path: str,
+    concurrency: int = 8,
+    app=None,
+    timeout: Optional[float] = None,
+    retry_errors: bool = True,
+) -> dict:
+    """Soruları sınırlı eşzamanlılıkla çalıştırır, sonuçları `output_path`'e ekler.
+
+    Args:
+        items: `load_questions` çıktısı.
+        output_path: Sonuç JSONL'i; varsa checkpoint olarak okunur ve sona eklenir.
+            Çalıştırma sonunda her id için tek (son) satır kalacak şekilde sıkıştırılır.
+        concurrency: Aynı anda çalışan soru sayısı.
+        app: Derlenmiş graf; verilmezse `graph.graph.app`.
+        timeout: Soru başına süre sınırı (saniye).
+        retry_errors: Önceki çalıştırmada hatalı biten soruları tekrar dene.
+
+    Returns:
+        Çalıştırmanın özeti (sayılar, süre, soru/sn, gecikme yüzdelikleri).
+    """
+    if app is None:
+        from graph.graph import app
+
+    done = load_checkpoint(output_path, retry_errors)
+    pending, seen = [], set(done)
+    for item in items:
+        if item["id"] not in seen:
+            seen.add(item["id"])
+            pending.append(item)
+    logger.info("%d soru: %d tamamlanmış, %d çalıştırılacak.", len(items), len(done), len(pending))
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in pending:
+        queue.put_nowait(item)
+
+    counts = {"ok": 0, "error": 0}
+    latencies = []
+    started = time.perf_counter()
+
+    directory = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(directory, exist_ok=True)
+    with open(output_path, "a", encoding="utf-8") as out:
+
+        async def worker():
+            while True:
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                record = await run_item(app, item, timeout)
+                # Tek event loop'ta çalıştığımız için yazmalar birbirine karışmaz;
+                # flush ile her satır hemen diske iner (checkpoint).
+                out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                out.flush()
+                counts[record["status"]] += 1
+                latencies.append(record["seconds"])
+                finished = counts["ok"] + counts["error"]
+                if finished % PROGRESS_EVERY == 0:
+                    rate = finished / (time.perf_counter() - started)
+                    logger.info(
+                        "%d/%d tamamlandı (%d hata), %.2f soru/sn, kalan ~%.0f sn",
+                        finished, len(pending), counts["error"], rate, (len(pending) - finished) / rate,
+                    )
+
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
+    # Tekrar denenen sorular aynı id ile birden çok satır bıraktı; son satırlar tutulur.
+    dropped = compact_output(output_path)
+    if dropped:
+        logger.info("Çıktı dosyası sıkıştırıldı: %d eski satır atıldı.", dropped)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "questions": len(items),
+        "skipped": len(items) - len(pending),
+        "ok": counts["ok"],
+        "errors": counts["error"],
+        "seconds": round(elapsed, 2),
+        "questions_per_sec": len(pending) / elapsed if pending and elapsed else None,
+        "latency": summarize(latencies),
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="JSONL'deki soruları RAG grafından toplu geçirir.")
+    parser.add_argument("input", help="Soru dosyası (JSONL, satır başına {\"id\", \"question\"}).")
+    parser.add_argument("--output", default="batch_results.jsonl", help="Sonuç/checkpoint JSONL dosyası.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Aynı anda çalışan soru sayısı.")
+    parser.add_argument("--rps", type=float, default=resources.llm_requests_per_second,
+                        help="LLM istek hızı sınırı (istek/sn); 0 sınırsız.")
+    parser.add_argument("--burst", type=int, default=resources.llm_burst,
+                        help="Token bucket kapasitesi (beklemeden yapılabilecek istek sayısı).")
+    parser.add_argument("--timeout", type=float, default=None, help="Soru başına süre sınırı (saniye).")
+    parser.add_argument("--limit", type=int, default=None, help="Sadece ilk N soruyu çalıştır.")
+    parser.add_argument("--no-retry-errors", action="store_true", help="Önceki çalıştırmada hatalı biten soruları atla.")
+    parser.add_argument("--speculative", action="store_true", help="Spekülatif retrieval grafını kullan.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    # Limiter, LLM istemcisi ilk kez oluşturulmadan önce ayarlanmalıdır.
+    if args.rps > 0:
+        from rate_limit import TokenBucket
+        resources.get_rate_limiter.override(TokenBucket(args.rps, args.burst))
+
+    items = load_questions(args.input)[:args.limit]
+
+    from graph.graph import sequential_app, speculative_app
+    app = speculative_app if args.speculative else sequential_app
+
+    summary = asyncio.run(run_batch(
+        items,
+        args.output,
+        concurrency=args.concurrency,
+        app=app,
+        timeout=args.timeout,
+        retry_errors=not args.no_retry_errors,
+    ))
+
+    latency = summary["latency"]
+    print(f"✅ {summary['ok']} başarılı, {summary['errors']} hatalı, {summary['skipped']} önceden tamamlanmış.")
+    if latency["count"]:
+        print(f"⏱️  {summary['seconds']} sn, p50 {latency['p50_ms']:.0f} ms, p95 {latency['p95_ms']:.0f} ms")
+    print(f"💾 Sonuçlar: {os.path.abspath(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,693 @@
+"""
+Ağ bağlantısı gerektirmeyen (offline) uçtan uca RAG benchmark'ı.
+
+`graph/graph.py`, `movie_retrieve` veya ingestion'daki bir değişikliğin
+performansa etkisini ölçmek için kullanılır. Her çalıştırma:
+
+1. Sabit tohumlu (seed) küçük bir sentetik film/yorum korpusu üretir.
+   Yorum sayıları çarpık dağılımlıdır; birkaç popüler filmde çok yorum vardır.
+2. Korpusu geçici bir dizinde `ingestion.sync_movie_db` ile ingest eder
+   (chunk/sn ölçülür).
+3. Route (intent tespiti), retrieve ve generate adımlarının gecikmelerini ayrı
+   ayrı, tüm grafın gecikmesini ise p50/p95/p99 olarak ölçer.
+4. Farklı eşzamanlılık seviyelerinde (asenkron `ainvoke`) throughput ölçer.
+5. Her aşamadan sonra sürecin en yüksek bellek kullanımını (peak RSS) kaydeder.
+6. `--compare-backends` ile Chroma ve bellek eşlemeli (mmap) vektör depolarını
+   karşılaştırır: her arka uç ayrı süreçlerde ingest edilip sorgulanır; depoyu
+   açmanın bellek maliyeti (RSS artışı), disk boyutu, açılış süresi ve arama
+   gecikmeleri (filtresiz, film seviyesi, film filtreli) kaydedilir.
+7. `--serve-load` ile HTTP servisini (serve.py) aynı süreçte başlatıp
+   `/v1/retrieve` ve `/v1/ask` uç noktalarını eşzamanlı istemcilerle yükler;
+   sorgu embedding mikro batch'i kapalıyken ve açıkken throughput karşılaştırılır.
+
+`ChatOpenRouter` yerine deterministik bir sahte LLM kullanılır (gecikmesi
+ayarlanabilir). `--fake-embedder` ile BERT modeli yerine hash tabanlı sahte bir
+embedder kullanılır; bu durumda model indirmeye de gerek kalmaz. Text splitter'ın ve
+bağlam bütçesinin tiktoken kodlaması (gpt2) ilk kullanımda indirilir; yerel önbellekte
+(TIKTOKEN_CACHE_DIR) yoksa ya da `--fake-tokenizer` verilirse yerine metni kelime
+parçalarına bölen yaklaşık bir sahte tokenizer kullanılır (sonuçlarda `tokenizer`).
+
+Sonuçlar JSON olarak yazılır; iki çalıştırma dosyaları karşılaştırılarak
+kıyaslanabilir.
+
+Kullanım:
+    python benchmark.py --fake-embedder --output bench.json
+    python benchmark.py --fake-embedder --fake-tokenizer
+    python benchmark.py --movies 500 --concurrency 1 8 32 --llm-latency 200
+    python benchmark.py --fake-embedder --movies 2000 --compare-backends --dtype int8
+    python benchmark.py --fake-embedder --embed-latency 20 --embed-item-latency 1 --serve-load
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import tempfile
+import threading
+import multiprocessing
+import platform
+import subprocess
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from pydantic import PrivateAttr
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+import resources
+from text_utils import normalize_phrase
+# Gecikme yüzdelikleri batch çalıştırıcıyla ortak yardımcıdan gelir.
+from instrumentation import summarize
+
+
+# ---- sahte modeller ----
+
+class FakeChatModel(BaseChatModel):
+    """Ağa çıkmadan deterministik cevap üreten sohbet modeli.
+
+    Cevap, prompt'taki ilk film adından ve prompt'un hash'inden türetilir; aynı
+    prompt her zaman aynı cevabı verir. `latency` ilk token'a kadar geçen süreyi,
+    `token_delay` token'lar arası süreyi (saniye) taklit eder.
+    """
+
+    latency: float = 0.0
+    token_delay: float = 0.0
+    reply_words: int = 60
+    _calls: int = PrivateAttr(default=0)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark"
+
+    @property
+    def calls(self) -> int:
+        return self._calls
+
+    def _reply(self, messages) -> str:
+        self._calls += 1
+        prompt = "\n".join(str(m.content) for m in messages)
+        match = re.search(r"\[Film: ([^\]]+)\]", prompt)
+        seed = int(hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8], 16)
+        head = f"Bağlama göre {match.group(1)} filmini öneririm." if match else "Size yardımcı olmaktan memnuniyet duyarım."
+        filler = [SENTENCES[(seed + i) % len(SENTENCES)] for i in range(self.reply_words // 6)]
+        return " ".join([head, *filler])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        for word in self._reply(messages).split(" "):
+            time.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        for word in self._reply(messages).split(" "):
+            await asyncio.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def with_structured_output(self, schema, **kwargs):
+        # Router için: son kullanıcı mesajında film kelimesi varsa film_query.
+        from intent import FILM_QUERY, GENERAL_CHAT
+        from graph.chains.fast_intent import FILM_STEMS, FILM_NOUNS
+
+        def decide_intent(prompt_value):
+            self._calls += 1
+            words = normalize_phrase(prompt_value.to_messages()[-1].content).split()
+            film = any(w.startswith(tuple(normalize_phrase(s) for s in FILM_STEMS + FILM_NOUNS)) for w in words)
+            return schema(intent=FILM_QUERY if film else GENERAL_CHAT)
+
+        def decide(prompt_value):
+            time.sleep(self.latency)
+            return decide_intent(prompt_value)
+
+        async def adecide(prompt_value):
+            await asyncio.sleep(self.latency)
+            return decide_intent(prompt_value)
+
+        return RunnableLambda(decide, afunc=adecide)
+
+
+class HashingEmbeddings(Embeddings):
+    """Kelime köklerini sabit boyutlu vektöre hash'leyen sahte embedder.
+
+    Ağ ve model gerektirmez, deterministiktir ve ortak kelimesi olan metinleri
+    birbirine yakın yerleştirir; retrieval akışının maliyeti gerçekçi kalır.
+
+    `call_latency`/`item_latency` verilirse BERT'in CPU maliyeti taklit edilir:
+    her çağrı sabit + metin başına süre harcar ve model tek bir paylaşılan
+    kaynak gibi çağrıları sırayla işler (mikro batch'in etkisini ölçmek için).
+    """
+
+    def __init__(self, dim: int = 384, call_latency: float = 0.0, item_latency: float = 0.0):
+        self.dim = dim
+        self.model_name = f"hashing-{dim}"
+        self.call_latency = call_latency
+        self.item_latency = item_latency
+        self._busy = threading.Lock()
+
+    def _cost(self, n: int) -> None:
+        if self.call_latency or self.item_latency:
+            with self._busy:
+                time.sleep(self.call_latency + self.item_latency * n)
+
+    def _embed(self, text: str) -> list[float]:
+        vector = [0.0] * self.dim
+        for word in normalize_phrase(text).split():
+            digest = hashlib.md5(word[:5].encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self._cost(len(texts))
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        self._cost(1)
+        return self._embed(text)
+
+
+class ApproxTokenEncoder:
+    """tiktoken kodlayıcısının yerine geçen, ağ gerektirmeyen yaklaşık tokenizer.
+
+    Metni (baştaki boşluğuyla) en fazla 4 harflik kelime parçalarına, noktalama
+    işaretlerine ve boşluk dizilerine böler; token'lar metin parçalarıdır ve
+    `decode` onları birleştirir. Türkçe metinde BPE token sayısına yakın sonuç verir;
+    splitter, bağlam bütçesi ve konuşma hafızası aynı birimle saymaya devam eder.
+    """
+
+    name = "approx"
+    _PIECE = re.compile(r"\s?\w{1,4}|\s?[^\w\s]|\s+")
+
+    def encode(self, text: str, **kwargs) -> list[str]:
+        return self._PIECE.findall(text)
+
+    def decode(self, tokens: list[str]) -> str:
+        return "".join(tokens)
+
+
+def use_token_encoder(fake: bool) -> str:
+    """Text splitter ve bağlam bütçesinin kodlayıcısını hazırlar; kullanılanın adını döndürür.
+
+    `fake` değilse tiktoken kodlaması yüklenmeye çalışılır; yüklenemezse (önbellekte yok ve
+    ağ yok) `ApproxTokenEncoder`a düşülür.
+    """
+    if not fake:
+        try:
+            return resources.get_token_encoder().name
+        except Exception as e:
+            print(f"⚠️ tiktoken kodlaması ({resources.splitter_encoding}) yüklenemedi ({e!r}); "
+                  f"yaklaşık tokenizer kullanılıyor.")
+    resources.get_token_encoder.override(ApproxTokenEncoder())
+    return ApproxTokenEncoder.name
+
+
+# ---- sentetik korpus ----
+
+GENRES = ["Dram", "Komedi", "Bilim Kurgu", "Korku", "Aksiyon", "Romantik", "Animasyon", "Gerilim"]
+FIRST_NAMES = ["Ahmet", "Zeynep", "Mehmet", "Elif", "Can", "Ayşe", "Emre", "Deniz", "Selin", "Burak"]
+LAST_NAMES = ["Yılmaz", "Kaya", "Demir", "Şahin", "Çelik", "Öztürk", "Aydın", "Arslan", "Doğan", "Koç"]
+TITLE_WORDS = [
+    "Gölge", "Rüzgar", "Deniz", "Yıldız", "Sessiz", "Son", "Kayıp", "Kırmızı", "Gece",
+    "Zaman", "Şehir", "Ayna", "Sır", "Yol", "Ateş", "Bulut", "Dağ", "Köprü", "Işık", "Anı",
+]
+SENTENCES = [
+    "Oyunculuklar gerçekten etkileyiciydi.",
+    "Senaryo bazı yerlerde temposunu kaybediyor.",
+    "Görüntü yönetmenliği çok başarılı.",
+    "Müzikler sahnelerin duygusunu güçlendiriyor.",
+    "Final sahnesi beklenmedik bir şekilde bitiyor.",
+    "Karakterlerin gelişimi inandırıcı ve derin.",
+    "İkinci yarısı biraz uzun gelebilir.",
+    "Aileyle izlemek için uygun bir yapım.",
+    "Gerilim dozu film boyunca hiç düşmüyor.",
+    "Diyaloglar esprili ve akılda kalıcı.",
+    "Özel efektler dönemine göre oldukça iyi.",
+    "Hikaye tanıdık olsa da anlatımı taze.",
+]
+
+
+def synthetic_corpus(n_movies: int, seed: int = 42) -> list[dict]:
+    """`ingestion.iter_movies` formatında sabit tohumlu sentetik filmler üretir."""
+    rng = random.Random(seed)
+    directors = [f"{f} {l}" for f in FIRST_NAMES for l in LAST_NAMES]
+    movies = []
+    for i in range(n_movies):
+        name = f"{rng.choice(TITLE_WORDS)} {rng.choice(TITLE_WORDS)} {i}"
+        genres = rng.sample(GENRES, rng.randint(1, 2))
+        desc = f"{name}, {' ve '.join(genres).lower()} türünde bir film. " + " ".join(
+            rng.choice(SENTENCES) for _ in range(rng.randint(4, 10))
+        )
+        # Çarpık dağılım: filmlerin çoğunda birkaç yorum, azında yüzlerce yorum var.
+        n_reviews = min(int(rng.paretovariate(1.2) * 3), 300)
+        reviews = [
+            {"review": " ".join(rng.choice(SENTENCES) for _ in range(rng.randint(3, 40))), "rating": rng.randint(1, 10)}
+            for _ in range(n_reviews)
+        ]
+        movies.append({
+            "name": name,
+            "url": f"https://example.invalid/film/{i}",
+            "genre": genres,
+            "directors": [rng.choice(directors)],
+            "rating": {"totalRating": round(rng.uniform(3, 9.5), 1)},
+            "desc": desc,
+            "reviews": reviews,
+        })
+    return movies
+
+
+def synthetic_queries(movies: list[dict], n: int, seed: int = 7) -> list[str]:
+    """Film adı, yönetmen, tür/puan filtresi ve sohbet mesajlarından oluşan sorgu seti."""
+    rng = random.Random(seed)
+    templates = [
+        lambda m: f"{m['name']} yorumları nasıl?",
+        lambda m: f"{m['directors'][0]} filmlerinden ne önerirsin?",
+        lambda m: f"{rng.randint(5, 8)} üzeri {m['genre'][0].lower()} filmi öner",
+        lambda m: f"{m['name']} konusu ne?",
+        lambda m: f"Bu akşam izlemek için {m['genre'][0].lower()} bir şey arıyorum",
+        lambda m: "Merhaba",
+        lambda m: "Teşekkürler, görüşürüz",
+    ]
+    return [rng.choice(templates)(rng.choice(movies)) for _ in range(n)]
+
+
+# ---- ölçüm yardımcıları ----
+
+def peak_rss_mb() -> Optional[float]:
+    # Sürecin şimdiye kadarki en yüksek bellek kullanımı (Linux'ta KB, macOS'ta byte).
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def current_rss_mb() -> Optional[float]:
+    # Sürecin şu anki bellek kullanımı (Linux'ta /proc); okunamazsa en yüksek değer.
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_mb()
+
+
+def _dir_size_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / (1024 * 1024)
+
+
+def _timed(func, *args, **kwargs) -> tuple[Any, float]:
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ---- benchmark aşamaları ----
+
+def bench_nodes(queries: list[str], repeat: int) -> dict:
+    # Route, retrieve ve generate adımlarını tek tek ölçer.
+    from graph.state import GraphState
+    from graph.graph import detect_intent
+    from graph.nodes.retrieve import movie_retrieve
+    from graph.nodes.generate import generate
+    from intent import FILM_QUERY
+
+    timings = {"route": [], "retrieve": [], "generate": []}
+    for _ in range(repeat):
+        for query in queries:
+            state = GraphState(message=query)
+            intent, seconds = _timed(detect_intent, state)
+            timings["route"].append(seconds)
+            if intent != FILM_QUERY:
+                continue
+            retrieved, seconds = _timed(movie_retrieve, state)
+            timings["retrieve"].append(seconds)
+            _, seconds = _timed(generate, GraphState(**retrieved))
+            timings["generate"].append(seconds)
+    return {node: summarize(values) for node, values in timings.items()}
+
+
+def bench_end_to_end(app, queries: list[str], repeat: int) -> dict:
+    from graph.state import GraphState
+
+    latencies = []
+    for _ in range(repeat):
+        for query in queries:
+            _, seconds = _timed(app.invoke, GraphState(message=query))
+            latencies.append(seconds)
+    return summarize(latencies)
+
+
+async def _throughput(app, queries: list[str], concurrency: int, requests: int) -> dict:
+    from graph.state import GraphState
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(query: str):
+        async with semaphore:
+            started = time.perf_counter()
+            await app.ainvoke(GraphState(message=query))
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(queries[i % len(queries)]) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    return {"concurrency": concurrency, "requests": requests, "qps": requests / elapsed, **summarize(latencies)}
+
+
+def bench_throughput(app, queries: list[str], levels: list[int]) -> list[dict]:
+    return [
+        asyncio.run(_throughput(app, queries, level, max(level * 4, len(queries))))
+        for level in levels
+    ]
+
+
+def _vector_worker(task: str, backend: str, dtype: str, workdir: str, data_file: str, queries: list[str],
+                   repeat: int, fake_embedder: bool, fake_tokenizer: bool, queue) -> None:
+    # Ayrı (spawn) bir süreçte çalışır; böylece bir arka ucun belleği diğerinin ölçümüne karışmaz.
+    try:
+        if fake_embedder:
+            resources.get_hf_embedding.override(HashingEmbeddings())
+        if fake_tokenizer:
+            resources.get_token_encoder.override(ApproxTokenEncoder())
+        os.chdir(workdir)
+        resources.set_vector_backend(backend, dtype)
+        if task == "ingest":
+            import ingestion
+            stats, seconds = _timed(ingestion.sync_movie_db, True, data_file, snapshot=False)
+            queue.put({"ingest_seconds": seconds, "chunks_per_sec": stats["chunks_per_sec"]})
+            return
+
+        from retrieval import CANDIDATES, CANDIDATE_MOVIES, CHUNKS_PER_MOVIE, CHUNK_OVERFETCH
+        # Sorgu vektörleri depo açılmadan hesaplanır; RSS farkı sadece depoya ait olsun.
+        embedding = resources.get_embedding()
+        vectors = [embedding.embed_query(query) for query in queries]
+        rss_before = current_rss_mb()
+
+        started = time.perf_counter()
+        store = resources.get_vectorstore()
+        movie_store = resources.get_movie_level_store()
+        movie_store.similarity_search_by_vector(vectors[0], k=CANDIDATE_MOVIES)
+        store.similarity_search_by_vector(vectors[0], k=CANDIDATES)
+        open_seconds = time.perf_counter() - started
+
+        timings = {"chunk_search": [], "movie_search": [], "candidate_chunk_search": []}
+        for _ in range(repeat):
+            for vector in vectors:
+                _, seconds = _timed(lambda: store.similarity_search_by_vector(vector, k=CANDIDATES))
+                timings["chunk_search"].append(seconds)
+                movies, seconds = _timed(lambda: movie_store.similarity_search_by_vector(vector, k=CANDIDATE_MOVIES))
+                timings["movie_search"].append(seconds)
+                # Aday filmlerle sınırlı, fazladan sonuç isteyen ortak chunk araması
+                # (retrieval._vector_candidates gibi; eksik kalan filmlerin ayrı aramaları hariç).
+                movie_ids = list(dict.fromkeys(movie.metadata.get("movie_id") for movie in movies))
+                _, seconds = _timed(lambda: store.similarity_search_by_vector(
+                    vector, k=CHUNKS_PER_MOVIE * max(1, len(movie_ids)) * CHUNK_OVERFETCH,
+                    filter={"movie_id": {"$in": movie_ids}},
+                ))
+                timings["candidate_chunk_search"].append(seconds)
+        rss_after = current_rss_mb()
+        queue.put({
+            "open_seconds": open_seconds,
+            "rss_before_mb": rss_before,
+            "rss_after_mb": rss_after,
+            "rss_delta_mb": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+            "disk_mb": _dir_size_mb(resources.vector_db_path()),
+            **{name: summarize(values) for name, values in timings.items()},
+        })
+    except Exception as e:
+        queue.put({"error": repr(e)})
+
+
+def _in_subprocess(*args) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_vector_worker, args=(*args, queue))
+    process.start()
+    process.join()
+    return queue.get() if not queue.empty() else {"error": f"işçi süreç {process.exitcode} koduyla çıktı"}
+
+
+def bench_vector_backends(args, workdir: str, data_file: str, queries: list[str]) -> dict:
+    """Chroma ve mmap vektör depolarını aynı korpus ve sorgularla karşılaştırır."""
+    results = {}
+    for backend in ("chroma", "mmap"):
+        backend_dir = os.path.join(workdir, "backends", backend)
+        os.makedirs(backend_dir, exist_ok=True)
+        common = (backend, args.dtype, backend_dir, data_file, queries, args.repeat, args.fake_embedder,
+                  args.fake_tokenizer)
+        results[backend] = {**_in_subprocess("ingest", *common), **_in_subprocess("query", *common)}
+    return results
+
+
+def _histogram_totals(name: str) -> tuple[float, int]:
+    # Histogramın tüm etiketlerdeki toplamı ve gözlem sayısı.
+    from instrumentation import metrics
+
+    series = metrics.snapshot()["histograms"].get(name, [])
+    return sum(h["sum"] for h in series), sum(h["count"] for h in series)
+
+
+def _router_summary() -> dict:
+    # `router_decisions_total` sayacından kaynak bazında karar sayıları ve LLM'in atlanma oranı.
+    from instrumentation import metrics
+
+    series = metrics.snapshot()["counters"].get("router_decisions_total", [])
+    by_source = {c["labels"]["source"]: int(c["value"]) for c in series}
+    total = sum(by_source.values())
+    llm_calls = by_source.get("llm", 0)
+    return {
+        "total": total,
+        "skipped": total - llm_calls,
+        "llm_calls": llm_calls,
+        "skip_rate": (total - llm_calls) / total if total else 0.0,
+        "by_source": by_source,
+    }
+
+
+async def _serve_load(graph, queries: list[str], endpoint: str, concurrency: int, requests: int, tag: str) -> dict:
+    # Servisi geçici bir portta başlatıp uç noktaya `concurrency` eşzamanlı istemciyle yük verir.
+    from tornado.httpclient import AsyncHTTPClient
+    from tornado.httpserver import HTTPServer
+    from tornado.netutil import bind_sockets
+    import serve
+
+    sockets = bind_sockets(0, "127.0.0.1")
+    server = HTTPServer(serve.make_app(graph))
+    server.add_sockets(sockets)
+    url = f"http://127.0.0.1:{sockets[0].getsockname()[1]}{endpoint}"
+    client = AsyncHTTPClient(force_instance=True, max_clients=concurrency)
+    field = "query" if endpoint.endswith("retrieve") else "message"
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i: int):
+        nonlocal errors
+        # Her istek farklı metin gönderir; embedding önbelleği ölçümü bozmasın.
+        body = json.dumps({field: f"{queries[i % len(queries)]} ({tag}-{i})"})
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.fetch(url, method="POST", body=body, raise_error=False, request_timeout=120)
+            latencies.append(time.perf_counter() - started)
+            errors += response.code != 200
+
+    batch_sum, batch_count = _histogram_totals("embedding_batch_size")
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    batch_sum, batch_count = (a - b for a, b in zip(_histogram_totals("embedding_batch_size"), (batch_sum, batch_count)))
+    client.close()
+    server.stop()
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "qps": requests / elapsed,
+        "mean_embed_batch": batch_sum / batch_count if batch_count else None,
+        **summarize(latencies),
+    }
+
+
+def bench_server(args, app, queries: list[str]) -> dict:
+    """HTTP servisini mikro batch kapalı (1) ve açık (`--embed-batch-size`) yükler."""
+    results = {}
+    for batch_size in (1, args.embed_batch_size):
+        # Embedding nesnesi (ve onu tutan depolar) yeni batch ayarıyla yeniden kurulur.
+        resources.embedding_batch_size = batch_size
+        resources.embedding_batch_wait_ms = args.embed_batch_wait
+        for resource in (resources.get_embedding, resources.get_vectorstore,
+                         resources.get_movie_level_store, resources.get_movie_retriever):
+            resource.cache_clear()
+        results[f"batch_{batch_size}"] = [
+            asyncio.run(_serve_load(app, queries, endpoint, args.server_concurrency, args.server_requests,
+                                    f"b{batch_size}"))
+            for endpoint in ("/v1/retrieve", "/v1/ask")
+        ]
+    return results
+
+
+def run(args) -> dict:
+    """Tüm aşamaları çalıştırıp sonuç sözlüğünü döndürür."""
+    llm = FakeChatModel(latency=args.llm_latency / 1000, token_delay=args.token_delay / 1000)
+    resources.get_llm.override(llm)
+    if args.fake_embedder:
+        resources.get_hf_embedding.override(HashingEmbeddings(
+            call_latency=args.embed_latency / 1000, item_latency=args.embed_item_latency / 1000
+        ))
+    tokenizer = use_token_encoder(args.fake_tokenizer)
+    # Ayrı süreçlerde çalışan arka uç karşılaştırması da aynı kodlayıcıyı kullansın.
+    args.fake_tokenizer = tokenizer == ApproxTokenEncoder.name
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="movie-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    # Tüm yollar (./.chroma/...) görelidir; çalışma dizinini değiştirerek benchmark'ın
+    # gerçek veritabanına dokunmamasını sağlıyoruz.
+    os.chdir(workdir)
+    resources.set_vector_backend(args.backend, args.dtype)
+
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "tokenizer": tokenizer,
+        "memory_peak_rss_mb": {},
+    }
+
+    movies = synthetic_corpus(args.movies, seed=args.seed)
+    data_file = os.path.join(workdir, "movies.jsonl")
+    with open(data_file, "w", encoding="utf-8") as f:
+        for movie in movies:
+            f.write(json.dumps(movie, ensure_ascii=False) + "\n")
+    results["corpus"] = {"movies": len(movies), "reviews": sum(len(m["reviews"]) for m in movies)}
+
+    import ingestion
+    results["ingestion"] = ingestion.sync_movie_db(full=True, path=data_file, workers=args.workers, snapshot=False)
+    results["memory_peak_rss_mb"]["ingestion"] = peak_rss_mb()
+
+    from graph.graph import sequential_app, speculative_app
+    app = speculative_app if args.speculative else sequential_app
+    queries = synthetic_queries(movies, args.queries, seed=args.seed)
+
+    # İlk çağrılar (önbellek/prototip hazırlığı) ölçümü bozmasın diye ısınma turu.
+    bench_end_to_end(app, queries[:min(5, len(queries))], 1)
+    llm_calls_before = llm.calls
+
+    results["nodes"] = bench_nodes(queries, args.repeat)
+    results["memory_peak_rss_mb"]["nodes"] = peak_rss_mb()
+    results["end_to_end"] = bench_end_to_end(app, queries, args.repeat)
+    results["memory_peak_rss_mb"]["end_to_end"] = peak_rss_mb()
+    results["throughput"] = bench_throughput(app, queries, args.concurrency)
+    results["memory_peak_rss_mb"]["throughput"] = peak_rss_mb()
+
+    results["llm_calls"] = llm.calls - llm_calls_before
+    results["router"] = _router_summary()
+    results["embedding_cache"] = resources.get_embedding().stats()
+
+    from instrumentation import metrics
+    results["metrics"] = metrics.snapshot()
+
+    if args.compare_backends:
+        results["vector_backends"] = bench_vector_backends(args, workdir, data_file, queries)
+    if args.serve_load:
+        results["server"] = bench_server(args, app, queries)
+    return results
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Offline RAG graf benchmark'ı.")
+    parser.add_argument("--movies", type=int, default=200, help="Sentetik film sayısı.")
+    parser.add_argument("--queries", type=int, default=50, help="Sorgu seti büyüklüğü.")
+    parser.add_argument("--repeat", type=int, default=2, help="Gecikme ölçümünde sorgu setinin tekrar sayısı.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="Throughput seviyeleri.")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Sahte LLM'in ilk token gecikmesi (ms).")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Sahte LLM'in token arası gecikmesi (ms).")
+    parser.add_argument("--fake-embedder", action="store_true", help="BERT yerine hash tabanlı sahte embedder.")
+    parser.add_argument("--fake-tokenizer", action="store_true",
+                        help="tiktoken (gpt2) yerine ağ gerektirmeyen yaklaşık tokenizer.")
+    parser.add_argument("--embed-latency", type=float, default=0.0,
+                        help="Sahte embedder'ın çağrı başı gecikmesi (ms).")
+    parser.add_argument("--embed-item-latency", type=float, default=0.0,
+                        help="Sahte embedder'ın metin başı gecikmesi (ms).")
+    parser.add_argument("--speculative", action="store_true", help="Spekülatif retrieval grafını ölç.")
+    parser.add_argument("--workers", type=int, default=1, help="Ingestion embedding süreç sayısı.")
+    parser.add_argument("--seed", type=int, default=42, help="Korpus ve sorgular için tohum.")
+    parser.add_argument("--backend", choices=["chroma", "mmap"], default="chroma", help="Vektör deposu arka ucu.")
+    parser.add_argument("--dtype", choices=["float16", "int8"], default="float16", help="mmap deposunda vektör tipi.")
+    parser.add_argument("--compare-backends", action="store_true",
+                        help="Chroma ve mmap depolarının bellek/gecikme karşılaştırması.")
+    parser.add_argument("--serve-load", action="store_true",
+                        help="HTTP servisini mikro batch kapalı/açık yük testinden geçir.")
+    parser.add_argument("--embed-batch-size", type=int, default=16, help="Yük testinde mikro batch boyutu.")
+    parser.add_argument("--embed-batch-wait", type=float, default=5.0, help="Mikro batch bekleme süresi (ms).")
+    parser.add_argument("--server-concurrency", type=int, default=32, help="Yük testindeki eşzamanlı istemci.")
+    parser.add_argument("--server-requests", type=int, default=200, help="Uç nokta başına istek sayısı.")
+    parser.add_argument("--workdir", default=None, help="Geçici veritabanı dizini (varsayılan: yeni geçici dizin).")
+    parser.add_argument("--output", default="benchmark_results.json", help="Sonuç JSON dosyası.")
+    args = parser.parse_args(argv)
+    if args.fake_embedder and args.workers > 1:
+        parser.error("--workers > 1 işçi süreçlerde gerçek modeli yükler; --fake-embedder ile kullanılamaz.")
+
+    output = os.path.abspath(args.output)
+    results = run(args)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    e2e = results["end_to_end"]
+    print(f"📊 Uçtan uca: p50 {e2e['p50_ms']:.1f} ms, p95 {e2e['p95_ms']:.1f} ms, p99 {e2e['p99_ms']:.1f} ms")
+    for row in results["throughput"]:
+        print(f"   eşzamanlılık {row['concurrency']:>3}: {row['qps']:.1f} istek/sn")
+    for name, rows in results.get("server", {}).items():
+        for row in rows:
+            print(f"🌐 {name} {row['endpoint']}: {row['qps']:.1f} istek/sn, p95 {row['p95_ms']:.0f} ms, "
+                  f"ort. embedding batch {row['mean_embed_batch'] or 1:.1f}, {row['errors']} hata")
+    for backend, row in results.get("vector_backends", {}).items():
+        if "error" in row:
+            print(f"🧮 {backend}: hata: {row['error']}")
+            continue
+        print(
+            f"🧮 {backend}: RSS +{row['rss_delta_mb'] or 0:.1f} MB, disk {row['disk_mb']:.1f} MB, "
+            f"açılış {row['open_seconds'] * 1000:.0f} ms, chunk araması p50 {row['chunk_search']['p50_ms']:.2f} ms, "
+            f"film filtreli p50 {row['candidate_chunk_search']['p50_ms']:.2f} ms"
+        )
+    print(f"💾 Sonuçlar: {output}")
+
+
+if __name__ == "__main__":
+    main()
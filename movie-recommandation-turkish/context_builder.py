@@ -0,0 +1,198 @@
+"""
+Token bütçeli bağlam (context) paketleyici.
+
+`movie_retrieve` getirilen chunk'ları LLM prompt'una koymadan önce bu modülden
+geçirir. Eski biçimde her chunk için tür/yönetmen/puan tekrar yazılıyor, 800
+token'lık chunk'lar olduğu gibi ekleniyordu; prompt gereğinden uzun oluyor,
+`generate` hem yavaşlıyor hem de pahalılaşıyordu. Burada:
+
+- Chunk'lar filme göre gruplanır; her filmin metadata'sı bir kez yazılır.
+- Birbirinin neredeyse aynısı olan yorumlar (kelime 3-gram Jaccard benzerliği)
+  atlanır.
+- Metinler, text splitter'ın kullandığı tiktoken kodlayıcısıyla sayılarak
+  chunk başına ve toplamda token bütçesine göre kırpılır.
+
+Her istekte eski biçime göre kazanılan token sayısı loglanır.
+"""
+
+import os
+import re
+import logging
+from dataclasses import dataclass
+
+from langchain_core.documents import Document
+
+# Chunk'ları bölen splitter'ın tokenizer'ı (ilk kullanımda yüklenir); bütçe aynı birimle sayılır.
+from resources import get_token_encoder
+
+# Yakın kopya karşılaştırması ingestion'daki kopya yorum elemesiyle aynı 3-gram Jaccard'ı kullanır.
+from dedup import shingles, jaccard, NEAR_DUPLICATE_THRESHOLD
+
+
+logger = logging.getLogger(__name__)
+
+# Bağlam için varsayılan toplam token bütçesi (CONTEXT_TOKEN_BUDGET ile değiştirilebilir).
+DEFAULT_TOKEN_BUDGET = 1500
+
+# Tek bir chunk'tan alınabilecek en fazla token; bütçe birkaç filme yayılsın diye.
+MAX_CHUNK_TOKENS = 300
+
+# Kalan bütçe bundan azsa yeni bir parça eklenmez (anlamsız kısa kırpıntılar olmasın).
+MIN_PIECE_TOKENS = 40
+
+# Her film bloğunu kapatan satır ve kırpılan metinlerin sonuna eklenen işaret.
+BLOCK_END = "---"
+ELLIPSIS = "…"
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def legacy_block(doc: Document) -> str:
+    # Eski biçimdeki blok; sadece kazanılan token'ı ölçmek için kullanılır.
+    meta = doc.metadata
+    return f"""[Film: {meta.get("name", "Bilinmeyen Film")}]
+            Tür: {meta.get("genre", "Belirtilmemiş")}
+            Yönetmen: {meta.get("directors", "Belirtilmemiş")}
+            Puan: {meta.get("rating", "Puanlanmamış")}
+            {"Açıklama" if meta.get("type") == "desc" else "Kullanıcı Yorumu"}:
+            {doc.page_content}
+        ---"""
+
+
+@dataclass
+class PackStats:
+    # Bir paketleme işleminin özeti (loglama ve ölçüm için).
+    movies: int
+    chunks_used: int
+    duplicates_dropped: int
+    tokens: int
+    baseline_tokens: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.baseline_tokens - self.tokens
+
+
+class ContextBuilder:
+    """Getirilen chunk'ları filme göre gruplayıp token bütçesine sığdırır.
+
+    Args:
+        budget: Bağlamın toplam token bütçesi.
+        max_chunk_tokens: Bir chunk'tan alınabilecek en fazla token.
+        duplicate_threshold: Yakın kopya sayılma eşiği (Jaccard benzerliği).
+    """
+
+    def __init__(
+        self,
+        budget: int = DEFAULT_TOKEN_BUDGET,
+        max_chunk_tokens: int = MAX_CHUNK_TOKENS,
+        duplicate_threshold: float = NEAR_DUPLICATE_THRESHOLD,
+    ):
+        self.budget = budget
+        self.max_chunk_tokens = max_chunk_tokens
+        self.duplicate_threshold = duplicate_threshold
+
+    @property
+    def encoder(self):
+        return get_token_encoder()
+
+    def count(self, text: str) -> int:
+        return len(self.encoder.encode(text, disallowed_special=()))
+
+    def _trim(self, text: str, max_tokens: int) -> str:
+        # Metni "…" dahil en fazla `max_tokens` token'a kırpar. Çok baytlı bir karakterin
+        # ortasından kesilen token'lar geri kodlanınca uzayabildiği için sonuç yeniden sayılır.
+        tokens = self.encoder.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        cut = max_tokens - self.count(ELLIPSIS)
+        while cut > 0:
+            trimmed = self.encoder.decode(tokens[:cut]).rstrip() + ELLIPSIS
+            if self.count(trimmed) <= max_tokens:
+                return trimmed
+            cut -= 1
+        return ""
+
+    @staticmethod
+    def _header(meta: dict) -> str:
+        # Filmin metadata'sı tek satırda, bir kez.
+        return (
+            f"[Film: {meta.get('name', 'Bilinmeyen Film')}] "
+            f"Tür: {meta.get('genre', 'Belirtilmemiş')} | "
+            f"Yönetmen: {meta.get('directors', 'Belirtilmemiş')} | "
+            f"Puan: {meta.get('rating', 'Puanlanmamış')}"
+        )
+
+    def _baseline_tokens(self, docs: list[Document]) -> int:
+        # Eski biçimin (film adı, tip) tekilleştirmesiyle üreteceği bağlamın token sayısı.
+        seen, blocks = set(), []
+        for doc in docs:
+            key = (doc.metadata.get("name", "Bilinmeyen Film"), doc.metadata.get("type", "bilgi"))
+            if key not in seen:
+                seen.add(key)
+                blocks.append(legacy_block(doc))
+        return self.count("\n".join(blocks))
+
+    def build(self, docs: list[Document]) -> tuple[str, PackStats]:
+        """Dokümanlardan paketlenmiş bağlam metnini ve istatistikleri üretir."""
+
+        # Filmleri ilk göründükleri sırayla (arama sıralaması) grupluyoruz.
+        groups: dict[str, list[Document]] = {}
+        for doc in docs:
+            key = doc.metadata.get("movie_id") or doc.metadata.get("name", "")
+            groups.setdefault(key, []).append(doc)
+
+        # Bütçe kesindir: başlık, satırları bağlayan "\n"ler, bloğu kapatan "\n---" ve bloklar
+        # arasındaki "\n" de sayılır.
+        newline = self.count("\n")
+        closing = self.count("\n" + BLOCK_END)
+        remaining = self.budget
+        blocks, seen_shingles = [], []
+        used = dropped = 0
+        for group in groups.values():
+            header = self._header(group[0].metadata)
+            overhead = self.count(header) + closing + (newline if blocks else 0)
+            if remaining - overhead < MIN_PIECE_TOKENS:
+                break
+            lines = []
+            budget_left = remaining - overhead
+            for doc in group:
+                text = _WHITESPACE.sub(" ", doc.page_content).strip()
+                shingle_set = shingles(text)
+                if any(jaccard(shingle_set, other) >= self.duplicate_threshold for other in seen_shingles):
+                    dropped += 1
+                    continue
+                label = "Açıklama" if doc.metadata.get("type") == "desc" else "Kullanıcı Yorumu"
+                prefix = f"{label}: "
+                allowed = min(self.max_chunk_tokens, budget_left - newline - self.count(prefix))
+                if allowed < MIN_PIECE_TOKENS:
+                    break
+                line = prefix + self._trim(text, allowed)
+                seen_shingles.append(shingle_set)
+                lines.append(line)
+                budget_left -= self.count(line) + newline
+                used += 1
+            if not lines:
+                continue
+            block = "\n".join([header, *lines, BLOCK_END])
+            remaining -= self.count(block) + (newline if blocks else 0)
+            blocks.append(block)
+
+        context = "\n".join(blocks)
+        stats = PackStats(
+            movies=len(blocks),
+            chunks_used=used,
+            duplicates_dropped=dropped,
+            tokens=self.count(context),
+            baseline_tokens=self._baseline_tokens(docs),
+        )
+        logger.info(
+            "Bağlam paketlendi: %d film, %d/%d chunk, %d yakın kopya atlandı, %d token (%d token kazanıldı)",
+            stats.movies, stats.chunks_used, len(docs), stats.duplicates_dropped,
+            stats.tokens, stats.tokens_saved,
+        )
+        return context, stats
+
+
+# Node'ların kullandığı paylaşılan örnek.
+context_builder = ContextBuilder(budget=int(os.environ.get("CONTEXT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET)))
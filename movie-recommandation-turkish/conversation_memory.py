@@ -0,0 +1,194 @@
+"""
+Token bütçeli, kompakt konuşma hafızası.
+
+"Peki yönetmeni kim?" gibi takip soruları önceki konuşmayı bilmeden cevaplanamaz;
+ham geçmişi prompt'a koymak ise prompt'u sınırsız büyütür. `ConversationMemory`:
+
+- Son turları (kullanıcı + asistan mesajları) olduğu gibi tutar.
+- Bütçe aşılınca en eski turları tek satırlık özetlere çevirip koşan (running)
+  bir özete ekler; özet de bütçeyi aşarsa en eski satırları atılır. Son turlar
+  tek başına bütçeyi aşıyorsa (uzun bir asistan cevabı) en uzun mesajlar kısaltılır.
+  Özet LLM çağrısı yapmadan, çıkarımsal (extractive) olarak üretilir.
+- Konuşmada geçen filmlerin id'lerini ve son turda getirilen dokümanları saklar;
+  takip sorusunda retrieval yeniden arama yapmadan bunları kullanır.
+
+Toplam boyut, text splitter ile aynı tiktoken kodlamasıyla sayılan
+`MEMORY_TOKEN_BUDGET` token'ı geçmez. Hafıza grafın dışında (ör. Streamlit
+oturumunda) yaşar; her istekte `state_fields()` ile GraphState'e aktarılır.
+"""
+
+import os
+import re
+from typing import Optional
+
+# Token sayımı için splitter ile aynı kodlayıcı (ilk kullanımda yüklenir).
+from resources import get_token_encoder
+
+from text_utils import normalize_phrase
+
+
+# Hafızanın toplam token bütçesi (son turlar + özet).
+MEMORY_TOKEN_BUDGET = int(os.environ.get("MEMORY_TOKEN_BUDGET", 800))
+
+# Bütçe ne olursa olsun olduğu gibi tutulacak en az mesaj sayısı (son kullanıcı/asistan ikilisi).
+MIN_RECENT_MESSAGES = 2
+
+# Özete eklenen her mesajdan alınacak en fazla token.
+SUMMARY_SNIPPET_TOKENS = 30
+
+# Hatırlanacak en fazla film id'si.
+MAX_MOVIE_IDS = 8
+
+# Önceki cevaba atıf yapan ifadeler (normalize edilmiş metin üzerinde).
+FOLLOW_UP_CUES = (
+    "peki", "onun", "bunun", "sunun", "onlarin", "bunlarin", "o film", "bu film", "filmin",
+    "yonetmeni", "oyunculari", "konusu", "puani", "yorumlari", "ilki", "ikincisi",
+    "ucuncusu", "sonuncusu", "hangisi", "ayni",
+)
+
+# Yeni bir arama istendiğini gösteren ifadeler ("başka film öner").
+NEW_SEARCH_CUES = ("baska", "farkli", "yeni")
+
+# Takip sorusu sayılacak en uzun mesaj (kelime).
+MAX_FOLLOW_UP_WORDS = 10
+
+
+def is_follow_up(message: str) -> bool:
+    """Mesaj önceki cevaptaki filmlere atıf yapan kısa bir takip sorusu mu?"""
+    text = normalize_phrase(message)
+    words = text.split()
+    if not words or len(words) > MAX_FOLLOW_UP_WORDS:
+        return False
+    if any(w.startswith(NEW_SEARCH_CUES) for w in words):
+        return False
+    return any(re.search(rf"\b{cue}\b", text) for cue in FOLLOW_UP_CUES)
+
+
+def _count(text: str) -> int:
+    return len(get_token_encoder().encode(text, disallowed_special=()))
+
+
+def _snippet(text: str, max_tokens: int) -> str:
+    encoder = get_token_encoder()
+    tokens = encoder.encode(" ".join(text.split()), disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return encoder.decode(tokens)
+    return encoder.decode(tokens[:max_tokens]).rstrip() + "…"
+
+
+def _shorten(text: str, max_tokens: int) -> tuple[str, int]:
+    # Metni en fazla `max_tokens` token'a kısaltır; ("…" dahil) metin ve token sayısı.
+    # Kesilen metin yeniden kodlanınca birkaç token fazla çıkabildiği için sınır daraltılarak tekrarlanır.
+    limit = max_tokens - 1
+    while limit > 0:
+        short = _snippet(text, limit)
+        tokens = _count(short)
+        if tokens <= max_tokens:
+            return short, tokens
+        limit -= tokens - max_tokens
+    return "", 0
+
+
+class ConversationMemory:
+    """Son turları, koşan özeti ve konuşmada geçen filmleri tutan sınırlı hafıza.
+
+    Args:
+        budget: Son mesajlar ve özetin toplam token bütçesi.
+        max_movie_ids: Hatırlanacak en fazla film id'si.
+    """
+
+    def __init__(self, budget: int = MEMORY_TOKEN_BUDGET, max_movie_ids: int = MAX_MOVIE_IDS):
+        self.budget = budget
+        self.max_movie_ids = max_movie_ids
+        # {"role": "user" | "assistant", "text": str, "movies": [film adı, ...], "tokens": int}
+        self.messages: list[dict] = []
+        self.summary_lines: list[str] = []
+        # Her özet satırının token sayısı (summary_lines ile aynı sırada) ve toplam kullanım;
+        # sayımlar eklenirken bir kez yapılır, sıkıştırma sırasında metinler yeniden kodlanmaz.
+        self._summary_tokens: list[int] = []
+        self._used = 0
+        # En yeni önce.
+        self.movie_ids: list[str] = []
+        # Son film sorgusunda getirilen dokümanlar (takip sorusunda yeniden kullanılır).
+        self.last_docs: list = []
+
+    def add_turn(self, user: str, assistant: str, docs: Optional[list] = None) -> None:
+        """Bir kullanıcı/asistan turunu ekler ve hafızayı bütçeye sığdırır."""
+        names = []
+        if docs:
+            self.last_docs = list(docs)
+            ids = []
+            for doc in docs:
+                if doc.metadata.get("movie_id") and doc.metadata["movie_id"] not in ids:
+                    ids.append(doc.metadata["movie_id"])
+                    names.append(doc.metadata.get("name") or doc.metadata["movie_id"])
+            self.movie_ids = (ids + [m for m in self.movie_ids if m not in ids])[:self.max_movie_ids]
+        for role, text, movies in (("user", user, []), ("assistant", assistant, names)):
+            tokens = _count(text)
+            self.messages.append({"role": role, "text": text, "movies": movies, "tokens": tokens})
+            self._used += tokens
+        self._compact()
+
+    def _compact(self) -> None:
+        # En eski mesajları özete taşı, gerekirse özetin en eski satırlarını at.
+        while self._used > self.budget and len(self.messages) > MIN_RECENT_MESSAGES:
+            message = self.messages.pop(0)
+            line = self._summarize(message)
+            tokens = _count(line)
+            self.summary_lines.append(line)
+            self._summary_tokens.append(tokens)
+            self._used += tokens - message["tokens"]
+        while self._used > self.budget and self.summary_lines:
+            self.summary_lines.pop(0)
+            self._used -= self._summary_tokens.pop(0)
+        if self._used > self.budget:
+            self._fit_messages()
+
+    def _fit_messages(self) -> None:
+        # Özet boşaldığı halde son mesajlar bütçeyi aşıyor: bütçe mesajlar arasında
+        # paylaştırılır (water-filling). Payından kısa mesajlar (genelde kullanıcı sorusu)
+        # olduğu gibi kalır, artan pay uzun mesajlara gider; payı aşanlar kısaltılır.
+        remaining, pending = self.budget, sorted(m["tokens"] for m in self.messages)
+        cap = remaining
+        for i, tokens in enumerate(pending):
+            cap = remaining // (len(pending) - i)
+            if tokens > cap:
+                break
+            remaining -= tokens
+        for message in self.messages:
+            if message["tokens"] > cap:
+                message["text"], message["tokens"] = _shorten(message["text"], cap)
+        self._used = sum(m["tokens"] for m in self.messages)
+
+    @staticmethod
+    def _summarize(message: dict) -> str:
+        role = "Kullanıcı" if message["role"] == "user" else "Asistan"
+        line = f"- {role}: {_snippet(message['text'], SUMMARY_SNIPPET_TOKENS)}"
+        if message["movies"]:
+            line += f" (filmler: {', '.join(message['movies'])})"
+        return line
+
+    @property
+    def summary(self) -> Optional[str]:
+        return "\n".join(self.summary_lines) or None
+
+    def state_fields(self) -> dict:
+        """GraphState'e aktarılacak alanlar."""
+        return {
+            "history": [{"role": m["role"], "text": m["text"]} for m in self.messages],
+            "summary": self.summary,
+            "movie_ids": list(self.movie_ids),
+            "previous_docs": list(self.last_docs) or None,
+        }
+
+
+def format_history(state) -> str:
+    """Prompt'a eklenecek konuşma geçmişi; geçmiş yoksa boş metin."""
+    parts = []
+    if getattr(state, "summary", None):
+        parts.append(f"Önceki konuşmanın özeti:\n{state.summary}")
+    history = getattr(state, "history", None) or []
+    if history:
+        lines = [f"{'Kullanıcı' if m['role'] == 'user' else 'Asistan'}: {m['text']}" for m in history]
+        parts.append("Son mesajlar:\n" + "\n".join(lines))
+    return "\n\n".join(parts)
@@ -0,0 +1,107 @@
+"""
+Yorumlar için birebir ve yakın kopya tespiti (MinHash + LSH).
+
+Kazınmış verilerde aynı yorum bir filmde birden fazla kez (kopyala-yapıştır,
+küçük yazım farkları, sonuna eklenmiş bir cümle) geçebiliyor. Her kopya ayrı bir
+vektör olarak embed ediliyor; hem ingestion süresi hem indeks boyutu artıyor,
+film vektörünün merkezi de kopyalanan yoruma kayıyordu.
+
+`NearDuplicateFilter` bir filmin yorumlarını sırayla alır ve öncekilerden
+birinin kopyası olanları işaretler:
+
+- Birebir kopya: normalize metin (Türkçe katlama, noktalama/boşluk farkı yok)
+  daha önce görüldüyse.
+- Yakın kopya: kelime 3-gram kümeleri arasındaki Jaccard benzerliği eşiği
+  (varsayılan 0.8) geçiyorsa. Her yorumla tek tek karşılaştırmamak için yorumun
+  MinHash imzası LSH band'lerine (8 band × 8 satır, eşik ≈ 0.77) yerleştirilir;
+  sadece aynı band kovasına düşen adaylar gerçek Jaccard ile doğrulanır.
+
+İlk görülen yorum tutulur; sıralama veri dosyasındaki sıradır.
+"""
+
+import hashlib
+from typing import Optional
+
+import numpy as np
+
+# Karşılaştırma için Türkçe normalizasyon.
+from text_utils import normalize_phrase
+
+
+# Bu oranın üzerinde ortak 3-gram'ı olan iki metin yakın kopya sayılır. Bağlam paketleyici
+# (context_builder.py) de getirilen chunk'lar arasındaki yakın kopyaları bu eşik ve
+# `shingles` / `jaccard` ile eler.
+NEAR_DUPLICATE_THRESHOLD = 0.8
+
+SHINGLE_SIZE = 3
+
+# MinHash imza uzunluğu ve LSH band sayısı (band başına NUM_PERM / BANDS satır).
+NUM_PERM = 64
+BANDS = 8
+
+# Hash fonksiyonları (a·x + b) mod p; p = 2^31 - 1 olduğu için çarpım uint64'e sığar.
+_PRIME = np.uint64((1 << 31) - 1)
+_rng = np.random.default_rng(1)
+_A = _rng.integers(1, int(_PRIME), NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, int(_PRIME), NUM_PERM, dtype=np.uint64)
+
+
+def shingles(text: str, n: int = SHINGLE_SIZE) -> set:
+    # Metnin kelime n-gram'ları; kısa metinlerde tüm metin tek parça sayılır.
+    words = normalize_phrase(text).split()
+    if len(words) <= n:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def _hash32(shingle: str) -> int:
+    # Süreçten sürece değişmeyen 32 bit hash (Python'un hash() fonksiyonu rastgele tohumludur).
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def minhash(shingle_set: set) -> np.ndarray:
+    """Shingle kümesinin `NUM_PERM` uzunluğundaki MinHash imzası."""
+    x = np.fromiter((_hash32(s) for s in shingle_set), dtype=np.uint64, count=len(shingle_set)) % _PRIME
+    return ((_A[:, None] * x[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+class NearDuplicateFilter:
+    """Sırayla verilen metinlerden öncekilerin birebir/yakın kopyası olanları bulur.
+
+    Args:
+        threshold: Yakın kopya sayılma eşiği (3-gram Jaccard benzerliği).
+        bands: LSH band sayısı; `NUM_PERM`u tam bölmelidir.
+    """
+
+    def __init__(self, threshold: float = NEAR_DUPLICATE_THRESHOLD, bands: int = BANDS):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self._exact: set[str] = set()
+        self._shingles: list[set] = []
+        # (band no, band'in imza baytları) → o kovaya düşen metinlerin sıra numaraları
+        self._buckets: dict[tuple, list[int]] = {}
+
+    def check(self, text: str) -> Optional[str]:
+        """Metin yeni ise kaydedip None, değilse "exact" veya "near" döndürür."""
+        key = normalize_phrase(text)
+        if key in self._exact:
+            return "exact"
+        shingle_set = shingles(text)
+        signature = minhash(shingle_set)
+        bands = [(b, signature[b * self.rows:(b + 1) * self.rows].tobytes()) for b in range(self.bands)]
+
+        candidates = {i for band in bands for i in self._buckets.get(band, ())}
+        if any(jaccard(shingle_set, self._shingles[i]) >= self.threshold for i in candidates):
+            return "near"
+
+        index = len(self._shingles)
+        self._shingles.append(shingle_set)
+        self._exact.add(key)
+        for band in bands:
+            self._buckets.setdefault(band, []).append(index)
+        return None
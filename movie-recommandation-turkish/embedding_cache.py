@@ -0,0 +1,174 @@
+"""
+Diskte kalıcı, LRU tahliyeli embedding önbelleği.
+
+BERT embedding modeli hem ingestion'da hem de her `movie_retriever.invoke`
+çağrısında en pahalı CPU adımıdır. Kazınmış verilerde birebir aynı yorum
+metinleri sık görülür, kullanıcılar da aynı soruları tekrar sorar. Bu modüldeki
+`CachedEmbeddings`, herhangi bir LangChain `Embeddings` nesnesini sarar ve
+hesaplanmış vektörleri SQLite dosyasında saklar.
+
+- Anahtar: model adı + normalize edilmiş metnin SHA-256 hash'i.
+- Normalizasyon: Unicode NFC + baştaki/sondaki ve ardışık boşlukların sadeleştirilmesi
+  (model büyük/küçük harf duyarlı olduğu için harfler olduğu gibi bırakılır).
+- Boyut sınırı: `max_entries` aşıldığında en uzun süredir kullanılmayan kayıtlar silinir.
+- `hits` / `misses` sayaçları önbelleğin ne kadar işe yaradığını gösterir.
+"""
+
+import os
+import re
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from array import array
+from typing import Optional
+
+from langchain_core.embeddings import Embeddings
+
+# Embedding süresi ve önbellek isabetleri istek izine/metriklere yazılır.
+from instrumentation import metrics, span, annotate
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    # Aynı metnin farklı Unicode biçimleri ve boşluk farkları aynı anahtara düşsün.
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+class CachedEmbeddings(Embeddings):
+    """Bir `Embeddings` nesnesini disk tabanlı LRU önbellekle saran sınıf.
+
+    Args:
+        inner: Asıl embedding hesaplamasını yapan nesne (ör. HuggingFaceEmbeddings).
+        model_name: Anahtara eklenen model adı; model değişince eski vektörler kullanılmaz.
+        path: SQLite önbellek dosyası.
+        max_entries: Önbellekte tutulacak en fazla vektör sayısı.
+    """
+
+    def __init__(self, inner: Embeddings, model_name: str, path: str, max_entries: int = 500_000):
+        self.inner = inner
+        self.model_name = model_name
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Aynı bağlantı Streamlit'in farklı thread'lerinden kullanılabildiği için
+        # check_same_thread kapalı, erişim ise kilit ile sıraya sokuluyor.
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\x1f{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def lookup(self, texts: list[str]) -> list[Optional[list[float]]]:
+        """Her metin için önbellekteki vektörü, yoksa None döndürür."""
+        keys = [self._key(t) for t in texts]
+        found = {}
+        now = time.time_ns()
+        with self._lock:
+            unique = list(dict.fromkeys(keys))
+            # SQLite parametre sınırına takılmamak için sorguyu parçalara bölüyoruz.
+            for i in range(0, len(unique), 500):
+                part = unique[i:i + 500]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", part
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+            # LRU: bulunan kayıtların son kullanım zamanını güncelliyoruz.
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+
+            result = [found.get(k) for k in keys]
+            hits = sum(v is not None for v in result)
+            self.hits += hits
+            self.misses += len(result) - hits
+        metrics.inc("embedding_cache_total", hits, help="Embedding önbelleği sorguları.", result="hit")
+        metrics.inc("embedding_cache_total", len(result) - hits, help="Embedding önbelleği sorguları.", result="miss")
+        annotate(cache_hits=hits, cache_misses=len(result) - hits)
+        return result
+
+    def store(self, texts: list[str], vectors: list[list[float]]) -> None:
+        """Hesaplanan vektörleri önbelleğe yazar, gerekirse eski kayıtları tahliye eder."""
+        now = time.time_ns()
+        rows = {self._key(t): array("f", v).tobytes() for t, v in zip(texts, vectors)}
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, blob, now) for key, blob in rows.items()]
+            )
+            self._count += self._conn.total_changes - before
+            if self._count > self.max_entries:
+                # Her seferinde tek tek silmek yerine sınırın %10 altına kadar toplu tahliye.
+                excess = self._count - int(self.max_entries * 0.9)
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,)
+                )
+                self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._conn.commit()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        with span("embed_documents", texts=len(texts)):
+            return self._embed_documents(texts)
+
+    def _embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors = self.lookup(texts)
+        # Önbellekte olmayan metinleri (aynı metin birden fazla kez geçse bile bir kez) hesaplıyoruz.
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if missing:
+            computed = dict(zip(missing, self.inner.embed_documents(missing)))
+            self.store(missing, [computed[t] for t in missing])
+            vectors = [v if v is not None else computed[t] for t, v in zip(texts, vectors)]
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        with span("embed_query"):
+            vector = self.lookup([text])[0]
+            if vector is None:
+                vector = self.inner.embed_query(text)
+                self.store([text], [vector])
+            return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        # SQLite erişimi thread'de yapılır; ıskada model (veya mikro batch, bkz. micro_batch.py)
+        # beklenirken event loop bloklanmaz.
+        with span("embed_query"):
+            vector = (await asyncio.to_thread(self.lookup, [text]))[0]
+            if vector is None:
+                vector = await self.inner.aembed_query(text)
+                await asyncio.to_thread(self.store, [text], [vector])
+            return vector
+
+    def stats(self) -> dict:
+        # İsabet/ıska sayaçları ve önbellekteki kayıt sayısı.
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": self._count,
+        }
@@ -0,0 +1,138 @@
+# Bu dosya, cevabı doğrudan film metadata'sında olan basit olgu sorularını
+# ("Avatar'ın puanı kaç?", "Inception'ı kim yönetti?", "Matrix hangi tür?")
+# tanıyan ve şablon bir cevap üreten kural tabanlı adımı tanımlar.
+#
+# Bu sorular normalde yönlendirme, vektör araması ve `generate` LLM çağrısından
+# geçer; oysa cevap ingestion'ın ürettiği film tablosunda (`movie_facts_path`)
+# hazırdır. Soru tanınırsa cevap tablodan milisaniyeler içinde verilir.
+#
+# Emin olunamayan her durumda (soru kalıbı yok, öneri/yorum isteniyor, mesaj uzun,
+# film adı bulunamadı ya da birden fazla film eşleşti, istenen alan boş) None
+# döner ve mesaj olağan RAG akışına gider.
+
+import os
+import re
+import json
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+# Ingestion'ın ürettiği film tablosunun yolu.
+from resources import movie_facts_path, index_file
+
+# Sorgudaki film adlarını bulan başlık sözlüğü (sözcüksel indeks).
+from retrieval import lexical_index
+
+# Türkçe metin normalizasyonu.
+from text_utils import normalize_phrase
+
+
+# Sorulan alan → soru kalıpları (normalize edilmiş metin üzerinde: "Avatar'ın puanı kaç?"
+# → "avatarin puani kac", "Inception'ı kim yönetti?" → "inceptioni kim yonetti").
+FACT_PATTERNS = {
+    "rating": re.compile(
+        r"\b(?:puan\w*|imdb\w*|reyting\w*) (?:kac|ne|nedir|ne kadar)\b|\bkac puan\w*\b"
+    ),
+    "directors": re.compile(
+        r"\byonetmen\w* (?:kim|kimdir|kimler|ne|nedir)\b|\bkim (?:yonetti|yonetmis|cekti|cekmis)\b"
+        r"|\b(?:yoneten|ceken) (?:kim|kimdir)\b"
+    ),
+    "genre": re.compile(
+        r"\b(?:hangi|ne) (?:tur|turde|turden|turu)\b|\bturu (?:ne|nedir|hangisi)\b"
+    ),
+}
+
+# Bu köklerle başlayan kelimeler olgu sorusu değil arama/öneri isteği olduğunu gösterir
+# ("Avatar gibi yüksek puanlı film öner", "Avatar'ın yorumları nasıl?").
+SEARCH_STEMS = ("oner", "tavsiye", "benzer", "gibi", "yorum", "konu", "baska", "listele", "karsilastir")
+
+# Olgu sorusu sayılacak en uzun mesaj (kelime).
+MAX_FACT_WORDS = 12
+
+
+@dataclass
+class FactAnswer:
+    # Tablodan üretilen cevap ve hangi filmin hangi alanlarının kullanıldığı.
+    movie_id: str
+    name: str
+    fields: list[str]
+    answer: str
+
+
+class _FactTable:
+    # Ingestion'ın yazdığı film tablosunu okur; dosya değiştiyse yeniden yükler.
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime = None
+        self._lock = threading.Lock()
+        self.movies: dict[str, dict] = {}
+
+    def refresh(self) -> None:
+        # Etkin indeks anlık görüntüsü değişince yol da değişir; (yol, mtime) çifti karşılaştırılır.
+        path = index_file(self.path)
+        try:
+            mtime = (path, os.path.getmtime(path))
+        except OSError:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            with open(path, "r", encoding="utf-8") as f:
+                self.movies = json.load(f)
+            self._mtime = mtime
+
+
+fact_table = _FactTable(movie_facts_path)
+
+
+def _format_rating(value: float) -> str:
+    # Türkçe ondalık ayırıcı: 7.8 → "7,8"
+    return f"{value:g}".replace(".", ",")
+
+
+def _sentence(field: str, name: str, fact: dict) -> Optional[str]:
+    # Alan için şablon cümle; alan boşsa None.
+    if field == "rating" and fact.get("rating") is not None:
+        return f"{name} filminin puanı {_format_rating(fact['rating'])}/10."
+    if field == "directors" and fact.get("directors"):
+        return f"{name} filmini {', '.join(fact['directors'])} yönetti."
+    if field == "genre" and fact.get("genres"):
+        return f"{name} filminin türü: {', '.join(fact['genres'])}."
+    return None
+
+
+def asked_fields(message: str) -> list[str]:
+    """Mesaj bir olgu sorusuysa sorulan alanlar ("rating", "directors", "genre"), değilse boş liste."""
+    text = normalize_phrase(message)
+    words = text.split()
+    if not words or len(words) > MAX_FACT_WORDS:
+        return []
+    if any(w.startswith(SEARCH_STEMS) for w in words):
+        return []
+    return [field for field, pattern in FACT_PATTERNS.items() if pattern.search(text)]
+
+
+def answer_fact_question(message: str) -> Optional[FactAnswer]:
+    """Olgu sorusunu film tablosundan cevaplar; emin olunamazsa None döner."""
+    fields = asked_fields(message)
+    if not fields:
+        return None
+    index = lexical_index.get()
+    if index is None:
+        return None
+    # Tek bir film adı geçmeli; birden fazla eşleşme (aynı adlı filmler, iki film birden) belirsizdir.
+    movie_ids = index.match_titles(message)
+    if len(movie_ids) != 1:
+        return None
+
+    fact_table.refresh()
+    fact = fact_table.movies.get(movie_ids[0])
+    if not fact:
+        return None
+    name = fact.get("name") or movie_ids[0]
+    sentences = [_sentence(field, name, fact) for field in fields]
+    # Sorulan alanlardan biri bile tabloda yoksa cevabı RAG akışı üretsin.
+    if not all(sentences):
+        return None
+    return FactAnswer(movie_ids[0], name, fields, " ".join(sentences))
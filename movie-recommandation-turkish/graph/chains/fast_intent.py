@@ -0,0 +1,190 @@
+# Bu dosya, LLM router'ından (question_router) önce çalışan yerel ve hızlı bir
+# intent sınıflandırıcısı tanımlar.
+#
+# "Merhaba", "Teşekkürler" gibi bariz mesajlar için OpenRouter'a gidip gelmek
+# yüzlerce milisaniye ekler. Burada iki adımlı bir ön-sınıflandırma yapıyoruz:
+#   1) Anahtar kelime kuralları: sadece selamlaşma/teşekkür kelimelerinden oluşan
+#      mesajlar general_chat, film/tür/izleme kelimeleri içerenler film_query.
+#   2) Embedding prototipleri: mesaj, zaten yüklü olan Türkçe cümle embedder'ı ile
+#      router prompt'undaki etiketli örneklere karşı karşılaştırılır.
+# Güven skoru eşiğin altında kalırsa karar verilmez ve LLM router'a düşülür.
+
+import re
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+# Retrieval'ın kullandığı (önbellekli) embedding modelini tekrar kullanıyoruz; model
+# ilk ihtiyaç anında yüklenir.
+from resources import get_embedding
+
+# Prototip olarak router prompt'undaki örnekleri kullanıyoruz.
+from graph.chains.route import FILM_QUERY_EXAMPLES, GENERAL_CHAT_EXAMPLES
+
+from intent import FILM_QUERY, GENERAL_CHAT
+
+# Türkçe'ye uygun küçük harfe çevirme.
+from text_utils import lower_tr
+
+# Önceki filmlere atıf yapan takip sorularını tanımak için.
+from conversation_memory import is_follow_up
+
+# Router kararının kaynağı metriklere ve istek izine yazılır.
+from instrumentation import metrics, annotate
+
+
+# Prompt'taki general_chat örnekleri az olduğu için birkaç bariz örnek daha ekliyoruz.
+EXTRA_GENERAL_CHAT_EXAMPLES = [
+    "Selam",
+    "Günaydın",
+    "İyi akşamlar",
+    "Sağ ol, görüşürüz",
+    "Kendini tanıtır mısın?",
+]
+
+# Sadece bu kelimelerden oluşan mesajlar kesin olarak selamlaşma/teşekkür sayılır.
+GREETING_WORDS = {
+    "merhaba", "merhabalar", "selam", "selamlar", "slm", "mrb", "hey", "günaydın",
+    "iyi", "akşamlar", "geceler", "günler", "teşekkür", "teşekkürler", "ederim", "tşk",
+    "sağol", "sağ", "ol", "olun", "nasılsın", "nasılsınız", "naber", "hoşça", "kal",
+    "görüşürüz", "tamam", "peki", "çok", "sen", "ben", "de", "da", "iyiyim",
+}
+
+# Bu köklerle başlayan kelimeler mesajın film ile ilgili olduğunu güçlü şekilde gösterir.
+FILM_STEMS = (
+    "film", "izle", "öner", "tavsiye", "yönetmen", "yönetti", "oyuncu", "sinema", "imdb",
+    "senaryo", "fragman",
+)
+
+# Bu kelimeler günlük dilde başka kelimelerin de başı olduğu için ("korkuyorum", "dramatik",
+# "yorumla", "puanlama") önek olarak değil, sadece kendileri ya da çekim ekli halleriyle
+# ("korku", "komedileri", "yorumları", "puanı") eşleşir.
+FILM_NOUNS = (
+    "dizi", "puan", "yorum", "komedi", "dram", "korku", "aksiyon", "gerilim", "animasyon",
+    "romantik", "belgesel", "macera", "fantastik", "polisiye",
+)
+
+# Çekim ekleri: çoğul (-ler), iyelik (-i, -si, -im, -in, -imiz, -iniz), hal (-de, -den, -e, -ye,
+# -in, -nin, -ni, -ce). Yapım ekleri (-la, -ma, -tik, -yor...) bilerek yok.
+_INFLECTION = (
+    r"(?:l[ae]r)?"
+    r"(?:s?[ıiuü]|[ıiuü]?m|[ıiuü]?n|[ıiuü]m[ıiuü]z|[ıiuü]n[ıiuü]z)?"
+    r"(?:n?(?:[ıiuü]n?|[ae]|d[ae]n?|t[ae]n?)|y[ıiuüae]|[cç][ae])?"
+)
+
+
+def _noun_pattern(noun: str) -> str:
+    # Sonu "k" ile biten kelimelerde ünlüyle başlayan ekten önce yumuşama: romantik → romantiği.
+    base = f"(?:{noun}|{noun[:-1]}ğ(?=[ıiuüae]))" if noun.endswith("k") else noun
+    return base + _INFLECTION
+
+
+FILM_NOUN_RE = re.compile("(?:" + "|".join(_noun_pattern(n) for n in FILM_NOUNS) + ")")
+
+
+def is_film_word(word: str) -> bool:
+    """Kelime (küçük harfli) film ile ilgili güçlü bir işaret mi?"""
+    return word.startswith(FILM_STEMS) or FILM_NOUN_RE.fullmatch(word) is not None
+
+
+@dataclass
+class IntentDecision:
+    # Yerel sınıflandırıcının kararı.
+    intent: str
+    confidence: float
+    # Kararın kaynağı: "rule" (anahtar kelime), "embedding" (prototip benzerliği)
+    # veya "memory" (konuşma hafızasındaki filmlere takip sorusu).
+    source: str
+
+
+class FastIntentClassifier:
+    """Bariz mesajları yerelde sınıflandırır, emin olamadığında None döner.
+
+    Args:
+        embedder: embed_documents/embed_query sağlayan ve normalize vektör üreten nesne.
+            Verilmezse paylaşılan embedding modeli ilk kullanımda alınır.
+        threshold: Embedding kararının kabul edilmesi için gereken en düşük benzerlik.
+        min_margin: En iyi iki intent arasındaki en küçük benzerlik farkı.
+    """
+
+    def __init__(self, embedder=None, threshold: float = 0.75, min_margin: float = 0.1):
+        self._embedder = embedder
+        self.threshold = threshold
+        self.min_margin = min_margin
+        self._prototypes = None
+        self._lock = threading.Lock()
+
+    @property
+    def embedder(self):
+        return self._embedder or get_embedding()
+
+    def warm_up(self) -> None:
+        """Prototip vektörlerini önceden hesaplar (ilk mesajı bekletmemek için)."""
+        self._load_prototypes()
+
+    def _load_prototypes(self) -> dict:
+        # Prototip vektörleri ilk kullanımda bir kez hesaplanır.
+        with self._lock:
+            if self._prototypes is None:
+                examples = {
+                    FILM_QUERY: FILM_QUERY_EXAMPLES,
+                    GENERAL_CHAT: GENERAL_CHAT_EXAMPLES + EXTRA_GENERAL_CHAT_EXAMPLES,
+                }
+                self._prototypes = {
+                    intent: self.embedder.embed_documents(texts)
+                    for intent, texts in examples.items()
+                }
+        return self._prototypes
+
+    @staticmethod
+    def classify_by_rules(message: str) -> Optional[IntentDecision]:
+        words = re.findall(r"\w+", lower_tr(message))
+        if not words:
+            return None
+        if any(is_film_word(w) for w in words) or "bilim kurgu" in " ".join(words):
+            return IntentDecision(FILM_QUERY, 0.9, "rule")
+        if all(w in GREETING_WORDS for w in words):
+            return IntentDecision(GENERAL_CHAT, 0.95, "rule")
+        return None
+
+    def classify_by_embedding(self, message: str) -> Optional[IntentDecision]:
+        prototypes = self._load_prototypes()
+        query = self.embedder.embed_query(message)
+        # Vektörler normalize olduğu için iç çarpım kosinüs benzerliğine eşittir.
+        scores = {
+            intent: max(sum(a * b for a, b in zip(query, vec)) for vec in vectors)
+            for intent, vectors in prototypes.items()
+        }
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        (best_intent, best), (_, second) = ranked[0], ranked[1]
+        if best < self.threshold or best - second < self.min_margin:
+            return None
+        return IntentDecision(best_intent, best, "embedding")
+
+    def classify(self, message: str) -> Optional[IntentDecision]:
+        """Önce kurallar, sonra embedding prototipleri; emin değilse None."""
+        message = message.strip()
+        if not message:
+            return None
+        return self.classify_by_rules(message) or self.classify_by_embedding(message)
+
+
+def local_intent(state) -> Optional[IntentDecision]:
+    """Graf state'i için yerel karar: hafızada film varken gelen takip sorusu film
+    sorgusudur ("peki konusu ne?"); diğer mesajlar `fast_intent_classifier`a gider."""
+    if getattr(state, "movie_ids", None) and is_follow_up(state.message):
+        return IntentDecision(FILM_QUERY, 0.9, "memory")
+    return fast_intent_classifier.classify(state.message)
+
+
+def record_router_decision(decision: Optional[IntentDecision]) -> None:
+    """Intent kararının kaynağını (rule/embedding/memory, yerel karar yoksa llm)
+    `router_decisions_total` metriğine ve o anki span'e yazar. LLM çağrısının atlanma
+    oranı bu sayaçtan okunur: 1 - llm / toplam."""
+    source = decision.source if decision is not None else "llm"
+    metrics.inc("router_decisions_total", help="Intent kararının kaynağı.", source=source)
+    annotate(router_source=source)
+
+
+# Graf tarafından kullanılan paylaşılan örnekler.
+fast_intent_classifier = FastIntentClassifier()
@@ -0,0 +1,161 @@
+# Bu dosya, kullanıcı sorgusundan yapılandırılmış arama filtreleri çıkaran
+# sorgu anlama (query understanding) adımını tanımlar.
+#
+# "8 üzeri bilim kurgu öner" gibi bir mesajda vektör aramasının tüm açıklama ve
+# yorumları taraması yerine; tür (bilim kurgu), en düşük puan (8), yönetmen ve
+# doküman tipi (açıklama / yorum) çıkarılıp Chroma'ya `where` filtresi olarak
+# verilir. Böylece arama uzayı ve LLM'e giden alakasız bağlam küçülür.
+#
+# Çıkarım kural tabanlıdır (LLM çağrısı yapılmaz); tür ve yönetmen adları
+# ingestion sırasında üretilen sözlükle (facets) eşleştirilir.
+
+import os
+import re
+import json
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+
+# Ingestion'ın ürettiği tür/yönetmen sözlüğünün yolu.
+from resources import facets_path, index_file
+
+# Türkçe metin normalizasyonu.
+from text_utils import normalize_phrase
+
+
+# Kullanıcıların tür için kullandığı yaygın alternatif yazımlar → veri setindeki tür adı.
+GENRE_SYNONYMS = {
+    "bilimkurgu": "bilim kurgu",
+    "sci fi": "bilim kurgu",
+    "scifi": "bilim kurgu",
+    "komik": "komedi",
+    "korkunc": "korku",
+    "romantizm": "romantik",
+    "aksiyonlu": "aksiyon",
+    "gerilimli": "gerilim",
+    "cizgi film": "animasyon",
+}
+
+# Doküman tipine işaret eden ifadeler.
+REVIEW_HINTS = ("yorum", "elestiri", "izleyici", "degerlendirme")
+DESC_HINTS = ("konusu", "konu ne", "ozet", "ne anlatiyor", "neyi anlatiyor")
+
+# "8 üzeri", "7.5 ve üstü", "8'den yüksek", "8+" veya "en az 8" gibi puan ifadeleri
+# (normalize edilmiş metin üzerinde: "8 uzeri", "7 5 ve ustu", "8den yuksek", "8 +" ...).
+_RATING_PATTERNS = [
+    re.compile(r"(\d+(?: \d)?)(?:[a-z]{1,3})? ?(?:puan\w* )?(?:ve )?(?:uzeri|ustu|uzerinde|ustunde)\b"),
+    re.compile(r"(\d+(?: \d)?) ?(?:d|t)(?:e|a)n (?:yuksek|fazla|buyuk)\b"),
+    re.compile(r"en az (?:puani )?(\d+(?: \d)?)\b"),
+]
+_RATING_PLUS = re.compile(r"(\d+(?:[.,]\d)?)\s*\+")
+
+
+@dataclass
+class QueryFilters:
+    # Sorgudan çıkarılan filtreler; boş alanlar filtre uygulanmayacağı anlamına gelir.
+    genres: list[str] = field(default_factory=list)
+    directors: list[str] = field(default_factory=list)
+    min_rating: Optional[float] = None
+    doc_type: Optional[str] = None
+
+    def to_where(self, include_type: bool = True) -> Optional[dict]:
+        """Chroma `where` filtresine çevirir; hiç filtre yoksa None döner.
+
+        `include_type=False` doküman tipi koşulunu dışarıda bırakır (film seviyesi
+        koleksiyonda chunk tipi olmadığı için).
+        """
+        conditions = [{f"genre_{g}": True} for g in self.genres]
+        if self.directors:
+            director_conditions = [{f"director_{d}": True} for d in self.directors]
+            conditions.append(
+                director_conditions[0] if len(director_conditions) == 1 else {"$or": director_conditions}
+            )
+        if self.min_rating is not None:
+            conditions.append({"rating": {"$gte": self.min_rating}})
+        if self.doc_type and include_type:
+            conditions.append({"type": self.doc_type})
+
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+class _FacetVocabulary:
+    # Ingestion'ın yazdığı tür/yönetmen sözlüğünü okur; dosya değiştiyse yeniden yükler.
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime = None
+        self._lock = threading.Lock()
+        self.genres: dict[str, str] = {}
+        self.directors: dict[str, str] = {}
+
+    def refresh(self) -> None:
+        # Etkin indeks anlık görüntüsü değişince yol da değişir; (yol, mtime) çifti karşılaştırılır.
+        path = index_file(self.path)
+        try:
+            mtime = (path, os.path.getmtime(path))
+        except OSError:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # slug → karşılaştırma ifadesi ("bilim_kurgu" → "bilim kurgu")
+            self.genres = {slug: normalize_phrase(name) for slug, name in data.get("genres", {}).items()}
+            self.directors = {slug: normalize_phrase(name) for slug, name in data.get("directors", {}).items()}
+            self._mtime = mtime
+
+
+_vocabulary = _FacetVocabulary(facets_path)
+
+
+def _contains_phrase(text: str, phrase: str) -> bool:
+    # İfade kelime başından başlamalı; Türkçe ekler için sonunda harf gelebilir
+    # ("komedi" → "komediler", "dram" → "dramlar").
+    return bool(phrase) and re.search(rf"\b{re.escape(phrase)}", text) is not None
+
+
+def _extract_rating(message: str, text: str) -> Optional[float]:
+    # "8+" normalize edilince kaybolduğu için ham mesajda ayrıca bakıyoruz.
+    match = _RATING_PLUS.search(message)
+    value = float(match.group(1).replace(",", ".")) if match else None
+    for pattern in _RATING_PATTERNS:
+        if value is not None:
+            break
+        match = pattern.search(text)
+        if match:
+            value = float(match.group(1).replace(" ", "."))
+    # Puan ölçeği 0-10; "2010 üzeri" gibi yıl ifadelerini puan sanmıyoruz.
+    return value if value is not None and value <= 10 else None
+
+
+def extract_filters(message: str) -> QueryFilters:
+    """Kullanıcı mesajından tür, yönetmen, en düşük puan ve doküman tipi filtrelerini çıkarır."""
+    _vocabulary.refresh()
+    text = normalize_phrase(message)
+    filters = QueryFilters()
+
+    # Eş anlamlıları veri setindeki adlara çeviriyoruz.
+    expanded = text
+    for alias, canonical in GENRE_SYNONYMS.items():
+        if _contains_phrase(text, alias):
+            expanded += " " + canonical
+
+    filters.genres = [slug for slug, phrase in _vocabulary.genres.items() if _contains_phrase(expanded, phrase)]
+    # Yönetmenleri yanlış eşleşme olmaması için tam ad ile arıyoruz.
+    filters.directors = [
+        slug for slug, phrase in _vocabulary.directors.items()
+        if " " in phrase and _contains_phrase(text, phrase)
+    ]
+
+    filters.min_rating = _extract_rating(message, text)
+
+    wants_review = any(_contains_phrase(text, h) for h in REVIEW_HINTS)
+    wants_desc = any(h in text for h in DESC_HINTS)
+    if wants_review != wants_desc:
+        filters.doc_type = "review" if wants_review else "desc"
+
+    return filters
+
@@ -2,20 +2,35 @@
 # Yani kullanıcı film hakkında mı soru soruyor yoksa genel sohbet mi etmek istiyor,
 # ona karar veren küçük bir sınıflandırıcıyı tanımlıyoruz.
 
-# OpenRouter üzerinden tanımlı LLM nesnesini alıyoruz; bu LLM'i intent sınıflandırması
-# ve daha sonra yapılandırılmış çıktı almak için kullanacağız.
-from open_router import llm
+# OpenRouter üzerinden tanımlı LLM nesnesini (ilk kullanımda oluşturulan paylaşılan
+# örnek) alıyoruz; bu LLM'i intent sınıflandırması ve yapılandırılmış çıktı için kullanacağız.
+from resources import get_llm
+
+# Router zinciri ilk kullanımda bir kez kurulur.
+from functools import lru_cache
+
+# Router cevaplarının LLM önbelleğinde ne kadar saklanacağı.
+from llm_cache import cache_ttl, ROUTER_TTL
+
+# Router hata verirse kullanılacak varsayılan intent ve hata sayacı.
+import logging
+from intent import FILM_QUERY
+from instrumentation import metrics
 
 # Literal tipiyle intent alanının yalnızca iki olası değer almasını sağlıyoruz.
 from typing import Literal
 
 # Chat prompt'larını daha kolay kurmak için LangChain'in ChatPromptTemplate yardımcı sınıfını kullanıyoruz.
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
 
 # Pydantic ile yapılandırılmış (typed) çıktı modelini tanımlamak için gerekli sınıflar.
 from pydantic import BaseModel, Field
 
 
+logger = logging.getLogger(__name__)
+
+
 class RouteIntent(BaseModel):
     # Bu model, LLM'den beklediğimiz yapılandırılmış çıktının şemasını tanımlar.
     # LLM'den sadece {'intent': 'film_query' } veya {'intent': 'general_chat'}
@@ -34,10 +49,26 @@ class RouteIntent(BaseModel):
     )
 
 
-# LLM üzerinde yukarıdaki Pydantic modelini kullanarak yapılandırılmış çıktı (structured output)
-# isteğinde bulunabilmek için helper oluştuyoruz. Bu, LLM cevabını otomatik olarak
-# RouteIntent modeline parse etmeye çalışacak.
-structured_intent_router = llm.with_structured_output(RouteIntent)
+# Router prompt'undaki etiketli örnekler. Aynı örnekler yerel hızlı sınıflandırıcıda
+# (graph/chains/fast_intent.py) intent prototipi olarak da kullanılıyor.
+FILM_QUERY_EXAMPLES = [
+    "Avatar filmi nasıldı?",
+    "İyi bir bilim kurgu önerir misin?",
+    "Bugün ne izlememi önerirsin?",
+    "Komedi modundayım",
+    "James Cameron hangi filmleri yönetti?",
+    "Avatar yorumları nasıl?",
+]
+GENERAL_CHAT_EXAMPLES = [
+    "Merhaba nasılsın?",
+    "Bugün hava nasıl?",
+    "Teşekkürler",
+]
+
+
+def _example_lines(examples: list[str]) -> str:
+    # Örnekleri prompt'taki madde listesi biçimine çevirir.
+    return "\n".join(f'    - "{example}"' for example in examples)
 
 
 # Sistem prompt'u: LLM'ye nasıl davranacağını ve hangi kurallara uyacağını söylüyoruz.
@@ -59,19 +90,12 @@ TANIMLAR:
   • Belirli filmlerin değerlendirmeleri
   • "Ne izlemeliyim?", "Film öner", "Hangi film iyi?" gibi sorular
   • Örnekler:
-    - "Avatar filmi nasıldı?"
-    - "İyi bir bilim kurgu önerir misin?"
-    - "Bugün ne izlememi önerirsin?"
-    - "Komedi modundayım"
-    - "James Cameron hangi filmleri yönetti?"
-    - "Avatar yorumları nasıl?"
+""" + _example_lines(FILM_QUERY_EXAMPLES) + """
 - general_chat:
   • Sadece selamlaşma, hal hatır, genel sohbet
   • Film ile hiçbir ilgisi olmayan konular
   • Örnekler:
-    - "Merhaba nasılsın?"
-    - "Bugün hava nasıl?"
-    - "Teşekkürler"
+""" + _example_lines(GENERAL_CHAT_EXAMPLES) + """
 
 ÖNEMLİ: Şüpheli durumlarda film_query seç. Film kelimesi geçmese bile eğlence/izleme ile ilgiliyse film_query seç.
 
@@ -89,7 +113,48 @@ intent_prompt = ChatPromptTemplate.from_messages(
 )
 
 
-# Son olarak prompt ile structured output router'ı zincirleyerek tek bir "question_router"
-# oluşturuyoruz. Bu nesne invoke edildiğinde önce prompt hazırlanır, sonra LLM'den
-# yapılandırılmış (RouteIntent) JSON bekler.
-question_router = intent_prompt | structured_intent_router
\ No newline at end of file
+def _fallback_intent(error: Exception) -> RouteIntent:
+    logger.warning("Intent router başarısız (%s: %s); mesaj film sorgusu sayıldı.", type(error).__name__, error)
+    metrics.inc("router_errors_total", help="Cevap veremeyen intent router çağrıları.")
+    return RouteIntent(intent=FILM_QUERY)
+
+
+@lru_cache(maxsize=None)
+def get_question_router():
+    # LLM üzerinde yukarıdaki Pydantic modelini kullanarak yapılandırılmış çıktı (structured output)
+    # isteğinde bulunabilmek için helper oluşturuyoruz. Bu, LLM cevabını otomatik olarak
+    # RouteIntent modeline parse etmeye çalışacak.
+    structured_intent_router = get_llm().with_structured_output(RouteIntent)
+
+    # Son olarak prompt ile structured output router'ı zincirleyerek tek bir "question_router"
+    # oluşturuyoruz. Bu nesne invoke edildiğinde önce prompt hazırlanır, sonra LLM'den
+    # yapılandırılmış (RouteIntent) JSON bekler. LLM istemcisi import anında değil, ilk
+    # kullanımda kurulur.
+    chain = intent_prompt | structured_intent_router
+
+    # Sınıflandırma sadece mesaja bağlı olduğu için router cevapları LLM önbelleğinde
+    # uzun süre (ROUTER_TTL) saklanır; aynı soru tekrar geldiğinde LLM'e gidilmez.
+    # LLM tekrar denemelere ve yedek modellere rağmen cevap veremezse tur düşmesin
+    # diye mesaj film sorgusu sayılır (generate kendi hatasını kullanıcıya gösterir).
+    def route(inputs, config):
+        try:
+            with cache_ttl(ROUTER_TTL):
+                return chain.invoke(inputs, config)
+        except Exception as e:
+            return _fallback_intent(e)
+
+    async def aroute(inputs, config):
+        try:
+            with cache_ttl(ROUTER_TTL):
+                return await chain.ainvoke(inputs, config)
+        except Exception as e:
+            return _fallback_intent(e)
+
+    return RunnableLambda(route, afunc=aroute, name="question_router")
+
+
+def __getattr__(name: str):
+    # Geriye dönük uyumluluk: `from graph.chains.route import question_router`.
+    if name == "question_router":
+        return get_question_router()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
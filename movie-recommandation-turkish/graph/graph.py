@@ -1,63 +1,260 @@
 # Bu dosya, uygulamanın akış (workflow) grafını tanımlar.
 # Yani kullanıcı mesajı geldiğinde hangi düğümlerin (nodes) hangi sırayla çalışacağını belirler.
 
+# Çalışma modunu (sıralı / spekülatif) ortam değişkeninden okumak için.
+import os
+# Asenkron intent tespitinde CPU işini event loop dışına almak için.
+import asyncio
+
 # StateGraph ve END sabitini langgraph kütüphanesinden alıyoruz. StateGraph, düğümleri ve
 # geçişleri (edges) tanımlamamızı sağlayan ana sınıftır. END grafın sonunu işaret eder.
 from langgraph.graph import StateGraph, END
 
+# Senkron/asenkron gövdeleri tek bir Runnable'da birleştirmek için.
+from langchain_core.runnables import RunnableLambda
+
 # GraphState, graf boyunca taşınacak durum nesnesinin (state) tipini tanımlar.
 from graph.state import GraphState
 
 # Route dosyasında tanımladığımız question_router; kullanıcı mesajından intent'i
 # çıkaran (film_query vs general_chat) LLM tabanlı sınıflandırıcıdır.
-from graph.chains.route import question_router
+from graph.chains.route import get_question_router
+
+# LLM router'ından önce çalışan yerel sınıflandırıcı ve kararın kaynağını
+# (LLM çağrısının ne kadar atlandığını) metriğe yazan yardımcı.
+from graph.chains.fast_intent import local_intent, record_router_decision
+
+# Grafın düğümleri: veri getirme, yanıt üretme ve genel sohbet. Her biri hem senkron
+# hem de asenkron gövdeye sahip bir Runnable'dır; böylece aynı derlenmiş graf
+# `app.invoke` ile thread bloklayarak, `app.ainvoke` ile tamamen asenkron çalışır.
+from graph.nodes.retrieve import movie_retrieve_node
+from graph.nodes.generate import generate_node
+from graph.nodes.general_chat import general_chat_node
+
+# Intent belirlenirken retrieval'ı paralel başlatan spekülatif yönlendirme node'u.
+from graph.nodes.speculative_route import speculative_route_node
 
-# Grafın düğümleri: veri getirme, yanıt üretme ve genel sohbet için tanımlanmış fonksiyonlar.
-from graph.nodes.retrieve import movie_retrieve
-from graph.nodes.generate import generate
-from graph.nodes.general_chat import general_chat
+# Puan/yönetmen/tür gibi olgu sorularını film tablosundan LLM'siz cevaplayan node.
+from graph.nodes.fact_lookup import fact_lookup_node
 
 # intent.py içinde iki sabit tanımlı: FILM_QUERY ve GENERAL_CHAT. Bunları burada kullanacağız.
 from intent import FILM_QUERY, GENERAL_CHAT
 
+# İstek başına trace id ve node süreleri (bkz. instrumentation.py).
+from instrumentation import traced, start_trace
 
+# İstek boyunca indeksin aynı anlık görüntüsü kullanılır (bkz. snapshots.py).
+from resources import snapshot_lease
+
+
+@traced("detect_intent")
 def detect_intent(state: GraphState):
     # Bu fonksiyon grafın giriş noktasında çağrılır.
-    # state.message içindeki kullanıcı mesajını alır, question_router ile LLM'e gönderir
-    # ve dönen yapılandırılmış sonuçtan (RouteIntent) intent değerini alıp döndürür.
-    out = question_router.invoke({"question": state.message})
+    # Önce yerel hızlı sınıflandırıcıyı deniyoruz; bariz mesajlarda (selamlaşma,
+    # açık film soruları, hafızadaki filmlere takip soruları) LLM çağrısına hiç gerek kalmaz.
+    decision = local_intent(state)
+    record_router_decision(decision)
+    if decision is not None:
+        return decision.intent
+
+    # Emin olunamayan mesajları question_router ile LLM'e gönderiyoruz ve dönen
+    # yapılandırılmış sonuçtan (RouteIntent) intent değerini alıp döndürüyoruz.
+    out = get_question_router().invoke({"question": state.message})
     return out.intent
 
 
-# StateGraph'in örneğini oluşturuyoruz; GraphState tipini her node'un alacağı durum nesnesi
-# olarak belirtiyoruz.
-workflow = StateGraph(GraphState)
+@traced("detect_intent")
+async def adetect_intent(state: GraphState):
+    # detect_intent'in asenkron sürümü. Yerel sınıflandırıcı CPU'da embedding hesapladığı
+    # için thread'e alınır; LLM router ise asenkron HTTP ile çağrılır.
+    decision = await asyncio.to_thread(local_intent, state)
+    record_router_decision(decision)
+    if decision is not None:
+        return decision.intent
+
+    out = await get_question_router().ainvoke({"question": state.message})
+    return out.intent
+
+
+# Koşullu giriş noktası olarak kullanılan intent tespiti (senkron + asenkron).
+detect_intent_node = RunnableLambda(detect_intent, afunc=adetect_intent)
+
+# FactLookup node'u soruyu cevapladıysa akış doğrudan biter.
+FACT_ANSWERED = "fact_answered"
+
+# Olgu sorusu kısa yolu varsayılan olarak açıktır; FACT_FAST_PATH=0 ile kapatılabilir.
+fact_fast_path = os.environ.get("FACT_FAST_PATH", "1") != "0"
+
+
+def route_after_fact(state: GraphState):
+    # Sıralı modda FactLookup'tan sonra: cevap hazırsa bitir, değilse intent'i belirle.
+    if state.answer is not None:
+        return FACT_ANSWERED
+    return detect_intent(state)
+
+
+async def aroute_after_fact(state: GraphState):
+    if state.answer is not None:
+        return FACT_ANSWERED
+    return await adetect_intent(state)
+
+
+route_after_fact_node = RunnableLambda(route_after_fact, afunc=aroute_after_fact)
+
+
+def route_after_fact_speculative(state: GraphState):
+    # Spekülatif modda cevaplanmayan sorular Route node'una gider.
+    return FACT_ANSWERED if state.answer is not None else "Route"
+
+
+def route_after_speculation(state: GraphState):
+    # Spekülatif modda intent, Route node'u tarafından state'e yazılır.
+    return state.intent
+
+
+def build_workflow(speculative: bool = False, fact_lookup: bool = None) -> StateGraph:
+    """Uygulamanın grafını kurar.
+
+    Args:
+        speculative: True ise intent belirlenirken retrieval paralel başlatılır
+            (bkz. graph/nodes/speculative_route.py); False ise klasik sıralı akış.
+        fact_lookup: True ise giriş noktası olgu sorusu kısa yoludur
+            (bkz. graph/nodes/fact_lookup.py); verilmezse `fact_fast_path`.
+    """
+    if fact_lookup is None:
+        fact_lookup = fact_fast_path
+
+    # StateGraph'in örneğini oluşturuyoruz; GraphState tipini her node'un alacağı durum nesnesi
+    # olarak belirtiyoruz.
+    workflow = StateGraph(GraphState)
+
+    # Grafın düğümlerini ekliyoruz. Her düğüm bir fonksiyon referansı alır ve çağrıldığında
+    # GraphState'i alıp güncelleyerek yeni alanlar ekleyebilir (ör. context, answer).
+    workflow.add_node("Generate", generate_node)
+    workflow.add_node("GeneralChat", general_chat_node)
+
+    if speculative:
+        # Route node'u intent'i ve (film sorusuysa) retrieval sonucunu birlikte üretir;
+        # bu yüzden film sorgusu doğrudan Generate'e gider.
+        workflow.add_node("Route", speculative_route_node)
+        if fact_lookup:
+            # Önce olgu sorusu kısa yolu; cevaplanamayan sorular Route'a geçer.
+            workflow.add_node("FactLookup", fact_lookup_node)
+            workflow.set_entry_point("FactLookup")
+            workflow.add_conditional_edges(
+                "FactLookup",
+                route_after_fact_speculative,
+                {
+                    FACT_ANSWERED: END,
+                    "Route": "Route",
+                }
+            )
+        else:
+            workflow.set_entry_point("Route")
+        workflow.add_conditional_edges(
+            "Route",
+            route_after_speculation,
+            {
+                FILM_QUERY: "Generate",
+                GENERAL_CHAT: "GeneralChat",
+            }
+        )
+    else:
+        workflow.add_node("MovieRetrieve", movie_retrieve_node)
+
+        if fact_lookup:
+            # Giriş noktası olgu sorusu kısa yoludur. Cevap tablodan üretildiyse akış biter;
+            # aksi halde intent belirlenir ve olağan düğümlere geçilir.
+            workflow.add_node("FactLookup", fact_lookup_node)
+            workflow.set_entry_point("FactLookup")
+            workflow.add_conditional_edges(
+                "FactLookup",
+                route_after_fact_node,
+                {
+                    FACT_ANSWERED: END,
+                    FILM_QUERY: "MovieRetrieve",
+                    GENERAL_CHAT: "GeneralChat",
+                }
+            )
+        else:
+            # Giriş noktasını koşullu hale getiriyoruz: detect_intent fonksiyonu hangi intent'i
+            # döndürürse graf o intent'e karşılık gelen düğümü başlatacak.
+            workflow.set_conditional_entry_point(
+                detect_intent_node,
+                {
+                    FILM_QUERY: "MovieRetrieve",
+                    GENERAL_CHAT: "GeneralChat",
+                }
+            )
+
+        # Film verisi getirildikten sonra `Generate` çalışsın.
+        workflow.add_edge("MovieRetrieve", "Generate")
+
+    # `Generate` veya `GeneralChat` tamamlandığında ise akış sonlansın (END).
+    workflow.add_edge("Generate", END)
+    workflow.add_edge("GeneralChat", END)
+    return workflow
+
+
+# Her iki mod da derlenip dışarı açılıyor; `app` varsayılan olarak sıralı akıştır.
+# SPECULATIVE_RETRIEVAL=1 ortam değişkeni ile spekülatif mod varsayılan yapılabilir.
+# Derlenmiş graf hem `app.invoke` (senkron) hem de `app.ainvoke` (asenkron) ile çağrılabilir.
+sequential_app = build_workflow(speculative=False).compile()
+speculative_app = build_workflow(speculative=True).compile()
+
+app = speculative_app if os.environ.get("SPECULATIVE_RETRIEVAL") == "1" else sequential_app
+
 
+# Token'ları arayüze akıtılacak node'lar: sadece kullanıcıya dönen cevabı üretenler.
+# (Router'ın yapılandırılmış çıktı çağrıları bu yüzden akışa karışmaz.)
+ANSWER_NODES = {"Generate", "GeneralChat"}
 
-# Grafın düğümlerini ekliyoruz. Her düğüm bir fonksiyon referansı alır ve çağrıldığında
-# GraphState'i alıp güncelleyerek yeni alanlar ekleyebilir (ör. context, answer).
-workflow.add_node("MovieRetrieve", movie_retrieve)
-workflow.add_node("Generate", generate)
-workflow.add_node("GeneralChat", general_chat)
 
+def stream_answer(state: GraphState, result: dict, graph=None):
+    """Grafı çalıştırır ve cevap token'larını geldikçe üretir (generator).
 
-# Giriş noktasını koşullu hale getiriyoruz: detect_intent fonksiyonu hangi intent'i
-# döndürürse graf o intent'e karşılık gelen düğümü başlatacak.
-workflow.set_conditional_entry_point(
-    detect_intent,
-    {
-        FILM_QUERY: "MovieRetrieve",
-        GENERAL_CHAT: "GeneralChat",
-    }
-)
+    Args:
+        state: Grafın giriş durumu.
+        result: Akış bittiğinde grafın son state değerleriyle doldurulur
+            (ör. `result["answer"]`).
+        graph: Kullanılacak derlenmiş graf; verilmezse `app`.
 
+    Yields:
+        Generate / GeneralChat node'larının ürettiği metin parçaları. LLM'siz üretilen
+        cevaplar (ör. FactLookup) akış bitince tek parça olarak verilir.
 
-# Noktalar arası geçişleri tanımlıyoruz: Film verisi getirildikten sonra `Generate` çalışsın,
-# `Generate` veya `GeneralChat` tamamlandığında ise akış sonlansın (END).
-workflow.add_edge("MovieRetrieve", "Generate")
-workflow.add_edge("Generate", END)
-workflow.add_edge("GeneralChat", END)
+    Her çağrı kendi trace id'siyle izlenir; id akış bitince `result["trace_id"]` alanına yazılır.
+    """
+    streamed = False
+    with start_trace(message_chars=len(state.message)) as trace, snapshot_lease():
+        # "messages" modu LLM token'larını, "values" modu ise her adımdaki tam state'i verir.
+        for mode, payload in (graph or app).stream(state, stream_mode=["messages", "values"]):
+            if mode == "messages":
+                chunk, metadata = payload
+                if metadata.get("langgraph_node") in ANSWER_NODES and chunk.content:
+                    streamed = True
+                    yield chunk.content
+            else:
+                result.clear()
+                result.update(payload)
+    result["trace_id"] = trace.trace_id
+    if not streamed and result.get("answer"):
+        yield result["answer"]
 
 
-# Grafı derleyip (compile) kullanıma hazır hale getiriyoruz; `app` bu derlenmiş workflow objesidir.
-app = workflow.compile()
\ No newline at end of file
+async def astream_answer(state: GraphState, result: dict, graph=None):
+    """`stream_answer`ın asenkron sürümü (async generator)."""
+    streamed = False
+    with start_trace(message_chars=len(state.message)) as trace, snapshot_lease():
+        async for mode, payload in (graph or app).astream(state, stream_mode=["messages", "values"]):
+            if mode == "messages":
+                chunk, metadata = payload
+                if metadata.get("langgraph_node") in ANSWER_NODES and chunk.content:
+                    streamed = True
+                    yield chunk.content
+            else:
+                result.clear()
+                result.update(payload)
+    result["trace_id"] = trace.trace_id
+    if not streamed and result.get("answer"):
+        yield result["answer"]
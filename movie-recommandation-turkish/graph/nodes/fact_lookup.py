@@ -0,0 +1,69 @@
+"""
+Basit olgu sorularını LLM'siz cevaplayan node.
+
+"Avatar'ın puanı kaç?", "Inception'ı kim yönetti?" gibi sorular film tablosundan
+(graph/chains/fact_question.py) şablon bir cevapla yanıtlanır; yönlendirme,
+arama ve `generate` adımları hiç çalışmaz. Soru tanınmazsa node state'i
+değiştirmez ve graf olağan akışa (intent tespiti → retrieval → generate) devam eder.
+
+Cevaplanan filmin kimliği, `type="fact"` olan tek bir dokümanla `retrieved_docs`
+alanına yazılır; böylece konuşma hafızası filmi hatırlar ve "peki konusu ne?"
+gibi takip soruları aynı filme gider (bkz. retrieval.follow_up_docs).
+"""
+
+import asyncio
+
+# Senkron ve asenkron gövdeleri tek node'da birleştirmek için.
+from langchain_core.runnables import RunnableLambda
+from langchain_core.documents import Document
+
+# Olgu sorusu tespiti ve tablodan cevap.
+from graph.chains.fact_question import answer_fact_question
+
+from intent import FILM_QUERY
+
+# Node süresi istek izine, cevaplanan/düşülen sorular metriklere yazılır.
+from instrumentation import traced, annotate, metrics
+
+
+def _lookup(state) -> dict:
+    fact = answer_fact_question(state.message)
+    metrics.inc("fact_lookup_total", help="Olgu sorusu kısa yolu.", result="answered" if fact else "fallback")
+    if fact is None:
+        annotate(answered=False)
+        return state.dict()
+
+    annotate(answered=True, fields=",".join(fact.fields))
+    doc = Document(
+        page_content=fact.answer,
+        metadata={"movie_id": fact.movie_id, "name": fact.name, "type": "fact"},
+    )
+    return {
+        **state.dict(),
+        "intent": FILM_QUERY,
+        "retrieved_docs": [doc],
+        "answer": fact.answer,
+    }
+
+
+@traced("fact_lookup")
+def fact_lookup(state):
+    """Olgu sorusuysa `answer` (ve `intent`, `retrieved_docs`) alanlarını doldurur.
+
+    Args:
+        state: GraphState veya benzeri, `message` alanı içeren nesne.
+
+    Returns:
+        Cevaplandıysa güncellenmiş state dict'i, aksi halde değişmemiş state dict'i.
+    """
+    return _lookup(state)
+
+
+@traced("fact_lookup")
+async def afact_lookup(state):
+    """`fact_lookup`ın asenkron sürümü; tablo (ilk kez ya da değiştiyse) thread'de okunur."""
+    return await asyncio.to_thread(_lookup, state)
+
+
+# Graf'a eklenecek node: invoke'ta senkron, ainvoke'ta asenkron gövde çalışır.
+fact_lookup_node = RunnableLambda(fact_lookup, afunc=afact_lookup)
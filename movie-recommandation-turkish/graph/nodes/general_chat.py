@@ -2,46 +2,99 @@
 Basit bir "general chat" node'u.
 
 Bu dosya iki ana parçadan oluşur:
-- `llm` importu: `open_router` modülünden dışarı aktarılan bir LLM
-  (örneğin OpenRouter veya başka bir adapter) örneğini alır.
+- `get_llm` importu: `open_router` adapter'ının paylaşılan LLM örneğini
+  (ilk çağrıda oluşturulur) döndürür.
 - `general_chat` fonksiyonu: gelen `state` içindeki `message`'ı
   kullanarak LLM'e bir prompt gönderir ve dönen cevabı state'e ekleyerek
   yeni bir dict döner.
 
-Not: Bu node doğrudan `state` objesinin dict temsiline ekleme yapar.
+Not: Bu node doğrudan `state` objesinin dict temsiline ekleme yapar. Cevap
+token token (stream) üretilir; tam metin yine `answer` alanına yazılır.
+`ageneral_chat` asenkron sürümdür; `general_chat_node` ikisini birleştirir.
 """
 
-# LLM adapter'ını içe aktarıyoruz. `open_router.llm` projenizde bir LLM
-# çağırma wrapper'ıdır; invoke/metodunu kullanarak prompt'a yanıt alır.
-from open_router import llm
+# Senkron ve asenkron gövdeleri tek node'da birleştirmek için.
+from langchain_core.runnables import RunnableLambda
 
+# LLM adapter'ını içe aktarıyoruz. `get_llm()` projenizdeki LLM çağırma
+# wrapper'ını döner; istemci import anında değil, ilk çağrıda kurulur.
+from resources import get_llm
 
-def general_chat(state):
-    """General chat node'u.
+# Node süresi istek izine (trace) ve metriklere yazılır.
+from instrumentation import traced
 
-    Args:
-        state: GraphState veya benzeri, içinde `message` alanı bulunan nesne.
+# Konuşma hafızasını (özet + son mesajlar) prompt'a eklemek için.
+from conversation_memory import format_history
 
-    Döndürür:
-        state sözlüğünün güncellenmiş hali (`answer` alanı eklenmiş).
-    """
+# Selamlaşmaları tanıyan kurallar ve LLM önbelleğinde saklama süresi.
+from graph.chains.fast_intent import FastIntentClassifier
+from llm_cache import cache_ttl, GREETING_TTL
+from intent import GENERAL_CHAT
+
+
+def build_prompt(state) -> str:
+    """GeneralChat prompt'unu hazırlar."""
 
     # Prompt'u oluşturuyoruz. Burada LLM'e, bir film asistanı olduğunu ve
     # kullanıcıyla nazikçe sohbet etmesini söylüyoruz. Eğer kullanıcı film
     # ile ilgili soru soruyorsa, daha spesifik sorular sorması yönünde yönlendirme
-    # de ekliyoruz.
-    prompt = f"""
+    # de ekliyoruz. Önceki konuşma varsa mesajdan önce veriyoruz.
+    history = format_history(state)
+    if history:
+        history += "\n\n"
+    return f"""
 Sen yardımcı bir film asistanısın. Kullanıcıyla nazik bir şekilde sohbet et.
 
 Eğer kullanıcı film hakkında soru sorarsa, onları film sorularını daha spesifik şekilde sormaya yönlendir.
 
-Kullanıcı mesajı: {state.message}
+{history}Kullanıcı mesajı: {state.message}
 
 Yanıt:"""
 
-    # LLM'i çağırıp cevabı alıyoruz. `invoke` metodunun döndürdüğü objeden
-    # `.content` ile düz metin cevabı alıyoruz (open_router adapter'ınıza bağlı).
-    ans = llm.invoke(prompt).content
+
+def _cache_ttl(state):
+    # "Merhaba", "Teşekkürler" gibi bariz selamlaşmaların cevabı LLM önbelleğinde
+    # uzun süre saklanır; diğer mesajlarda önbelleğin varsayılan süresi geçerlidir.
+    decision = FastIntentClassifier.classify_by_rules(state.message)
+    return cache_ttl(GREETING_TTL if decision and decision.intent == GENERAL_CHAT else None)
+
+
+@traced("general_chat")
+def general_chat(state):
+    """General chat node'u.
+
+    Args:
+        state: GraphState veya benzeri, içinde `message` alanı bulunan nesne.
+
+    Döndürür:
+        state sözlüğünün güncellenmiş hali (`answer` alanı eklenmiş).
+    """
+
+    # LLM'i stream modunda çağırıp parçaları birleştiriyoruz. Her parçanın
+    # `.content` alanı düz metin token'ıdır (open_router adapter'ınıza bağlı).
+    # Graf `stream_mode="messages"` ile çalıştırıldığında bu token'lar anında arayüze akar.
+    try:
+        with _cache_ttl(state):
+            ans = "".join(chunk.content for chunk in get_llm().stream(build_prompt(state)))
+    except Exception as e:
+        # Süre sınırı/tekrar denemeler/yedek modeller de başarısız olduysa turu
+        # düşürmek yerine hatayı cevap olarak gösteriyoruz (generate ile aynı).
+        ans = f"Bir hata oluştu: {e}"
 
     # Orijinal state'i dict'e çevirip `answer` alanını ekleyerek döndürüyoruz.
     return {**state.dict(), "answer": ans}
+
+
+@traced("general_chat")
+async def ageneral_chat(state):
+    """`general_chat`in asenkron sürümü."""
+    try:
+        with _cache_ttl(state):
+            parts = [chunk.content async for chunk in get_llm().astream(build_prompt(state))]
+    except Exception as e:
+        parts = [f"Bir hata oluştu: {e}"]
+    return {**state.dict(), "answer": "".join(parts)}
+
+
+# Graf'a eklenecek node: invoke'ta senkron, ainvoke'ta asenkron gövde çalışır.
+general_chat_node = RunnableLambda(general_chat, afunc=ageneral_chat)
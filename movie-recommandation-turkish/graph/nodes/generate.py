@@ -6,33 +6,43 @@ Davranış:
 - `context` varsa prompt içinde bağlam olarak verilir.
 - `message` kullanıcı isteğidir; prompt içerisinde soru olarak yer alır.
 - Eğer LLM çağrısı başarısız olursa, hata mesajını `answer` alanına yazar.
+- Cevap token token üretilir (stream); graf stream edilirken token'lar anında
+  arayüze ulaşır, tamamlandığında ise tam metin `answer` alanına yazılır.
+- `agenerate` asenkron sürümdür (`llm.astream`); `generate_node` ikisini birleştirir.
 """
 
-# LLM adapter'ını içe aktarıyoruz. open_router projesindeki llm wrapper'ı
-# invoke/metodu ile prompt'a yanıt almayı sağlar.
-from open_router import llm
+# Senkron ve asenkron gövdeleri tek node'da birleştirmek için.
+from langchain_core.runnables import RunnableLambda
 
+# LLM adapter'ı: open_router projesindeki llm wrapper'ı prompt'a yanıt almayı sağlar.
+# İstemci import anında değil, ilk çağrıda oluşturulur ve süreç genelinde paylaşılır.
+from resources import get_llm
 
-def generate(state):
-    """LLM'den yanıt üretir.
+# Node süresi istek izine (trace) ve metriklere yazılır.
+from instrumentation import traced
 
-    Args:
-        state: GraphState veya benzeri, `message` ve opsiyonel `context` alanları içerir.
+# Konuşma hafızasını (özet + son mesajlar) prompt'a eklemek için.
+from conversation_memory import format_history
 
-    Returns:
-        state dict'i güncellenmiş `answer` ve `generation` alanları ile.
-    """
+
+def build_prompt(state) -> str:
+    """Kullanıcı sorusu ve bağlamdan Generate prompt'unu hazırlar."""
 
     # Eğer context None ise boş string ile değiştirelim (prompt'a güvenli şekilde eklemek için).
     context = state.context or ""
     message = state.message.strip()
 
+    # Önceki konuşma varsa ("peki yönetmeni kim?" gibi takip soruları için) sorudan önce veriyoruz.
+    history = format_history(state)
+    if history:
+        history += "\n\n"
+
     # Prompt'u hazırlıyoruz: kullanıcının sorusu ve varsa bağlam burada sunulur.
-    prompt = f"""
+    return f"""
 Sen bir film öneri asistanısın.
 Aşağıda sana filmle ilgili bağlam bilgileri verilmiştir.
 
-Soru: {message}
+{history}Soru: {message}
 
 Bağlam:
 {context}
@@ -41,19 +51,58 @@ Eğer filmle ilgili bilgiler verilmişse, bu bilgiler üzerinden net ve kısa bi
 Eğer verilmemişse, "film bulunamadı" deme; sadece "Bu film hakkında bilgi bulunamadı" şeklinde kibar bir yanıt ver.
 """
 
+
+def _chunk_text(chunk) -> str:
+    # Bazı adapterlar direkt content attribute döner, bazıları farklı yapıda olabilir.
+    # getattr ile hem `.content` varsa onu kullanıyoruz, yoksa objeyi string'e çeviriyoruz.
+    return getattr(chunk, "content", str(chunk))
+
+
+def _answer_update(state, answer: str) -> dict:
+    # Hem generation (ara üretim) hem de answer alanını aynı metinle dolduruyoruz.
+    answer = answer.strip()
+    return {**state.dict(), "answer": answer, "generation": answer}
+
+
+def _error_update(state, e: Exception) -> dict:
+    # Hata durumunda kullanıcıya anlaşılır bir hata mesajı döneriz; generation boş bırakılır.
+    return {
+        **state.dict(),
+        "answer": f"Bir hata oluştu: {e}",
+        "generation": ""
+    }
+
+
+@traced("generate")
+def generate(state):
+    """LLM'den yanıt üretir.
+
+    Args:
+        state: GraphState veya benzeri, `message` ve opsiyonel `context` alanları içerir.
+
+    Returns:
+        state dict'i güncellenmiş `answer` ve `generation` alanları ile.
+    """
+    prompt = build_prompt(state)
     try:
-        # LLM'i çağır ve cevabı al
-        response = llm.invoke(prompt)
-        # Bazı adapterlar direkt content attribute döner, bazıları farklı yapıda olabilir.
-        # getattr ile hem `.content` varsa onu kullanıyoruz, yoksa objeyi string'e çeviriyoruz.
-        answer = getattr(response, "content", str(response)).strip()
-
-        # Hem generation (ara üretim) hem de answer alanını aynı metinle dolduruyoruz.
-        return {**state.dict(), "answer": answer, "generation": answer}
+        # LLM'i stream modunda çağırıyoruz: token'lar geldikçe grafın streaming API'si
+        # (`app.stream(..., stream_mode="messages")`) üzerinden arayüze iletilir.
+        # Parçaları biriktirip tam cevabı da state'e yazıyoruz.
+        return _answer_update(state, "".join(_chunk_text(chunk) for chunk in get_llm().stream(prompt)))
     except Exception as e:
-        # Hata durumunda kullanıcıya anlaşılır bir hata mesajı döneriz; generation boş bırakılır.
-        return {
-            **state.dict(),
-            "answer": f"Bir hata oluştu: {e}",
-            "generation": ""
-        }
+        return _error_update(state, e)
+
+
+@traced("generate")
+async def agenerate(state):
+    """`generate`in asenkron sürümü; bekleme sırasında thread bloklanmaz."""
+    prompt = build_prompt(state)
+    try:
+        parts = [_chunk_text(chunk) async for chunk in get_llm().astream(prompt)]
+        return _answer_update(state, "".join(parts))
+    except Exception as e:
+        return _error_update(state, e)
+
+
+# Graf'a eklenecek node: invoke'ta senkron, ainvoke'ta asenkron gövde çalışır.
+generate_node = RunnableLambda(generate, afunc=agenerate)
@@ -4,16 +4,40 @@ uygun bir metin bağlamı (context) oluşturur.
 
 Ana adımlar:
 - `query` oluşturma: kullanıcı mesajından temizlenmiş sorgu alınır.
-- `movie_retriever.invoke(query)`: embedding tabanlı arama yapılarak ilgili dokümanlar getirilir.
+- Takip sorusu: mesaj önceki cevaptaki filmlere atıf yapıyorsa ("peki yönetmeni
+  kim?") önceki turun dokümanları yeniden arama yapılmadan kullanılır.
+- Sorgu anlama: mesajdan tür, yönetmen, en düşük puan ve doküman tipi çıkarılır
+  (graph/chains/query_filters.py) ve aramaya metadata filtresi olarak verilir.
+- Arama (retrieval.py): sorguda film/yönetmen adı geçiyorsa doğrudan o filmlerin
+  chunk'ları getirilir; aksi halde vektör ve BM25 sonuçları birleştirilir (hibrit).
 - Eğer sonuç yoksa, kullanıcıya uygun bir uyarı (context) döndürülür.
-- Sonuç varsa, duplicate olmaması için (film adı, tip) ikilisiyle filtreleme yapılır
-  ve her dokümandan okunabilir bir blok üretilir.
+- Sonuç varsa bağlam `context_builder` ile paketlenir: chunk'lar filme göre
+  gruplanır (metadata film başına bir kez), yakın kopya yorumlar atlanır ve
+  metin token bütçesine (`CONTEXT_TOKEN_BUDGET`) göre kırpılır.
+
+`amovie_retrieve` aynı işin asenkron sürümüdür (`asearch`);
+`movie_retrieve_node` ikisini graf için tek bir Runnable'da birleştirir.
 """
 
-# Vektör veritabanı/retriever'ı içe aktarıyoruz (ingestion.py içinde oluşturulan Chroma retriever).
-from ingestion import movie_retriever
+import asyncio
+
+# Senkron ve asenkron gövdeleri tek node'da birleştirmek için.
+from langchain_core.runnables import RunnableLambda
+
+# İsim kısa devresi + hibrit (sözcüksel/vektör) arama stratejisi.
+from retrieval import search, asearch, follow_up_docs
+
+# Sorgudan metadata filtreleri çıkaran kural tabanlı sorgu anlama adımı.
+from graph.chains.query_filters import extract_filters
 
+# Token bütçeli bağlam paketleyici.
+from context_builder import context_builder
 
+# Node süresi, getirilen doküman sayısı ve bağlam token'ları istek izine yazılır.
+from instrumentation import traced, annotate, metrics, COUNT_BUCKETS
+
+
+@traced("movie_retrieve")
 def movie_retrieve(state):
     """Film verisini RAG için getirir ve biçimlendirir.
 
@@ -27,8 +51,32 @@ def movie_retrieve(state):
     # Kullanıcının sorgusunu temizleyip kullanıyoruz.
     query = state.message.strip()
 
-    # Retriever'ı çağırıyoruz. adapter'a göre `.invoke` kullanılıyor.
-    docs = movie_retriever.invoke(query)
+    filters = extract_filters(query)
+
+    # Takip sorusuysa ("peki yönetmeni kim?") önceki turun filmleri yeniden aranmadan kullanılır.
+    docs = follow_up_docs(query, filters, state.movie_ids, state.previous_docs)
+    if docs is None:
+        # Sorgudan çıkarılan filtrelerle arama yapıyoruz. Filtreli arama boş dönerse
+        # (ör. eski şemayla kurulmuş koleksiyon) search filtresiz aramaya düşer.
+        docs = search(query, filters)
+    return build_retrieval_result(state, docs)
+
+
+@traced("movie_retrieve")
+async def amovie_retrieve(state):
+    """`movie_retrieve`un asenkron sürümü; event loop'u bloklamadan arama yapar."""
+    query = state.message.strip()
+    filters = extract_filters(query)
+    docs = await asyncio.to_thread(follow_up_docs, query, filters, state.movie_ids, state.previous_docs)
+    if docs is None:
+        docs = await asearch(query, filters)
+    return build_retrieval_result(state, docs)
+
+
+def build_retrieval_result(state, docs):
+    """Getirilen dokümanlardan state güncellemesini (retrieved_docs, context) üretir."""
+    metrics.observe("retrieved_docs", len(docs or []), buckets=COUNT_BUCKETS, help="Getirilen doküman sayısı.")
+    annotate(retrieved_docs=len(docs or []))
 
     # Eğer hiçbir doküman gelmediyse, uygun bir context mesajı döneriz.
     if not docs or len(docs) == 0:
@@ -38,40 +86,17 @@ def movie_retrieve(state):
             "context": "Veri tabanında ilgili film bulunamadı."
         }
 
-    context_blocks = []
-    # Aynı film ve tip kombinasyonunu tekrarlamamak için set ile takip ediyoruz.
-    seen = set()
-
-    for doc in docs:
-        # Metadata içinden film adı ve doküman tipi (desc veya review vb.) alınır.
-        name = doc.metadata.get("name", "Bilinmeyen Film")
-        dtype = doc.metadata.get("type", "bilgi")
-
-        # (isim, tip) ile duplicate kontrolü
-        key = (name, dtype)
-        if key in seen:
-            continue
-        seen.add(key)
-
-        # Eğer metadata içinde eksik alanlar varsa okunabilir defaultlar veriyoruz.
-        genre = doc.metadata.get("genre", "Belirtilmemiş")
-        director = doc.metadata.get("directors", "Belirtilmemiş")
-        rating = doc.metadata.get("rating", "Puanlanmamış")
-
-        # Her doküman için okunabilir bir blok üretiyoruz; tip 'desc' ise başlık 'Açıklama',
-        # değilse 'Kullanıcı Yorumu' olarak etiketlenir.
-        block = f"""[Film: {name}]
-            Tür: {genre}
-            Yönetmen: {director}
-            Puan: {rating}
-            {"Açıklama" if dtype == "desc" else "Kullanıcı Yorumu"}:
-            {doc.page_content}
-        ---"""
-        context_blocks.append(block)
+    # Dokümanları filme göre gruplayıp token bütçesine sığacak şekilde paketliyoruz.
+    context, pack = context_builder.build(docs)
+    annotate(context_tokens=pack.tokens, context_tokens_saved=pack.tokens_saved)
 
     # Son olarak state'in dict'ine getirilen dokümanları ve birleştirilmiş context'i ekleyip döndürüyoruz.
     return {
         **state.dict(),
         "retrieved_docs": docs,
-        "context": "\n".join(context_blocks)
+        "context": context
     }
+
+
+# Graf'a eklenecek node: invoke'ta senkron, ainvoke'ta asenkron gövde çalışır.
+movie_retrieve_node = RunnableLambda(movie_retrieve, afunc=amovie_retrieve)
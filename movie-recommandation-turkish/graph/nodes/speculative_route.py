@@ -0,0 +1,99 @@
+"""
+Spekülatif yönlendirme (routing) node'u.
+
+Normal akışta önce intent belirlenir (çoğu zaman bir LLM çağrısı), ardından
+`MovieRetrieve` çalışır. Router prompt'u şüpheli durumlarda `film_query`
+seçilmesini istediği için mesajların çoğu zaten retrieval'a gider. Bu node,
+intent LLM'e sorulurken vektör aramasını aynı anda başlatır:
+
+- intent `film_query` çıkarsa hazır retrieval sonucu kullanılır (vektör arama
+  süresi router çağrısının arkasına gizlenir),
+- `general_chat` çıkarsa retrieval sonucu beklenmeden bırakılır.
+
+Yerel hızlı sınıflandırıcı emin olduğunda spekülasyona gerek kalmaz; retrieval
+sadece gerekiyorsa çalıştırılır.
+
+Hem senkron (`app.invoke`) hem de asenkron (`app.ainvoke`) çağrılar için ayrı
+gövdeler vardır; `speculative_route_node` ikisini tek bir Runnable'da birleştirir.
+"""
+
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.runnables import RunnableLambda
+
+from graph.chains.route import get_question_router
+from graph.chains.fast_intent import local_intent, record_router_decision
+from graph.nodes.retrieve import movie_retrieve, amovie_retrieve
+from intent import FILM_QUERY, GENERAL_CHAT
+
+# Node süresi istek izine (trace) ve metriklere yazılır.
+from instrumentation import traced
+
+
+# Spekülatif retrieval'ların çalıştığı paylaşılan thread havuzu. Sonucu
+# kullanılmayacak bir retrieval'ın bitmesini beklememek için `with` bloğu
+# yerine modül seviyesinde tutuluyor.
+_speculation_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="speculative-retrieve")
+
+
+def _local_decision(state):
+    # Yerel sınıflandırıcının kararı; LLM'e gidilip gidilmediğini metriğe işler.
+    decision = local_intent(state)
+    record_router_decision(decision)
+    return decision
+
+
+@traced("speculative_route")
+def speculative_route(state):
+    """Intent'i belirlerken retrieval'ı paralel başlatır (senkron sürüm).
+
+    Returns:
+        `intent` alanı set edilmiş state dict'i; intent film_query ise
+        `retrieved_docs` ve `context` alanları da doldurulmuş olur.
+    """
+    decision = _local_decision(state)
+    if decision is not None:
+        if decision.intent == FILM_QUERY:
+            return {**movie_retrieve(state), "intent": FILM_QUERY}
+        return {**state.dict(), "intent": GENERAL_CHAT}
+
+    # Callback/trace bağlamı retrieval thread'ine de taşınsın diye context kopyalıyoruz.
+    ctx = contextvars.copy_context()
+    retrieval = _speculation_pool.submit(ctx.run, movie_retrieve, state)
+
+    intent = get_question_router().invoke({"question": state.message}).intent
+    if intent == FILM_QUERY:
+        return {**retrieval.result(), "intent": FILM_QUERY}
+
+    # Genel sohbet: retrieval henüz başlamadıysa iptal edilir, başladıysa sonucu yok sayılır.
+    retrieval.cancel()
+    return {**state.dict(), "intent": intent}
+
+
+@traced("speculative_route")
+async def aspeculative_route(state):
+    """`speculative_route`un asenkron sürümü (`app.ainvoke` / `app.astream` için)."""
+    decision = await asyncio.to_thread(_local_decision, state)
+    if decision is not None:
+        if decision.intent == FILM_QUERY:
+            return {**(await amovie_retrieve(state)), "intent": FILM_QUERY}
+        return {**state.dict(), "intent": GENERAL_CHAT}
+
+    retrieval = asyncio.create_task(amovie_retrieve(state))
+    try:
+        out = await get_question_router().ainvoke({"question": state.message})
+    except BaseException:
+        retrieval.cancel()
+        raise
+
+    if out.intent == FILM_QUERY:
+        return {**(await retrieval), "intent": FILM_QUERY}
+
+    retrieval.cancel()
+    return {**state.dict(), "intent": out.intent}
+
+
+# Graf'a eklenecek node: invoke'ta senkron, ainvoke'ta asenkron gövde çalışır.
+speculative_route_node = RunnableLambda(speculative_route, afunc=aspeculative_route)
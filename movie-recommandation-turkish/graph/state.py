@@ -29,7 +29,11 @@ class GraphState(BaseModel):
         - context: Dokümanlardan veya önceki adımlardan oluşturulmuş ek bağlam metni.
         - generation: Modelin ürettiği ara metin (ör. özet, genişleme).
         - answer: Nihai cevap (kullanıcıya dönecek metin).
-        - history: İşlem boyunca kaydedilen kısa geçmiş kayıtları (liste olarak tutulur).
+        - history: Konuşmanın olduğu gibi tutulan son mesajları ({"role", "text"} listesi).
+        - summary: Daha eski mesajların kısa özeti (bkz. conversation_memory.py).
+        - movie_ids: Konuşmada geçen filmlerin id'leri (en yeni önce).
+        - previous_docs: Önceki film sorgusunda getirilen dokümanlar; takip sorularında
+            yeniden arama yapmadan kullanılır.
 
         Notlar:
         - Bu sınıf, Graph tabanlı bir pipeline içinde tek bir state objesinin
@@ -56,10 +60,20 @@ class GraphState(BaseModel):
         # Kullanıcıya dönecek nihai cevap metni.
         answer: Optional[str] = None
 
-        # İş akışı boyunca kısa geçmiş kayıtları. Varsayılan boş liste, ancak
-        # dikkat: mutable default olmasına dikkat (gerekirse factory kullanılabilir).
+        # Konuşmanın son mesajları ({"role": "user" | "assistant", "text": ...}).
+        # Token bütçesini ConversationMemory korur. Pydantic varsayılan listeyi her
+        # örnek için kopyaladığı için mutable default burada güvenlidir.
         history: list = []
 
+        # Bütçeye sığmayan eski mesajların koşan özeti.
+        summary: Optional[str] = None
+
+        # Konuşmada geçen filmlerin id'leri (en yeni önce).
+        movie_ids: list = []
+
+        # Önceki film sorgusunun dokümanları (takip soruları için).
+        previous_docs: Optional[List[Document]] = None
+
         class Config:
                 # Document gibi Pydantic'in bilmediği tipleri kabul etmesini sağlar.
                 arbitrary_types_allowed = True
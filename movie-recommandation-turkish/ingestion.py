@@ -3,103 +3,727 @@
 import os
 # JSON verilerini okumak için json kütüphanesini içe aktarıyoruz.
 import json
+# Film/yorum içeriklerinin parmak izini (hash) çıkarmak için hashlib kullanıyoruz.
+import hashlib
+# Komut satırı argümanlarını (ör. --full) okumak için argparse.
+import argparse
+# Embedding hızını (chunk/sn) ölçmek için.
+import time
+# Film seviyesi vektörleri (açıklama + yorum merkezi) hesaplamak için.
+import numpy as np
 # LangChain bileşenlerini içe aktarıyoruz.
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
 # İlerleme çubuğu için tqdm kütüphanesini kullanıyoruz.
 from tqdm import tqdm
+# Çok süreçli embedding için işçi havuzu.
+from parallel_embedding import ParallelEmbedder
+# Bellek eşlemeli alternatif vektör deposu (bkz. mmap_store.py).
+from mmap_store import MmapVectorStore, SUPPORTED_DTYPES
+# Embedding modeli, önbellek ve Chroma koleksiyonları süreç genelinde paylaşılan
+# tembel kaynaklardır (bkz. resources.py). Yollar ve koleksiyon adları da oradan gelir;
+# eski import'lar bozulmasın diye burada da erişilebilir bırakıyoruz. Seçili vektör
+# deposu arka ucu çalışma sırasında değişebildiği için modülün kendisinden okunur.
+import resources
+from resources import (
+    get_hf_embedding,
+    get_embedding,
+    get_vectorstore,
+    get_movie_level_store,
+    get_movie_retriever,
+    get_token_encoder,
+    set_vector_backend,
+    splitter_encoding,
+    embedding_cache_path,
+    db_path,
+    collection_name,
+    movie_collection_name,
+    facets_path,
+    movie_facts_path,
+    lexical_index_path,
+)
+# Filtrelenebilir metadata anahtarları (tür/yönetmen) üretmek için.
+from text_utils import slugify
+# Başlık/yönetmen sözlüğü ve BM25 ters indeksi.
+from lexical_index import LexicalIndex
+# Film başına birebir/yakın kopya yorum tespiti (MinHash + LSH).
+from dedup import NearDuplicateFilter, NEAR_DUPLICATE_THRESHOLD
+# Çalışan uygulamanın kesintisiz geçtiği değişmez, sürümlü indeks anlık görüntüleri.
+from snapshots import publish_snapshot, read_manifest
 
 # Belgeleri parçalara ayırmak ve vektörleştirmek için gerekli bileşenleri ayarlıyoruz.
 # - RecursiveCharacterTextSplitter: metinleri küçük parçalara (chunk) bölerek
 #   embedding oluştururken daha iyi sonuç alınmasını sağlar.
 #   chunk_size: her parça için hedef boyut (token bazlı tahmini).
 #   chunk_overlap: ardışık parçalar arasında örtüşme miktarı, bağlam kaybını azaltır.
-text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-    chunk_size=800,
-    chunk_overlap=150
-)
+# Uzunluk `get_token_encoder` ile (splitter_encoding) sayılır; kodlayıcı ilk bölmede yüklenir
+# ve benchmark gibi ağsız ortamlarda `get_token_encoder.override(...)` ile değiştirilebilir.
+chunk_size = 800
+chunk_overlap = 150
+
+
+def _token_length(text: str) -> int:
+    return len(get_token_encoder().encode(text, disallowed_special=()))
 
-# Türkçe için eğitilmiş bir BERT tabanlı embedding modeli kullanıyoruz.
-# model_kwargs ile cihaz belirleniyor (ör. 'cpu' veya 'cuda').
-# encode_kwargs ile embeddinglerin normalize edilmesini isteyebiliriz.
-embedding = HuggingFaceEmbeddings(
-    model_name="emrecan/bert-base-turkish-cased-mean-nli-stsb-tr",
-    model_kwargs={'device': 'cpu'},
-    encode_kwargs={'normalize_embeddings': True}
+
+text_splitter = RecursiveCharacterTextSplitter(
+    chunk_size=chunk_size,
+    chunk_overlap=chunk_overlap,
+    length_function=_token_length,
 )
 
-# Chroma veritabanının kaydedileceği dizin
-db_path = "./.chroma/movie"
+# Bir filmin yorumları arasında birebir ve yakın kopyalar (3-gram Jaccard ≥ eşik) tek
+# yoruma indirilir (bkz. dedup.py). 0/None ise kapalıdır (`--dedup-threshold 0`).
+dedup_threshold = NEAR_DUPLICATE_THRESHOLD
+
+# Artımlı (incremental) ingestion'ın durum dosyası. Her film için içerik hash'ini
+# ve o filme ait chunk id'lerini tutar; böylece sadece değişen filmler yeniden
+# embed edilir ve yarıda kalan bir çalıştırma kaldığı yerden devam edebilir.
+state_path = "./.chroma/movie_ingest_state.json"
+
+# Veri setindeki tür ve yönetmen sözlüğü (slug → görünen ad) `facets_path` dosyasına
+# yazılır. Sorgu anlama adımı (graph/chains/query_filters.py) kullanıcı mesajındaki
+# tür/yönetmen adlarını bu sözlükle eşleştirip Chroma `where` filtresine çevirir.
+# Başlık/yönetmen indeksi + BM25 indeksi `lexical_index_path` dosyasına yazılır.
+# Her filmin adı, türleri, yönetmenleri ve puanı (movie_id → kayıt) `movie_facts_path`
+# tablosuna yazılır; "Avatar'ın puanı kaç?" gibi olgu soruları bu tablodan LLM'siz
+# cevaplanır (bkz. graph/chains/fact_question.py).
+#
+# Film seviyesi koleksiyon (`movie_collection_name`) her film için tek bir birleşik
+# vektör tutar. Arama önce bu küçük koleksiyondan aday filmleri seçer, sonra o
+# filmlerin chunk'larına iner (bkz. retrieval.py). Binlerce yorumu olan popüler
+# filmler böylece sonuçları domine etmez.
+
+# Ham veri dosyası.
+data_path = "all_movies_reviews.json"
+
+# Film vektöründe açıklamanın ağırlığı; kalan ağırlık yorumların merkezine (centroid) gider.
+movie_vector_desc_weight = 0.5
+
+# Çok büyük koleksiyonlarda bellek/süre yönetimi için batch ile ekleme yapıyoruz.
+# batch_size'a dikkat: çok büyükse bellek tüketimi artar, çok küçükse yavaş olur.
+# Her batch yazıldıktan sonra durum dosyası güncellenir (checkpoint).
+batch_size = 5000
+
+
+def _sha1(*parts) -> str:
+    # Verilen parçaları ayraçla birleştirip kısa ve deterministik bir hash üretir.
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+def movie_key(movie: dict) -> str:
+    # Filmi kalıcı olarak tanımlayan anahtar: url benzersiz olduğu için öncelikli.
+    # Url yoksa tek başına film adı yetmez (yeniden çekimler ve orijinalleri aynı adı
+    # taşır, ikinci film birincinin kaydını ezer); ad + yıl + yönetmenlerin hash'i kullanılır.
+    if movie.get("url"):
+        return movie["url"]
+    if movie.get("name"):
+        directors = ", ".join(sorted(_as_list(movie.get("directors"))))
+        return "name:" + _sha1(movie["name"], movie.get("year") or "", directors)
+    return _sha1(json.dumps(movie, sort_keys=True, ensure_ascii=False))
+
+
+def _as_list(value) -> list[str]:
+    # Tür/yönetmen alanları veri setinde liste veya virgülle ayrılmış metin olabilir.
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [v.strip() for v in value if v and v.strip()]
+
+
+def _to_float(value):
+    # Puanlar veri setinde "7,8" / "7.8" / 7.8 gibi farklı biçimlerde gelebilir.
+    try:
+        return float(str(value).replace(",", "."))
+    except (TypeError, ValueError):
+        return None
+
+
+def movie_metadata(movie: dict) -> dict:
+    # Metadata'da filmin adı, türü, yönetmeni, puanı ve url'si gibi alanları saklıyoruz.
+    # movie_id ile her chunk'ın hangi filme ait olduğunu sonradan bulabiliyoruz.
+    genres = _as_list(movie.get("genre"))
+    directors = _as_list(movie.get("directors"))
+    meta = {
+        "movie_id": movie_key(movie),
+        "name": movie.get("name"),
+        "genre": ", ".join(genres),
+        "directors": ", ".join(directors),
+        # Sayısal karşılaştırma ($gte) yapılabilsin diye puanı float olarak saklıyoruz.
+        "rating": _to_float(movie.get("rating", {}).get("totalRating")),
+        "url": movie.get("url")
+    }
+    # Chroma metadata'sında liste tutulamadığı için her tür ve yönetmen için ayrı bir
+    # boolean alan ekliyoruz; böylece `{"genre_bilim_kurgu": True}` gibi filtrelenebilir.
+    meta.update({f"genre_{slugify(g)}": True for g in genres})
+    meta.update({f"director_{slugify(d)}": True for d in directors})
+    # Chroma None değerleri kabul etmediği için boş alanları çıkarıyoruz.
+    return {k: v for k, v in meta.items() if v not in (None, "")}
+
+
+def update_facets(facets: dict, movie: dict) -> None:
+    # Film türlerini ve yönetmenlerini slug → görünen ad sözlüğüne ekler.
+    for g in _as_list(movie.get("genre")):
+        facets["genres"].setdefault(slugify(g), g)
+    for d in _as_list(movie.get("directors")):
+        facets["directors"].setdefault(slugify(d), d)
+
+
+def _save_facets(facets: dict) -> None:
+    tmp_path = facets_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(facets, f, ensure_ascii=False)
+    os.replace(tmp_path, facets_path)
+
+
+def movie_fact(movie: dict) -> dict:
+    # Olgu sorularını cevaplamak için filmin tablo kaydı (ad, türler, yönetmenler, puan, url).
+    return {
+        "name": movie.get("name"),
+        "genres": _as_list(movie.get("genre")),
+        "directors": _as_list(movie.get("directors")),
+        "rating": _to_float(movie.get("rating", {}).get("totalRating")),
+        "url": movie.get("url"),
+    }
+
 
-# Eğer veritabanı dizini yoksa veya boşsa, veritabanını oluşturuyoruz.
-if not os.path.exists(db_path) or not os.listdir(db_path):
-    # Tüm film verilerini JSON'dan okuyoruz (UTF-8 encoding ile)
-    with open("all_movies_reviews.json", "r", encoding="utf-8") as f:
-        movies_data = json.load(f)
+def _save_movie_facts(facts: dict) -> None:
+    # Uygulama tabloyu dosya değişince yeniden okur; yarım dosya görmemesi için atomik yazıyoruz.
+    tmp_path = movie_facts_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(facts, f, ensure_ascii=False)
+    os.replace(tmp_path, movie_facts_path)
 
-    movie_docs = []
+
+def movie_documents(movie: dict, meta: dict) -> list[Document]:
     # Her film için açıklama (desc) ve kullanıcı yorumlarını ayrı Document'lar olarak hazırlıyoruz.
-    for movie in movies_data:
-        # Metadata'da filmin adı, türü, yönetmeni, puanı ve url'si gibi alanları saklıyoruz.
-        meta = {
-            "name": movie.get("name"),
-            "genre": ", ".join(movie.get("genre", [])),
-            "directors": movie.get("directors"),
-            "rating": movie.get("rating", {}).get("totalRating"),
-            "url": movie.get("url")
-        }
-
-        # Filmin genel açıklaması varsa, Document olarak ekle
-        if movie.get("desc"):
-            movie_docs.append(Document(
-                page_content=movie["desc"],
-                metadata={**meta, "type": "desc"}
+    docs = []
+
+    # Filmin genel açıklaması varsa, Document olarak ekle
+    if movie.get("desc"):
+        docs.append(Document(
+            page_content=movie["desc"],
+            metadata={**meta, "type": "desc"}
+        ))
+
+    # Her bir kullanıcı yorumunu da ayrı bir Document yapıyoruz.
+    # metadata içinde yorumun tipini ve kullanıcı puanını ekliyoruz.
+    for rev in movie.get("reviews", []):
+        if rev.get("review"):
+            docs.append(Document(
+                page_content=rev["review"],
+                metadata={**meta, "type": "review", "user_rating": rev.get("rating")}
             ))
+    return docs
 
-        # Her bir kullanıcı yorumunu da ayrı bir Document yapıyoruz.
-        # metadata içinde yorumun tipini ve kullanıcı puanını ekliyoruz.
-        for rev in movie.get("reviews", []):
-            if rev.get("review"):
-                movie_docs.append(Document(
-                    page_content=rev["review"],
-                    metadata={**meta, "type": "review", "user_rating": rev.get("rating")}
-                ))
-
-    # Oluşturduğumuz Document listelerini belirtilen splitter ile parçalara ayırıyoruz.
-    splits = text_splitter.split_documents(movie_docs)
-
-    # Chroma vektör veritabanını başlatıyoruz (daha sonra persist_directory içine kaydedilecek)
-    db = Chroma(
-        collection_name="movie-db",
-        embedding_function=embedding,
-        persist_directory=db_path
-    )
 
-    # Çok büyük koleksiyonlarda bellek/süre yönetimi için batch ile ekleme yapıyoruz.
-    # batch_size'a dikkat: çok büyükse bellek tüketimi artar, çok küçükse yavaş olur.
-    batch_size = 5000
-    for i in tqdm(range(0, len(splits), batch_size), desc="🔹 Belgeler ekleniyor"):
-        batch = splits[i:i + batch_size]
-        db.add_documents(batch)
+def _doc_hash(doc: Document) -> str:
+    # Tek bir desc/yorum dokümanının içerik hash'i (metin + tip + kullanıcı puanı).
+    return _sha1(doc.metadata.get("type"), doc.metadata.get("user_rating"), doc.page_content)
+
+
+def _meta_hash(meta: dict) -> str:
+    return _sha1(json.dumps(meta, sort_keys=True, ensure_ascii=False))
+
+
+def movie_fingerprint(movie: dict) -> str:
+    # Filmin tamamının parmak izi: chunk ayarları + metadata + açıklama + tüm yorumların hash'leri.
+    # Bu değer değişmediyse filmi hiç bölmeden/embed etmeden atlayabiliriz. Kopya eşiği
+    # değişirse filmler yeniden bölünür; id'si değişmeyen chunk'lar yeniden embed edilmez.
+    meta = movie_metadata(movie)
+    return _sha1(f"dedup={dedup_threshold or 0}", _meta_hash(meta),
+                 *(_doc_hash(d) for d in movie_documents(movie, meta)))
+
+
+def _count(stats: dict, key: str) -> None:
+    if stats is not None:
+        stats[key] = stats.get(key, 0) + 1
+
+
+def split_document(doc: Document, stats: dict = None) -> list[Document]:
+    # Yorumların çoğu chunk boyutunun çok altındadır; splitter ise metni önce kelimelere
+    # bölüp her parçayı ayrı ayrı token'a çevirir. Sınıra sığdığı kesin olan metinler
+    # (byte sayısı sınırın altında — her BPE token'ı en az bir byte'tır — ya da tek
+    # encode ile sayılan token'ı sınırın altında) splitter'a girmeden tek chunk olur;
+    # sonuç splitter'ın üreteceği chunk ile aynıdır (baş/son boşlukları kırpılmış metin).
+    text = doc.page_content
+    if (len(text.encode("utf-8")) <= chunk_size
+            or _token_length(text) <= chunk_size):
+        _count(stats, "fast_path_docs")
+        text = text.strip()
+        return [Document(page_content=text, metadata=dict(doc.metadata))] if text else []
+    _count(stats, "split_docs")
+    return text_splitter.split_documents([doc])
+
+
+def movie_chunks(movie: dict, stats: dict = None) -> tuple[list[str], list[Document]]:
+    # Filmin tüm chunk'larını deterministik id'leriyle birlikte üretir.
+    # id = hash(metadata, doküman içeriği, aynı içeriğin kaçıncı tekrarı, chunk sırası)
+    # Böylece içeriği değişmeyen bir yorumun chunk id'si de değişmez ve yeniden embed edilmez.
+    # Aynı filmdeki birebir/yakın kopya yorumlar atlanır (ilk görülen tutulur).
+    meta = movie_metadata(movie)
+    meta_hash = _meta_hash(meta)
+    duplicates = NearDuplicateFilter(dedup_threshold) if dedup_threshold else None
+
+    ids, chunks = [], []
+    occurrences = {}
+    for doc in movie_documents(movie, meta):
+        if duplicates is not None and doc.metadata.get("type") == "review":
+            duplicate = duplicates.check(doc.page_content)
+            if duplicate:
+                _count(stats, f"{duplicate}_duplicates")
+                continue
+        doc_hash = _doc_hash(doc)
+        n = occurrences.get(doc_hash, 0)
+        occurrences[doc_hash] = n + 1
+        for i, chunk in enumerate(split_document(doc, stats)):
+            ids.append(_sha1(meta_hash, doc_hash, n, i))
+            chunks.append(chunk)
+    return ids, chunks
+
+
+def _load_state() -> dict:
+    if not os.path.exists(state_path):
+        return {"movies": {}}
+    with open(state_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_state(state: dict) -> None:
+    # Önce geçici dosyaya yazıp sonra os.replace ile değiştiriyoruz; böylece yazma
+    # sırasında çökme olsa bile durum dosyası yarım kalmaz.
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, state_path)
+
+
+def _delete_ids(db: Chroma, ids) -> None:
+    ids = list(ids)
+    for i in range(0, len(ids), batch_size):
+        db.delete(ids=ids[i:i + batch_size])
+
+
+def _missing_chunks(db: Chroma, ids: list[str], docs: list[Document]) -> tuple[list[str], list[Document]]:
+    # Yarıda kalmış bir çalıştırmadan sonra bazı chunk'lar zaten yazılmış olabilir;
+    # onları tekrar embed etmemek için koleksiyonda olanları atlıyoruz.
+    if not ids:
+        return [], []
+    existing = set(db.get(ids=ids, include=[])["ids"])
+    todo = [(i, d) for i, d in zip(ids, docs) if i not in existing]
+    return [i for i, _ in todo], [d for _, d in todo]
+
+
+def _upsert_vectors(db, ids: list[str], vectors, metadatas: list[dict], documents: list[str]) -> None:
+    # Embedding'i hazır kayıtları yazar. LangChain'in Chroma sarmalayıcısı bunu
+    # desteklemediği için Chroma'da doğrudan koleksiyona, mmap deposunda kendi metoduna.
+    if isinstance(db, MmapVectorStore):
+        db.upsert_embeddings(ids, vectors, metadatas, documents)
+    else:
+        db._collection.upsert(ids=ids, embeddings=vectors, metadatas=metadatas, documents=documents)
+
+
+def _upsert_embedded(db: Chroma, ids: list[str], docs: list[Document], vectors: list[list[float]]) -> None:
+    # Embedding'i önceden hesaplanmış chunk'ları doğrudan koleksiyona yazar.
+    if ids:
+        _upsert_vectors(db, ids, vectors, [d.metadata for d in docs], [d.page_content for d in docs])
+
+
+def iter_movies(path: str = None, read_size: int = 1 << 20):
+    """Veri dosyasındaki filmleri tek tek okuyan generator.
+
+    Hem tek bir JSON dizisi (`[{...}, {...}]`) hem de her satırda bir film olan
+    JSONL dosyalarını destekler. Dosya `read_size` büyüklüğünde parçalar halinde
+    okunur ve her film `json.JSONDecoder.raw_decode` ile ayrıştırılır; böylece
+    bellek kullanımı dosya boyutundan bağımsız kalır.
+    """
+    decoder = json.JSONDecoder()
+    with open(path or data_path, "r", encoding="utf-8") as f:
+        buf, pos, eof = "", 0, False
+        while True:
+            # Boşlukları, satır sonlarını, dizi ayraçlarını ve dizinin açılış
+            # köşeli parantezini atlıyoruz; tampon biterse yeni parça okuyoruz.
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n,[":
+                    pos += 1
+                if pos < len(buf) or eof:
+                    break
+                buf, pos = f.read(read_size), 0
+                eof = not buf
+
+            # Dosya sonu veya dizinin kapanışı: okunacak film kalmadı.
+            if pos >= len(buf) or buf[pos] == "]":
+                return
+
+            try:
+                movie, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # Film tampona tam sığmadıysa bir parça daha okuyup tekrar deniyoruz.
+                if eof:
+                    raise
+                more = f.read(max(read_size, len(buf) - pos))
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+                continue
+
+            yield movie
+            pos = end
+            # Okunmuş kısmı tampondan atarak belleği sabit tutuyoruz.
+            if pos >= read_size:
+                buf, pos = buf[pos:], 0
+
+
+def iter_changed_movies(movies, movies_state: dict, db: Chroma, stats: dict, seen_movies: set, facets: dict,
+                        facts: dict = None):
+    """Sadece yeni veya içeriği değişmiş filmleri (id, hash, chunk id'leri, chunk'lar) olarak üretir.
+
+    Değişen filmlerin artık üretilmeyen eski chunk'ları bu aşamada silinir.
+    Tüm filmlerin (değişmeyenler dahil) tür/yönetmen bilgisi `facets` içine,
+    olgu tablosu kayıtları `facts` içine toplanır.
+    """
+    for movie in movies:
+        mid = movie_key(movie)
+        seen_movies.add(mid)
+        update_facets(facets, movie)
+        if facts is not None:
+            facts[mid] = movie_fact(movie)
+        fingerprint = movie_fingerprint(movie)
+
+        old = movies_state.get(mid)
+        if old and old["hash"] == fingerprint:
+            stats["unchanged"] += 1
+            continue
+
+        ids, chunks = movie_chunks(movie, stats)
+        # Film değiştiyse artık üretilmeyen eski chunk'ları siliyoruz.
+        if old:
+            _delete_ids(db, set(old["ids"]) - set(ids))
+        stats["updated"] += 1
+        yield mid, fingerprint, ids, chunks
+
+
+def iter_batches(changed_movies, size: int = None):
+    """Film bazlı chunk akışını en fazla `size` elemanlı batch'lere böler.
+
+    Her batch (chunk id'leri, chunk'lar, tamamı yazılmış filmler) üçlüsüdür.
+    Bir filmin chunk'ları birden fazla batch'e yayılabilir; film ancak son
+    chunk'ının bulunduğu batch ile birlikte "tamamlandı" olarak bildirilir.
+    """
+    size = size or batch_size
+    buffer_ids, buffer_docs = [], []
+    # pending: (son chunk'ının global sırası, film id, hash, chunk id'leri)
+    pending = []
+    queued = emitted = 0
+
+    def take(n):
+        nonlocal buffer_ids, buffer_docs, emitted
+        ids, docs = buffer_ids[:n], buffer_docs[:n]
+        buffer_ids, buffer_docs = buffer_ids[n:], buffer_docs[n:]
+        emitted += n
+        done = []
+        while pending and pending[0][0] <= emitted:
+            done.append(pending.pop(0)[1:])
+        return ids, docs, done
+
+    for mid, fingerprint, ids, chunks in changed_movies:
+        buffer_ids.extend(ids)
+        buffer_docs.extend(chunks)
+        queued += len(ids)
+        pending.append((queued, mid, fingerprint, ids))
+        while len(buffer_ids) >= size:
+            yield take(size)
+
+    if buffer_ids or pending:
+        yield take(len(buffer_ids))
+
+
+def movie_vector(embeddings, metadatas) -> np.ndarray:
+    """Bir filmin chunk vektörlerinden tek bir film vektörü üretir.
+
+    Açıklama chunk'larının ortalaması ile yorum chunk'larının merkezi
+    `movie_vector_desc_weight` oranında karıştırılır ve normalize edilir.
+    Filmin sadece açıklaması veya sadece yorumları varsa o kullanılır.
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    is_desc = np.array([m.get("type") == "desc" for m in metadatas])
+    parts, weights = [], []
+    if is_desc.any():
+        parts.append(vectors[is_desc].mean(axis=0))
+        weights.append(movie_vector_desc_weight)
+    if (~is_desc).any():
+        parts.append(vectors[~is_desc].mean(axis=0))
+        weights.append(1 - movie_vector_desc_weight)
+    vector = np.average(parts, axis=0, weights=weights)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+def _upsert_movie_vectors(db: Chroma, movie_db: Chroma, movies: dict) -> None:
+    # Verilen filmlerin (film id → chunk id'leri) film seviyesi vektörlerini hesaplayıp yazar.
+    # Chunk vektörleri yeniden embed edilmez, koleksiyondan okunur.
+    ids, vectors, metadatas, documents = [], [], [], []
+    for mid, chunk_ids in movies.items():
+        if not chunk_ids:
+            continue
+        chunks = db.get(ids=chunk_ids, include=["embeddings", "metadatas"])
+        if len(chunks["ids"]) == 0:
+            continue
+        meta = {k: v for k, v in chunks["metadatas"][0].items() if k not in ("type", "user_rating")}
+        ids.append(mid)
+        vectors.append(movie_vector(chunks["embeddings"], chunks["metadatas"]).tolist())
+        metadatas.append({**meta, "type": "movie"})
+        documents.append(meta.get("name") or mid)
+    if ids:
+        _upsert_vectors(movie_db, ids, vectors, metadatas, documents)
+
+
+def build_lexical_index(db: Chroma, page_size: int = batch_size) -> LexicalIndex:
+    """Koleksiyondaki tüm chunk'lardan sözcüksel indeksi kurup diske yazar.
+
+    Chunk'lar koleksiyondan sayfa sayfa okunur; böylece ingestion'ın bellek
+    kullanımı sadece indeksin kendisi kadar olur.
+    """
+    index = LexicalIndex()
+    offset = 0
+    while True:
+        page = db.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        for chunk_id, text, meta in zip(page["ids"], page["documents"], page["metadatas"]):
+            index.add(chunk_id, text or "", meta or {})
+        offset += len(page["ids"])
+    index.finalize()
+    index.save(lexical_index_path)
+    return index
+
+
+def sync_movie_db(full: bool = False, path: str = None, workers: int = 1, backend: str = None,
+                  dtype: str = None, snapshot: bool = True) -> dict:
+    """Vektör veritabanını veri dosyasıyla artımlı olarak senkronize eder.
+
+    - Filmler dosyadan akış halinde (streaming) okunur, bölünür ve sınırlı
+      büyüklükte batch'ler halinde embed edilir; bellek kullanımı sabit kalır.
+    - İçeriği değişmeyen filmler atlanır.
+    - Yeni/değişen filmlerin sadece yeni chunk'ları embed edilip eklenir,
+      artık geçerli olmayan chunk'ları silinir.
+    - Veri dosyasından çıkarılmış filmlerin chunk'ları silinir.
+    - Her batch sonrası durum dosyası kaydedilir; çökme sonrası kaldığı yerden devam eder.
+    - Sonunda indeks değişmez bir anlık görüntü olarak yayınlanır (bkz. snapshots.py);
+      çalışan uygulama yeni sürüme kendiliğinden geçer.
+
+    Args:
+        full: True ise mevcut koleksiyon ve durum dosyası silinip sıfırdan kurulur.
+        path: JSON dizisi veya JSONL formatındaki veri dosyası (varsayılan `data_path`).
+        workers: 1'den büyükse embedding, her biri kendi modelini yükleyen bu sayıda
+            süreçte paralel hesaplanır; Chroma'ya yazma tek süreçte ve sırayla yapılır.
+        backend: "chroma" veya "mmap"; verilirse vektör deposu arka ucu bu olarak
+            seçilir ve uygulama da bundan sonra bu depoyu açar (bkz. resources).
+            Arka uç değiştiyse koleksiyon sıfırdan kurulur.
+        dtype: mmap deposunda vektör tipi ("float16" veya "int8").
+        snapshot: False ise anlık görüntü yayınlanmaz (sadece çalışma dizini güncellenir).
+
+    Returns:
+        Film sayıları, embed edilen chunk sayısı ve embedding hızını içeren özet.
+    """
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    if backend or dtype:
+        set_vector_backend(backend or resources.vector_backend, dtype)
+
+    # Chroma vektör veritabanı (persist_directory içine kaydedilir) ve film seviyesi
+    # koleksiyon (film başına tek vektör). Aynı süreçteki uygulama ile paylaşılır.
+    embedding = get_embedding()
+    db = get_vectorstore()
+    movie_db = get_movie_level_store()
+
+    if full and os.path.exists(state_path):
+        os.remove(state_path)
+    # Durum dosyası başka bir arka uçta kurulmuş depoyu anlatıyorsa bu depo için geçersizdir.
+    if os.path.exists(state_path) and _load_state().get("backend", "chroma") != resources.vector_backend:
+        os.remove(state_path)
+
+    # Durum dosyası yoksa koleksiyondaki kayıtlar eski (rastgele id'li) bir kurulumdan
+    # kalmıştır; hangi filme ait olduklarını bilemediğimiz için bir kereliğine temizliyoruz.
+    if not os.path.exists(state_path):
+        _delete_ids(db, db.get(include=[])["ids"])
+        _delete_ids(movie_db, movie_db.get(include=[])["ids"])
+        _save_state({"movies": {}, "backend": resources.vector_backend})
+
+    state = _load_state()
+    movies_state = state.setdefault("movies", {})
+
+    seen_movies = set()
+    facets = {"genres": {}, "directors": {}}
+    facts = {}
+    embedded = 0
+    stats = {"unchanged": 0, "updated": 0, "removed": 0,
+             "exact_duplicates": 0, "near_duplicates": 0, "fast_path_docs": 0, "split_docs": 0}
+
+    def commit(done):
+        # Tüm chunk'ları yazılmış filmlerin film seviyesi vektörlerini güncelleyip
+        # durum dosyasına işliyoruz (checkpoint).
+        _upsert_movie_vectors(db, movie_db, {mid: movie_ids for mid, _, movie_ids in done})
+        for mid, fingerprint, movie_ids in done:
+            movies_state[mid] = {"hash": fingerprint, "ids": movie_ids}
+        # mmap deposu yazmaları `persist`e kadar bellekte tutar (belli sayıda birikince
+        # kendisi yazar). Durum dosyası ancak chunk'lar diske indiğinde kaydedilir ki
+        # çökme sonrası "tamamlandı" sanılan ama depoda olmayan film kalmasın.
+        if getattr(db, "dirty", False):
+            return
+        if isinstance(movie_db, MmapVectorStore):
+            movie_db.persist()
+        _save_state(state)
+
+    # Akış: dosya → film → (değiştiyse) chunk'lar → sınırlı batch → embedding → Chroma
+    movies = tqdm(iter_movies(path), desc="🔹 Filmler işleniyor", unit=" film")
+    changed = iter_changed_movies(movies, movies_state, db, stats, seen_movies, facets, facts)
+    started = time.perf_counter()
+
+    if workers > 1:
+        # Paralel mod: bir batch işçilerde encode edilirken bir önceki batch yazılır.
+        with ParallelEmbedder(get_hf_embedding(), workers=workers, cache=embedding) as embedder:
+            def write(entry):
+                ids, docs, done, pending = entry
+                _upsert_embedded(db, ids, docs, embedder.collect(pending))
+                commit(done)
+
+            in_flight = None
+            for ids, docs, done in iter_batches(changed):
+                ids, docs = _missing_chunks(db, ids, docs)
+                pending = embedder.submit([d.page_content for d in docs])
+                if in_flight:
+                    write(in_flight)
+                in_flight = (ids, docs, done, pending)
+                embedded += len(ids)
+            if in_flight:
+                write(in_flight)
+    else:
+        for ids, docs, done in iter_batches(changed):
+            ids, docs = _missing_chunks(db, ids, docs)
+            if ids:
+                db.add_documents(docs, ids=ids)
+            embedded += len(ids)
+            commit(done)
+
+    elapsed = time.perf_counter() - started
+
+    # Veri dosyasında artık olmayan filmlerin chunk'larını siliyoruz.
+    removed = set(movies_state) - seen_movies
+    for mid in removed:
+        _delete_ids(db, movies_state.pop(mid)["ids"])
+        stats["removed"] += 1
+    _delete_ids(movie_db, removed)
+    if isinstance(db, MmapVectorStore):
+        db.persist()
+        movie_db.persist()
+    _save_state(state)
+
+    # Film seviyesi vektörü eksik olan filmleri (ör. bu özellikten önce kurulmuş
+    # veritabanı) tamamlıyoruz.
+    missing = sorted(set(movies_state) - set(movie_db.get(include=[])["ids"]))
+    for i in range(0, len(missing), 500):
+        _upsert_movie_vectors(db, movie_db, {mid: movies_state[mid]["ids"] for mid in missing[i:i + 500]})
+    _save_facets(facets)
+    _save_movie_facts(facts)
+
+    # Koleksiyon güncellendikten sonra sözcüksel indeksi yeniden kuruyoruz.
+    lexical = build_lexical_index(db)
 
     # İndekslenmiş veritabanını diske kaydediyoruz.
     db.persist()
-    print("🎉 Film vektör veritabanı oluşturuldu ve kaydedildi.")
-else:
-    # Eğer daha önce oluşturulmuşsa yeniden oluşturmayız — bu, geliştirme sürecinde zaman kazandırır.
-    print("✅ Film veritabanı zaten mevcut, yeniden oluşturulmadı.")
-
-# Projeyi çalıştırırken kolayca kullanabilmek için bir retriever örneği oluşturuyoruz.
-# as_retriever ile döndürdüğümüz nesne aramalarda (k-NN benzeri) kullanılacak.
-# search_type: 'similarity' (kullanılan embeddding mesafe metriğine göre benzerlik arar)
-# search_kwargs: k = döndürülecek benzer parça sayısı
-movie_retriever = Chroma(
-    collection_name="movie-db",
-    persist_directory=db_path,
-    embedding_function=embedding
-).as_retriever(
-    search_type="similarity",
-    search_kwargs={"k": 6}
-)
+    movie_db.persist()
+
+    # Hiçbir şey değişmediyse ve etkin anlık görüntü aynı depodan kurulduysa yeni sürüm yayınlanmaz.
+    version = None
+    if snapshot:
+        current = read_manifest()
+        unchanged = (
+            current is not None and not stats["updated"] and not stats["removed"] and not missing
+            and (current["backend"], current.get("dtype")) == (resources.vector_backend, resources.vector_dtype)
+        )
+        if unchanged:
+            version = current["version"]
+        else:
+            version = publish_snapshot({
+                "movies": len(movies_state),
+                "chunks": len(lexical.chunk_ids),
+                "updated": stats["updated"],
+                "removed": stats["removed"],
+            })
+    print(
+        f"🎉 Film vektör veritabanı güncellendi: {stats['updated']} yeni/değişen, "
+        f"{stats['unchanged']} değişmeyen, {stats['removed']} silinen film; "
+        f"{embedded} chunk embed edildi ({embedded / max(elapsed, 1e-9):.1f} chunk/sn, "
+        f"{workers} işçi)."
+    )
+    # Atlanan her yorum en az bir chunk'tı; kaydedilen embedding sayısı bir alt sınırdır.
+    dropped = stats["exact_duplicates"] + stats["near_duplicates"]
+    print(
+        f"🧹 Kopya yorumlar: {stats['exact_duplicates']} birebir, {stats['near_duplicates']} yakın kopya atlandı "
+        f"(≥{dropped} embedding çağrısı tasarrufu); {stats['fast_path_docs']} doküman bölünmeden, "
+        f"{stats['split_docs']} doküman splitter ile işlendi."
+    )
+    print(f"🎬 Film seviyesi koleksiyon: {len(movies_state)} film ({resources.vector_backend} deposu).")
+    print(f"📋 Olgu tablosu: {len(facts)} film.")
+    print(f"🔤 Sözcüksel indeks: {len(lexical.chunk_ids)} chunk, {len(lexical.titles)} film adı.")
+    if version:
+        print(f"📸 İndeks anlık görüntüsü: {version} ({resources.snapshots_path}).")
+    cache = embedding.stats()
+    print(f"🗃️ Embedding önbelleği: {cache['hits']} isabet, {cache['misses']} ıska, {cache['entries']} kayıt.")
+    return {
+        **stats,
+        "movies": len(movies_state),
+        "chunks_embedded": embedded,
+        "embed_seconds": elapsed,
+        "chunks_per_sec": embedded / max(elapsed, 1e-9),
+        "documents_dropped": dropped,
+        "embeddings_saved": dropped,
+        "snapshot": version,
+    }
+
+
+def __getattr__(name: str):
+    # Eski import'lar (`from ingestion import embedding, movie_retriever`) için geriye
+    # dönük uyumluluk: nesneler artık import anında değil, ilk erişimde oluşturulur.
+    lazy = {
+        "hf_embedding": get_hf_embedding,
+        "embedding": get_embedding,
+        "movie_retriever": get_movie_retriever,
+        "movie_level_store": get_movie_level_store,
+    }
+    if name in lazy:
+        return lazy[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if __name__ == "__main__":
+    # python ingestion.py          → değişen filmleri artımlı olarak senkronize eder.
+    # python ingestion.py --full   → koleksiyonu sıfırdan yeniden kurar.
+    # python ingestion.py --data movies.jsonl → JSONL (satır başına bir film) dosyasından okur.
+    # python ingestion.py --workers 8 → embedding'i 8 süreçte paralel hesaplar.
+    # python ingestion.py --backend mmap --dtype int8 → bellek eşlemeli depoya geçer.
+    # python ingestion.py --dedup-threshold 0 → kopya yorum elemesini kapatır.
+    # python ingestion.py --no-snapshot → anlık görüntü yayınlamadan sadece çalışma dizinini günceller.
+    parser = argparse.ArgumentParser(description="Film vektör veritabanını oluşturur/günceller.")
+    parser.add_argument("--full", action="store_true", help="Koleksiyonu sıfırdan yeniden kur.")
+    parser.add_argument("--data", default=data_path, help="JSON dizisi veya JSONL veri dosyası.")
+    parser.add_argument("--workers", type=int, default=1, help="Paralel embedding süreç sayısı.")
+    parser.add_argument("--backend", choices=["chroma", "mmap"], default=None,
+                        help="Vektör deposu arka ucu (varsayılan: son seçilen).")
+    parser.add_argument("--dtype", choices=SUPPORTED_DTYPES, default=None, help="mmap deposunda vektör tipi.")
+    parser.add_argument("--dedup-threshold", type=float, default=dedup_threshold,
+                        help="Yakın kopya yorum eşiği (3-gram Jaccard); 0 kapatır.")
+    parser.add_argument("--no-snapshot", action="store_true",
+                        help="İndeks anlık görüntüsü yayınlama (sadece çalışma dizinini güncelle).")
+    parser.add_argument("--keep-snapshots", type=int, default=resources.snapshot_keep,
+                        help="Etkin sürüm dışında tutulacak en fazla anlık görüntü.")
+    args = parser.parse_args()
+    dedup_threshold = args.dedup_threshold
+    resources.snapshot_keep = args.keep_snapshots
+    sync_movie_db(full=args.full, path=args.data, workers=args.workers, backend=args.backend, dtype=args.dtype,
+                  snapshot=not args.no_snapshot)
+
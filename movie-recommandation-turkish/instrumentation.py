@@ -0,0 +1,423 @@
+"""
+İstek başına izleme (tracing) ve metrikler.
+
+Bir isteğin süresinin nerede geçtiğini (intent tespiti, sorgu embedding'i,
+Chroma araması, `generate` LLM çağrısı...) ve LLM çağrılarının kaç prompt /
+completion token'ı kullandığını görebilmek için küçük, bağımlılıksız bir katman:
+
+- `start_trace()` her kullanıcı isteği için bir trace id üretir; id `contextvars`
+  ile taşındığı için thread havuzu ve asyncio görevlerinde de korunur.
+- `span(name)` bir kod bloğunun süresini ölçer; `@traced(name)` aynı işi senkron
+  veya asenkron fonksiyonlar (graf node'ları) için yapar. `annotate()` o anki
+  span'e alan ekler (ör. getirilen doküman sayısı).
+- `LLMMetricsCallback` LangChain callback'i olarak her LLM çağrısının süresini,
+  ilk token süresini ve token sayılarını kaydeder.
+- Metrikler süreç genelindeki `metrics` kaydında toplanır; Prometheus metin
+  formatında (`start_metrics_server`, `METRICS_PORT`) sunulabilir. Tamamlanan
+  trace'ler `TRACE_FILE` verilmişse JSONL dosyasına satır satır yazılır.
+"""
+
+import os
+import json
+import inspect
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+logger = logging.getLogger(__name__)
+
+# Süre histogramlarının üst sınırları (saniye).
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Adet histogramlarının (ör. getirilen doküman sayısı) üst sınırları.
+COUNT_BUCKETS = (0, 1, 2, 4, 6, 8, 12, 16, 24, 32, 64)
+
+METRIC_PREFIX = "movie_rag_"
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    # Prometheus etiket değerlerinde ters bölü, tırnak ve satır sonu kaçışlanır.
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: tuple, extra: Optional[tuple] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+class MetricsRegistry:
+    """Sayaç ve histogramları tutan, thread-safe basit metrik kaydı."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[tuple, float]] = {}
+        self._histograms: dict[str, dict[tuple, dict]] = {}
+        self._buckets: dict[str, tuple] = {}
+        self._help: dict[str, str] = {}
+
+    def inc(self, name: str, value: float = 1.0, help: str = "", **labels) -> None:
+        """Sayacı `value` kadar artırır."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+            self._help.setdefault(name, help)
+
+    def observe(self, name: str, value: float, buckets: tuple = DURATION_BUCKETS, help: str = "", **labels) -> None:
+        """Histograma bir gözlem ekler."""
+        key = _label_key(labels)
+        with self._lock:
+            self._buckets.setdefault(name, buckets)
+            self._help.setdefault(name, help)
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = {"counts": [0] * len(self._buckets[name]), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self._buckets[name]):
+                if value <= bound:
+                    hist["counts"][i] += 1
+            hist["sum"] += value
+            hist["count"] += 1
+
+    def snapshot(self) -> dict:
+        """Tüm metriklerin JSON'a çevrilebilir kopyası."""
+        with self._lock:
+            return {
+                "counters": {
+                    name: [{"labels": dict(k), "value": v} for k, v in series.items()]
+                    for name, series in self._counters.items()
+                },
+                "histograms": {
+                    name: [{"labels": dict(k), "sum": h["sum"], "count": h["count"]} for k, h in series.items()]
+                    for name, series in self._histograms.items()
+                },
+            }
+
+    def render_prometheus(self) -> str:
+        """Prometheus metin formatı (exposition format 0.0.4)."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full = METRIC_PREFIX + name
+                if self._help.get(name):
+                    lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} counter")
+                for key, value in series.items():
+                    lines.append(f"{full}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                full = METRIC_PREFIX + name
+                if self._help.get(name):
+                    lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} histogram")
+                for key, hist in series.items():
+                    for bound, count in zip(self._buckets[name], hist["counts"]):
+                        lines.append(f"{full}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {count}")
+                    lines.append(f"{full}_bucket{_format_labels(key, ('le', '+Inf'))} {hist['count']}")
+                    lines.append(f"{full}_sum{_format_labels(key)} {hist['sum']:g}")
+                    lines.append(f"{full}_count{_format_labels(key)} {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+# ---- gecikme özetleri (benchmark ve batch çalıştırıcı) ----
+
+def percentile(values: list[float], p: float) -> Optional[float]:
+    # Doğrusal interpolasyonlu yüzdelik (p: 0-100).
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(seconds: list[float]) -> dict:
+    """Gecikme listesinin milisaniye cinsinden özeti."""
+    ms = [s * 1000 for s in seconds]
+    return {
+        "count": len(ms),
+        "mean_ms": sum(ms) / len(ms) if ms else None,
+        "p50_ms": percentile(ms, 50),
+        "p95_ms": percentile(ms, 95),
+        "p99_ms": percentile(ms, 99),
+        "max_ms": max(ms) if ms else None,
+    }
+
+
+# ---- trace'ler ----
+
+@dataclass
+class Trace:
+    # Tek bir kullanıcı isteğinin izi.
+    trace_id: str
+    started: float
+    attrs: dict = field(default_factory=dict)
+    spans: list = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add_span(self, span: dict) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self, duration: float) -> dict:
+        with self._lock:
+            return {
+                "trace_id": self.trace_id,
+                "timestamp": self.started,
+                "duration_ms": duration * 1000,
+                **self.attrs,
+                "spans": list(self.spans),
+            }
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+_current_span: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("current_span", default=None)
+
+
+def _reset(var: contextvars.ContextVar, token) -> None:
+    # Generator'larda blok farklı bir context'te kapanabilir; o durumda token geçersizdir.
+    try:
+        var.reset(token)
+    except ValueError:
+        var.set(None)
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+
+class JsonlTraceExporter:
+    """Tamamlanan trace'leri dosyaya satır başına bir JSON olarak ekler."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def export(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+# TRACE_FILE verilmişse trace'ler bu dosyaya yazılır.
+trace_exporter = JsonlTraceExporter(os.environ["TRACE_FILE"]) if os.environ.get("TRACE_FILE") else None
+
+
+@contextmanager
+def start_trace(trace_id: Optional[str] = None, **attrs):
+    """Bir kullanıcı isteği için trace başlatır; blok bitince metrik ve JSONL kaydı yapılır."""
+    trace = Trace(trace_id=trace_id or uuid.uuid4().hex, started=time.time(), attrs=attrs)
+    token = _current_trace.set(trace)
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield trace
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        _reset(_current_trace, token)
+        duration = time.perf_counter() - started
+        metrics.inc("requests_total", help="Tamamlanan istek sayısı.", status=status)
+        metrics.observe("request_duration_seconds", duration, help="Uçtan uca istek süresi.")
+        trace.attrs["status"] = status
+        if trace_exporter is not None:
+            try:
+                trace_exporter.export(trace.to_dict(duration))
+            except OSError:
+                logger.exception("Trace dosyaya yazılamadı.")
+
+
+def _finish_span(record: dict, started: float) -> None:
+    record["duration_ms"] = (time.perf_counter() - started) * 1000
+    metrics.observe(
+        "span_duration_seconds", record["duration_ms"] / 1000,
+        help="Node, embedding, arama ve LLM adımlarının süresi.", span=record["name"],
+    )
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(record)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Bloğun süresini `name` adıyla ölçer ve varsa o anki trace'e ekler."""
+    parent = _current_span.get()
+    record = {"name": name, "parent": parent["name"] if parent else None, "start": time.time(), **attrs}
+    token = _current_span.set(record)
+    started = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        _reset(_current_span, token)
+        _finish_span(record, started)
+
+
+def annotate(**attrs) -> None:
+    """O anki span'e alan ekler (span yoksa bir şey yapmaz)."""
+    record = _current_span.get()
+    if record is not None:
+        record.update(attrs)
+
+
+def traced(name: str):
+    """Senkron veya asenkron bir fonksiyonu (ör. graf node'u) `span` ile sarar."""
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+# ---- LLM çağrıları ----
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Her LLM çağrısının süresini, ilk token süresini ve token kullanımını kaydeder."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs: dict = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(serialized, run_id, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(serialized, run_id, kwargs)
+
+    def _start(self, serialized, run_id, kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model_name") or params.get("model") or (serialized or {}).get("name", "llm")
+        with self._lock:
+            self._runs[run_id] = {
+                "model": model,
+                "trace": _current_trace.get(),
+                "parent": _current_span.get(),
+                "start": time.time(),
+                "started": time.perf_counter(),
+                "first_token": None,
+            }
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None and run["first_token"] is None:
+            run["first_token"] = time.perf_counter() - run["started"]
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._finish(run_id, response, None)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, None, error)
+
+    @staticmethod
+    def _usage(response) -> tuple[int, int]:
+        # Token kullanımı sağlayıcıya göre mesajın usage_metadata'sında veya llm_output'ta gelir.
+        for generations in getattr(response, "generations", None) or []:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+        usage = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+    def _finish(self, run_id, response, error) -> None:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        duration = time.perf_counter() - run["started"]
+        prompt_tokens, completion_tokens = self._usage(response) if response is not None else (0, 0)
+        model = run["model"]
+        metrics.observe("llm_duration_seconds", duration, help="LLM çağrı süresi.", model=model)
+        if run["first_token"] is not None:
+            metrics.observe("llm_time_to_first_token_seconds", run["first_token"], help="İlk token süresi.", model=model)
+        metrics.inc("llm_tokens_total", prompt_tokens, help="LLM token kullanımı.", model=model, kind="prompt")
+        metrics.inc("llm_tokens_total", completion_tokens, help="LLM token kullanımı.", model=model, kind="completion")
+        metrics.inc("llm_calls_total", help="LLM çağrı sayısı.", model=model, status="error" if error else "ok")
+        if run["trace"] is not None:
+            record = {
+                "name": "llm",
+                "parent": run["parent"]["name"] if run["parent"] else None,
+                "start": run["start"],
+                "duration_ms": duration * 1000,
+                "model": model,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+            }
+            if run["first_token"] is not None:
+                record["time_to_first_token_ms"] = run["first_token"] * 1000
+            if error is not None:
+                record["error"] = type(error).__name__
+            run["trace"].add_span(record)
+
+
+llm_metrics_callback = LLMMetricsCallback()
+
+
+# ---- Prometheus uç noktası ----
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = metrics.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Her scrape isteğini loglamıyoruz.
+        pass
+
+
+_server_lock = threading.Lock()
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """`/metrics` uç noktasını arka planda sunar; süreç başına bir kez başlatılır."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+            logger.info("Metrikler http://%s:%d/metrics adresinde.", host, port)
+    return _server
@@ -0,0 +1,168 @@
+"""
+Bellek içi sözcüksel (lexical) indeksler.
+
+Kullanıcı bir filmin adını verdiğinde ("Avatar yorumları nasıl?") yoğun (dense)
+vektör benzerliği hem yavaş hem de tam filmi kaçırabilir. Bu modül iki indeks sağlar:
+
+- Başlık/yönetmen indeksi: normalize edilmiş film adı veya yönetmen adı → film id'leri.
+  Sorgudaki kelime n-gram'ları doğrudan sözlükte aranır.
+- BM25 ters indeksi: chunk metinleri üzerinde klasik BM25 puanlaması.
+
+Normalizasyon Türkçe'ye uygundur: büyük/küçük harf ve diakritikler katlanır
+("Gölge" = "golge"), BM25 terimleri için ise Türkçe bilgi erişiminde yaygın
+olan ilk-5-harf köklemesi (F5 stemming) kullanılır; böylece "yorumları",
+"yorumlar" ve "yorum" aynı terime düşer.
+
+İndeks ingestion sonunda kurulup diske yazılır, uygulama açılırken yüklenir.
+"""
+
+import os
+import math
+import pickle
+from collections import Counter, defaultdict
+
+from text_utils import normalize_phrase
+
+
+# BM25 parametreleri (standart değerler).
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Kökleme için kelimenin ilk kaç harfi alınır.
+STEM_LENGTH = 5
+
+# Tek kelimelik film adları bu kelimelerden biriyse başlık eşleşmesi sayılmaz
+# (günlük dilde çok geçen kelimeler yanlış filme kısa devre yaptırmasın).
+TITLE_STOPWORDS = {
+    "film", "filmi", "dizi", "nasil", "iyi", "kotu", "bir", "ben", "sen", "biz", "ask",
+    "hayat", "gece", "gun", "bugun", "yarin", "simdi", "neden", "kim", "ne", "hangi",
+}
+
+# Bir başlığın son kelimesinden sonra gelebilecek en uzun Türkçe ek (ör. "Avatarın").
+MAX_SUFFIX = 4
+
+# Sorguda bakılacak en uzun kelime grubu (n-gram).
+MAX_NGRAM = 8
+
+
+def entity_tokens(text: str) -> list[str]:
+    # Başlık/isim eşleşmesi için kelimeler: kesme işareti ekleri ayırır ("Avatar'ın" → avatar ın).
+    return normalize_phrase(text.replace("'", " ").replace("’", " ")).split()
+
+
+def stem_tokens(text: str) -> list[str]:
+    # BM25 terimleri: normalize edilmiş kelimelerin ilk STEM_LENGTH harfi.
+    return [t[:STEM_LENGTH] for t in normalize_phrase(text).split() if len(t) > 1]
+
+
+class LexicalIndex:
+    """Başlık/yönetmen sözlüğü ve chunk'lar üzerinde BM25 ters indeksi."""
+
+    def __init__(self):
+        self.titles: dict[str, set] = defaultdict(set)
+        self.directors: dict[str, set] = defaultdict(set)
+        # BM25: terim → [(doküman sırası, terim frekansı)]
+        self.postings: dict[str, list] = defaultdict(list)
+        self.chunk_ids: list[str] = []
+        self.doc_lengths: list[int] = []
+        self.avg_length = 0.0
+
+    # ---- kurulum ----
+
+    def add(self, chunk_id: str, text: str, metadata: dict) -> None:
+        """Bir chunk'ı (ve filmin adını/yönetmenlerini) indekse ekler."""
+        movie_id = metadata.get("movie_id")
+        if movie_id and metadata.get("name"):
+            self.titles[" ".join(entity_tokens(metadata["name"]))].add(movie_id)
+        for director in (metadata.get("directors") or "").split(","):
+            if movie_id and director.strip():
+                self.directors[" ".join(entity_tokens(director))].add(movie_id)
+
+        terms = Counter(stem_tokens(text))
+        doc = len(self.chunk_ids)
+        self.chunk_ids.append(chunk_id)
+        self.doc_lengths.append(sum(terms.values()))
+        for term, tf in terms.items():
+            self.postings[term].append((doc, tf))
+
+    def finalize(self) -> None:
+        # Ortalama doküman uzunluğu BM25 normalizasyonu için gerekir.
+        self.avg_length = sum(self.doc_lengths) / len(self.doc_lengths) if self.doc_lengths else 0.0
+
+    def save(self, path: str) -> None:
+        # Geçici dosyaya yazıp atomik olarak değiştiriyoruz; çalışan uygulama yarım dosya görmez.
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(
+                {
+                    "titles": dict(self.titles),
+                    "directors": dict(self.directors),
+                    "postings": dict(self.postings),
+                    "chunk_ids": self.chunk_ids,
+                    "doc_lengths": self.doc_lengths,
+                    "avg_length": self.avg_length,
+                },
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        index = cls()
+        index.titles.update(data["titles"])
+        index.directors.update(data["directors"])
+        index.postings.update(data["postings"])
+        index.chunk_ids = data["chunk_ids"]
+        index.doc_lengths = data["doc_lengths"]
+        index.avg_length = data["avg_length"]
+        return index
+
+    # ---- sorgulama ----
+
+    def _match(self, table: dict, query: str) -> list[str]:
+        # Sorgudaki kelime gruplarını uzundan kısaya sözlükte arar. Grubun son
+        # kelimesinde Türkçe ek olabileceği için birkaç harf kırpılmış hali de denenir.
+        tokens = entity_tokens(query)
+        found, used = [], set()
+        for n in range(min(MAX_NGRAM, len(tokens)), 0, -1):
+            for i in range(len(tokens) - n + 1):
+                if used & set(range(i, i + n)):
+                    continue
+                head, last = tokens[i:i + n - 1], tokens[i + n - 1]
+                for cut in range(0, min(MAX_SUFFIX, len(last) - 1) + 1):
+                    key = " ".join(head + [last[:len(last) - cut]])
+                    if n == 1 and (len(key) < 4 or key in TITLE_STOPWORDS):
+                        continue
+                    if key in table:
+                        found.extend(table[key])
+                        used |= set(range(i, i + n))
+                        break
+        return list(dict.fromkeys(found))
+
+    def match_titles(self, query: str) -> list[str]:
+        """Sorguda adı geçen filmlerin id'leri."""
+        return self._match(self.titles, query)
+
+    def match_directors(self, query: str) -> list[str]:
+        """Sorguda adı geçen yönetmenlerin filmlerinin id'leri."""
+        return self._match(self.directors, query)
+
+    def search(self, query: str, k: int = 20) -> list[tuple[str, float]]:
+        """BM25 ile en yüksek puanlı `k` chunk'ı (chunk id, puan) olarak döndürür."""
+        n_docs = len(self.chunk_ids)
+        if not n_docs:
+            return []
+        scores = defaultdict(float)
+        for term in set(stem_tokens(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc, tf in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc] / self.avg_length)
+                scores[doc] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.chunk_ids[doc], score) for doc, score in best]
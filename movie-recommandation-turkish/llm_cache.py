@@ -0,0 +1,226 @@
+"""
+LLM cevapları için iki katmanlı (bellek + SQLite) önbellek.
+
+Router, `generate` ve `general_chat` prompt'ları mesajın ve getirilen bağlamın
+deterministik fonksiyonlarıdır; yine de "Merhaba" veya "Bugün ne izlemeliyim?"
+gibi tekrar eden her soru tam bir OpenRouter çağrısına mal oluyordu.
+`ChatOpenRouter` bu modüldeki `LLMCache`'i kullanarak aynı isteğe daha önce
+verilmiş cevabı ağa çıkmadan döndürür (bkz. open_router.py).
+
+- Anahtar: model adı + temperature + çağrı parametreleri (ör. yapılandırılmış
+  çıktı şeması) + normalize edilmiş prompt'un SHA-256 hash'i. Normalizasyon:
+  Unicode NFC, boşlukların sadeleştirilmesi ve Türkçe'ye uygun küçük harf.
+- Katmanlar: sık kullanılan kayıtlar süreç içi LRU bellekte, tümü SQLite
+  dosyasında tutulur; diskteki kayıtlar süreç yeniden başlasa da kullanılır.
+- Süre (TTL): her kayıt yazılırken bir son kullanma zamanı alır. Varsayılan
+  süre `cache_ttl(...)` bloğu ile değiştirilebilir; router sınıflandırmaları ve
+  selamlaşmalar bu şekilde çok daha uzun süre saklanır.
+- Boyut sınırı: `max_entries` aşıldığında en uzun süredir kullanılmayan
+  kayıtlar silinir (embedding önbelleğiyle aynı yöntem).
+- Tüm erişim bir kilitle sıraya sokulur; Streamlit oturumları, batch
+  işçileri ve spekülatif thread'ler aynı önbelleği güvenle paylaşır.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional
+
+from langchain_core.load import dumps, loads
+from langchain_core.messages import AIMessage, BaseMessage
+
+# Embedding önbelleğiyle aynı metin normalizasyonu.
+from embedding_cache import normalize_text
+from text_utils import lower_tr
+
+# İsabet/ıska sayaçları metriklere ve istek izine yazılır.
+from instrumentation import metrics, annotate
+
+
+# Varsayılan kayıt süresi (saniye): bağlama dayalı film cevapları.
+DEFAULT_TTL = float(os.environ.get("LLM_CACHE_TTL", 6 * 3600))
+
+# Router sınıflandırmaları sadece mesaja bağlıdır; uzun süre saklanır.
+ROUTER_TTL = 30 * 24 * 3600
+
+# "Merhaba", "Teşekkürler" gibi selamlaşma cevapları.
+GREETING_TTL = 7 * 24 * 3600
+
+# Bellek katmanındaki en fazla kayıt.
+MEMORY_ENTRIES = 1024
+
+# O anki çağrı için kullanılacak kayıt süresi (None ise önbelleğin varsayılanı).
+_ttl_override: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_cache_ttl", default=None)
+
+
+@contextmanager
+def cache_ttl(seconds: Optional[float]):
+    """Blok içindeki LLM çağrılarının cevaplarını `seconds` süreyle saklar (None: varsayılan)."""
+    token = _ttl_override.set(seconds)
+    try:
+        yield
+    finally:
+        _ttl_override.reset(token)
+
+
+def normalize_prompt(content) -> str:
+    # Aynı sorunun büyük/küçük harf, Unicode ve boşluk farkları aynı anahtara düşsün.
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False, sort_keys=True)
+    return normalize_text(lower_tr(content))
+
+
+class LLMCache:
+    """LLM cevaplarını bellek + SQLite katmanlarında saklayan, TTL ve LRU tahliyeli önbellek.
+
+    Args:
+        path: SQLite dosyası; None ise sadece bellek katmanı kullanılır.
+        ttl: Varsayılan kayıt süresi (saniye).
+        max_entries: Diskte tutulacak en fazla kayıt.
+        memory_entries: Bellekte tutulacak en fazla kayıt.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: float = DEFAULT_TTL,
+        max_entries: int = 100_000,
+        memory_entries: int = MEMORY_ENTRIES,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+
+        # key -> (son kullanma zamanı, serileştirilmiş mesaj)
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._count = 0
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, message TEXT NOT NULL,"
+                " expires_at REAL NOT NULL, last_used INTEGER NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+            self._conn.commit()
+            self._count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, temperature: Optional[float], messages: list[BaseMessage], **params) -> str:
+        """Model, temperature, çağrı parametreleri ve normalize prompt'tan anahtar üretir."""
+        payload = {
+            "model": model,
+            "temperature": temperature,
+            "messages": [[m.type, normalize_prompt(m.content)] for m in messages],
+            # Yapılandırılmış çıktı şeması, stop vb. aynı prompt'un farklı cevap türleri demektir.
+            "params": {k: v for k, v in sorted(params.items()) if v is not None},
+        }
+        raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=repr)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, expires_at: float, message: str) -> None:
+        # Bellek katmanına ekler; sınır aşılırsa en eski kaydı atar (kilit içinde çağrılır).
+        self._memory[key] = (expires_at, message)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _record(self, hit: bool) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        metrics.inc("llm_cache_total", help="LLM cevap önbelleği sorguları.", result="hit" if hit else "miss")
+        annotate(llm_cache="hit" if hit else "miss")
+
+    def lookup(self, key: str) -> Optional[AIMessage]:
+        """Süresi geçmemiş kayıt varsa mesajı, yoksa None döndürür."""
+        now = time.time()
+        serialized = None
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    serialized = entry[1]
+                else:
+                    del self._memory[key]
+            if serialized is None and self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT message, expires_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    serialized = row[0]
+                    self._remember(key, row[1], serialized)
+                    self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time_ns(), key))
+                    self._conn.commit()
+                elif row is not None:
+                    # Süresi geçmiş kayıt okunduğu anda silinir.
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                    self._count -= 1
+            self._record(serialized is not None)
+        return loads(serialized) if serialized is not None else None
+
+    def update(self, key: str, message: AIMessage, ttl: Optional[float] = None) -> None:
+        """Cevabı iki katmana yazar; süre verilmezse `cache_ttl` veya varsayılan kullanılır."""
+        ttl = ttl if ttl is not None else _ttl_override.get()
+        expires_at = time.time() + (ttl if ttl is not None else self.ttl)
+        # Token kullanımı asıl çağrıya aittir; önbellekten dönen cevap token harcamaz.
+        serialized = dumps(message.model_copy(update={"usage_metadata": None}))
+        with self._lock:
+            self._remember(key, expires_at, serialized)
+            if self._conn is None:
+                return
+            exists = self._conn.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, message, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, serialized, expires_at, time.time_ns()),
+            )
+            self._count += 0 if exists else 1
+            if self._count > self.max_entries:
+                # Önce süresi geçenler, sonra sınırın %10 altına kadar en eski kullanılanlar silinir.
+                self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+                self._count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+                excess = self._count - int(self.max_entries * 0.9)
+                if excess > 0:
+                    self._conn.execute(
+                        "DELETE FROM responses WHERE key IN "
+                        "(SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                        (excess,)
+                    )
+                    self._count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """Tüm kayıtları siler."""
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM responses")
+                self._conn.commit()
+            self._count = 0
+
+    def stats(self) -> dict:
+        # İsabet/ıska sayaçları ve katmanlardaki kayıt sayıları.
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self._memory),
+            "entries": self._count if self._conn is not None else len(self._memory),
+        }
@@ -0,0 +1,333 @@
+"""
+LLM çağrıları için kuyruk gecikmesi (tail latency) kontrolleri.
+
+Tek bir yavaş OpenRouter cevabı tüm turu bekletiyordu: istemci her isteği
+60 sn'ye kadar bekliyor, hata olursa aynı modeli tekrar deniyordu. Bu modül
+`ChatOpenRouter`'ın ağa giden çağrılarını bir `CallPolicy` ile sarar:
+
+- Süre sınırı (deadline): çağrının tamamı (tekrar denemeler dahil) en fazla
+  `deadline` saniye sürer; stream edilen çağrılarda bu süre ilk token'a kadar
+  geçen süreye uygulanır (yazılmaya başlanmış cevap yarıda kesilmez).
+- Tekrar deneme: zaman aşımı, bağlantı hatası, 429 ve 5xx hatalarında
+  "full jitter" üstel geri çekilme (backoff) ile `retries` kez yeniden denenir.
+- Hedge: ilk istek `hedge_after` saniyede (verilmezse son çağrıların p95
+  gecikmesinde) cevap vermezse aynı istek bir kez daha gönderilir; önce gelen
+  cevap kullanılır, diğeri bırakılır (async'te iptal edilir).
+- Yedek modeller: bir model tekrar denemelere rağmen başarısız olursa
+  `fallback_models` listesindeki modeller sırayla denenir.
+
+Hedge, tekrar deneme, zaman aşımı ve yedek model kullanım sayıları metriklere
+yazılır (bkz. instrumentation.py). Yerel gecikme enjekte eden sahte sunucuyla
+denemek için: mock_openrouter.py.
+"""
+
+import time
+import random
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import openai
+
+# Hedge/yedek model sayaçları ve istek izi.
+from instrumentation import metrics, annotate
+
+
+logger = logging.getLogger(__name__)
+
+# Hedge eşiği otomatik hesaplanırken kullanılan yüzdelik ve gereken en az örnek.
+HEDGE_QUANTILE = 0.95
+MIN_HEDGE_SAMPLES = 20
+
+# Otomatik eşik için tutulan son gecikme sayısı.
+LATENCY_WINDOW = 200
+
+# Süre sınırı veya hedge gerektiren senkron çağrıların çalıştığı thread havuzu.
+_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-call")
+
+
+class DeadlineExceeded(TimeoutError):
+    """Çağrı, tekrar denemeler dahil `deadline` süresi içinde tamamlanamadı."""
+
+
+@dataclass
+class CallPolicy:
+    """`ChatOpenRouter` çağrılarının süre sınırı, tekrar deneme, hedge ve yedek model ayarları.
+
+    Args:
+        deadline: Çağrının toplam süre sınırı (saniye); None ise sınır yok.
+        retries: Aynı model için en fazla tekrar deneme sayısı.
+        backoff_base: İlk geri çekilmenin üst sınırı (saniye); her denemede iki katına çıkar.
+        backoff_max: Geri çekilmenin en büyük üst sınırı (saniye).
+        hedge: True ise yavaş kalan isteğin bir kopyası gönderilir.
+        hedge_after: Kopyanın gönderileceği süre; None ise son çağrıların p95 gecikmesi.
+        fallback_models: Asıl model başarısız olursa sırayla denenecek modeller.
+    """
+
+    deadline: Optional[float] = None
+    retries: int = 2
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+    hedge: bool = False
+    hedge_after: Optional[float] = None
+    fallback_models: list[str] = field(default_factory=list)
+
+
+class LatencyWindow:
+    """Son başarılı çağrıların gecikmeleri; otomatik hedge eşiği buradan hesaplanır."""
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self._values = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._values.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if len(self._values) < MIN_HEDGE_SAMPLES:
+                return None
+            ordered = sorted(self._values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def is_retryable(error: BaseException) -> bool:
+    # Geçici hatalar: zaman aşımı, bağlantı, 408/409/429 ve 5xx.
+    if isinstance(error, DeadlineExceeded):
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    # "Full jitter": [0, min(cap, base * 2^attempt)] aralığında rastgele bekleme;
+    # aynı anda hata alan istekler sunucuya aynı anda geri dönmez.
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def _hedge_delay(policy: CallPolicy, window: LatencyWindow) -> Optional[float]:
+    if not policy.hedge:
+        return None
+    if policy.hedge_after is not None:
+        return policy.hedge_after
+    return window.quantile(HEDGE_QUANTILE)
+
+
+def _remaining(deadline_at: Optional[float]) -> Optional[float]:
+    if deadline_at is None:
+        return None
+    remaining = deadline_at - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded("LLM çağrısı süre sınırını aştı.")
+    return remaining
+
+
+def _time_left(deadline_at: Optional[float]) -> Optional[float]:
+    # Bekleme süresi için kalan zaman (süre dolduysa 0: bekleme hemen döner).
+    return None if deadline_at is None else max(0.0, deadline_at - time.monotonic())
+
+
+def _on_fallback(model: str, error: BaseException) -> None:
+    logger.warning("LLM çağrısı başarısız (%s: %s); yedek model deneniyor: %s", type(error).__name__, error, model)
+    metrics.inc("llm_fallback_total", help="Yedek modele geçilen çağrılar.", model=model)
+    annotate(fallback_model=model)
+
+
+def _on_retry(model: str, error: BaseException) -> None:
+    logger.info("LLM çağrısı tekrar deneniyor (%s: %s)", type(error).__name__, error)
+    metrics.inc("llm_retries_total", help="Tekrar denenen LLM istekleri.", model=model)
+
+
+def _on_timeout() -> None:
+    metrics.inc("llm_deadline_exceeded_total", help="Süre sınırını aşan LLM çağrıları.")
+
+
+def _on_hedge() -> None:
+    metrics.inc("llm_hedged_total", help="Yavaş kaldığı için kopyası gönderilen istekler.")
+    annotate(hedged=True)
+
+
+def _on_hedge_win() -> None:
+    metrics.inc("llm_hedge_wins_total", help="Kopyası asıl istekten önce cevap veren istekler.")
+
+
+# ---- senkron ----
+
+def _submit(func, *args):
+    # Trace/önbellek context'i havuz thread'ine taşınır (her iş kendi kopyasıyla).
+    return _pool.submit(contextvars.copy_context().run, func, *args)
+
+
+def _discard_later(future, discard: Optional[Callable]) -> None:
+    # Kaybeden istek bittiğinde sonucu (ör. açık stream) serbest bırakılır.
+    if discard is None:
+        return
+
+    def release(f):
+        if not f.cancelled() and f.exception() is None:
+            discard(f.result())
+
+    future.add_done_callback(release)
+
+
+def _attempt(call: Callable, model: str, policy: CallPolicy, window: LatencyWindow,
+             deadline_at: Optional[float], discard: Optional[Callable]):
+    # Tek bir deneme: gerekirse hedge'li ve süre sınırlı.
+    hedge_after = _hedge_delay(policy, window)
+    timeout = _remaining(deadline_at)
+    started = time.monotonic()
+
+    if hedge_after is None and timeout is None:
+        result = call(model)
+        window.add(time.monotonic() - started)
+        return result
+
+    primary = _submit(call, model)
+    futures = [primary]
+    if hedge_after is not None and (timeout is None or hedge_after < timeout):
+        done, _ = wait(futures, timeout=hedge_after)
+        if not done:
+            _on_hedge()
+            futures.append(_submit(call, model))
+
+    pending, error = set(futures), None
+    while pending:
+        done, pending = wait(pending, timeout=_time_left(deadline_at), return_when=FIRST_COMPLETED)
+        if not done:
+            for future in pending:
+                _discard_later(future, discard)
+            raise DeadlineExceeded("LLM çağrısı süre sınırını aştı.")
+        for future in done:
+            if future.exception() is None:
+                if future is not primary:
+                    _on_hedge_win()
+                for other in pending:
+                    _discard_later(other, discard)
+                window.add(time.monotonic() - started)
+                return future.result()
+            error = error or future.exception()
+    raise error
+
+
+def call_with_policy(call: Callable, model: str, policy: CallPolicy, window: LatencyWindow,
+                     discard: Optional[Callable] = None):
+    """`call(model)`ı politikaya göre süre sınırı, tekrar deneme, hedge ve yedek modelle çalıştırır.
+
+    Args:
+        call: Verilen model adıyla tek bir istek yapan fonksiyon.
+        model: Asıl model.
+        policy: Uygulanacak ayarlar.
+        window: Bu çağrı türünün gecikme penceresi (otomatik hedge eşiği için).
+        discard: Kaybeden hedge isteğinin sonucunu serbest bırakan fonksiyon (ör. stream'i kapatma).
+    """
+    deadline_at = time.monotonic() + policy.deadline if policy.deadline else None
+    error = None
+    for index, name in enumerate([model, *policy.fallback_models]):
+        if index:
+            _on_fallback(name, error)
+        for attempt in range(policy.retries + 1):
+            if attempt:
+                _on_retry(name, error)
+                delay = backoff_delay(attempt - 1, policy.backoff_base, policy.backoff_max)
+                if deadline_at is not None and time.monotonic() + delay >= deadline_at:
+                    _on_timeout()
+                    raise DeadlineExceeded("LLM çağrısı süre sınırını aştı.") from error
+                time.sleep(delay)
+            try:
+                return _attempt(call, name, policy, window, deadline_at, discard)
+            except DeadlineExceeded:
+                _on_timeout()
+                raise
+            except Exception as e:
+                error = e
+                if not is_retryable(e):
+                    break
+    raise error
+
+
+# ---- asenkron ----
+
+def _adiscard(task: asyncio.Task, discard: Optional[Callable]) -> None:
+    # Kaybeden görev iptal edilir; iptalden önce bitmişse sonucu serbest bırakılır.
+    if discard is not None and task.done() and not task.cancelled() and task.exception() is None:
+        discard(task.result())
+    task.cancel()
+
+
+async def _aattempt(call: Callable, model: str, policy: CallPolicy, window: LatencyWindow,
+                    deadline_at: Optional[float], discard: Optional[Callable]):
+    hedge_after = _hedge_delay(policy, window)
+    timeout = _remaining(deadline_at)
+    started = time.monotonic()
+
+    if hedge_after is None and timeout is None:
+        result = await call(model)
+        window.add(time.monotonic() - started)
+        return result
+
+    primary = asyncio.ensure_future(call(model))
+    tasks = [primary]
+    try:
+        if hedge_after is not None and (timeout is None or hedge_after < timeout):
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done:
+                _on_hedge()
+                tasks.append(asyncio.ensure_future(call(model)))
+
+        pending, error = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=_time_left(deadline_at), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                raise DeadlineExceeded("LLM çağrısı süre sınırını aştı.")
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        _on_hedge_win()
+                    window.add(time.monotonic() - started)
+                    tasks.remove(task)
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        # Kazanan dışındaki tüm görevler (veya hata/iptal durumunda hepsi) bırakılır.
+        for task in tasks:
+            _adiscard(task, discard)
+
+
+async def acall_with_policy(call: Callable, model: str, policy: CallPolicy, window: LatencyWindow,
+                            discard: Optional[Callable] = None):
+    """`call_with_policy`nin asenkron sürümü; `call(model)` bir coroutine döndürür."""
+    deadline_at = time.monotonic() + policy.deadline if policy.deadline else None
+    error = None
+    for index, name in enumerate([model, *policy.fallback_models]):
+        if index:
+            _on_fallback(name, error)
+        for attempt in range(policy.retries + 1):
+            if attempt:
+                _on_retry(name, error)
+                delay = backoff_delay(attempt - 1, policy.backoff_base, policy.backoff_max)
+                if deadline_at is not None and time.monotonic() + delay >= deadline_at:
+                    _on_timeout()
+                    raise DeadlineExceeded("LLM çağrısı süre sınırını aştı.") from error
+                await asyncio.sleep(delay)
+            try:
+                return await _aattempt(call, name, policy, window, deadline_at, discard)
+            except DeadlineExceeded:
+                _on_timeout()
+                raise
+            except Exception as e:
+                error = e
+                if not is_retryable(e):
+                    break
+    raise error
@@ -1,13 +1,38 @@
+import os
+
 import streamlit as st
 
 # Derlenmiş workflow uygulamamızı ve GraphState modelini alıyoruz.
-from graph.graph import app
+from graph.graph import stream_answer
 from graph.state import GraphState
 
+# Süreç genelinde paylaşılan kaynakları önceden hazırlamak için.
+from resources import warm_up
+
+# Prometheus metrik uç noktası.
+from instrumentation import start_metrics_server
+
+# Prompt'a giren konuşma geçmişi (token bütçeli).
+from conversation_memory import ConversationMemory
+
 
 # Sayfa başlığını ve düzenini ayarlıyoruz.
 st.set_page_config(page_title="Film Rehberi — Türkçe", layout="centered")
 
+# Embedding modeli, Chroma ve LLM istemcisi ilk kullanımda yüklenir ve tüm oturumlarca
+# paylaşılır. Arka planda ısıtarak sayfa hemen açılır, ilk soru da model yüklemesini
+# beklemez. Süreç başına bir kez çalışır; WARM_UP=0 ile kapatılabilir.
+if os.environ.get("WARM_UP", "1") == "1":
+    warm_up()
+
+# METRICS_PORT verilmişse node/LLM/embedding metrikleri http://<host>:<port>/metrics
+# adresinden Prometheus formatında sunulur (süreç başına bir kez başlatılır).
+if os.environ.get("METRICS_PORT"):
+    start_metrics_server(int(os.environ["METRICS_PORT"]))
+
+# Ekranda tutulacak en fazla mesaj; LLM'e giden geçmiş ayrıca ConversationMemory ile sınırlıdır.
+MAX_DISPLAY_MESSAGES = 100
+
 
 def _init_session():
     # Streamlit sayfa yenilendiğinde konuşma geçmişini ve input alanını
@@ -20,6 +45,12 @@ def _init_session():
     if "user_input" not in st.session_state:
         # Kullanıcının yazdığı metni tutacak alan.
         st.session_state.user_input = ""
+    if "pending" not in st.session_state:
+        # Cevabı henüz üretilmemiş (stream edilecek) kullanıcı mesajı.
+        st.session_state.pending = None
+    if "memory" not in st.session_state:
+        # Son turlar, eski turların özeti ve konuşmada geçen filmler (takip soruları için).
+        st.session_state.memory = ConversationMemory()
 
 
 _init_session()
@@ -30,32 +61,51 @@ st.markdown("Film önerileri ve kullanıcı yorumları hakkında sohbet edebilir
 
 
 def send_message():
-    # Kullanıcı input'unu alıp boş değilse graf akışını tetikleriz.
+    # Kullanıcı input'unu alıp boş değilse cevaplanmak üzere sıraya alırız.
+    # Cevap, sayfa yeniden çizilirken aşağıda token token stream edilir.
     ui = st.session_state.user_input.strip()
     if not ui:
         return
 
-    # Kullanıcı mesajını geçmişe ekle.
+    # Kullanıcı mesajını geçmişe ekle ve input alanını temizle.
     st.session_state.messages.append({"role": "user", "text": ui})
+    st.session_state.pending = ui
+    st.session_state.user_input = ""
+
+
+# Konuşma geçmişini ekranda gösteriyoruz. 'role' alanına göre başlık değişir.
+for msg in st.session_state.messages:
+    role = "Siz" if msg["role"] == "user" else "Asistan"
+    st.markdown(f"**{role}:** {msg['text']}")
 
+
+# Bekleyen bir mesaj varsa cevabı token'lar geldikçe ekrana yazıyoruz; böylece kullanıcı
+# tüm cevabın bitmesini beklemeden ilk kelimeleri görür.
+if st.session_state.pending:
+    ui = st.session_state.pending
+    st.session_state.pending = None
+    st.markdown("**Asistan:**")
     try:
-        # Workflow'a yeni bir GraphState gönderip sonucu alıyoruz.
-        result = app.invoke(GraphState(message=ui))
+        # Workflow'a yeni bir GraphState gönderip cevabı stream ediyoruz; akış bitince
+        # grafın son state'i `result` içine yazılır.
+        result = {}
+        state = GraphState(message=ui, **st.session_state.memory.state_fields())
+        streamed = st.write_stream(stream_answer(state, result))
         # Öncelikle 'answer' alanına bak; yoksa 'context' dönebilir; ikisi de yoksa hata mesajı göster.
-        resp = result.get("answer") or result.get("context") or "Maalesef cevap üretilmedi."
+        resp = result.get("answer") or result.get("context") or streamed or "Maalesef cevap üretilmedi."
+        if not streamed:
+            st.markdown(resp)
     except Exception as e:
         # Herhangi bir hata durumunu kullanıcıya gösteriyoruz (geliştirme aşamasında faydalı).
         resp = f"Hata: {e}"
+        st.markdown(resp)
+    else:
+        # Turu hafızaya ekle; film sorgusuysa getirilen dokümanlar takip soruları için saklanır.
+        st.session_state.memory.add_turn(ui, resp, result.get("retrieved_docs"))
 
-    # Asistanın cevabını geçmişe ekle ve input alanını temizle.
+    # Asistanın cevabını geçmişe ekle; ekrandaki liste de sınırsız büyümesin.
     st.session_state.messages.append({"role": "assistant", "text": resp})
-    st.session_state.user_input = ""
-
-
-# Konuşma geçmişini ekranda gösteriyoruz. 'role' alanına göre başlık değişir.
-for msg in st.session_state.messages:
-    role = "Siz" if msg["role"] == "user" else "Asistan"
-    st.markdown(f"**{role}:** {msg['text']}")
+    del st.session_state.messages[:-MAX_DISPLAY_MESSAGES]
 
 
 # Metin girişi alanı. Kullanıcı enter'e bastığında send_message tetiklenir.
@@ -0,0 +1,105 @@
+"""
+Eşzamanlı sorgu embedding'lerini mikro batch'lerde toplayan sarmalayıcı.
+
+Her `embed_query` çağrısı BERT'ten tek bir metin geçirir; model çağrısının sabit
+maliyeti (tokenizer, tensör hazırlığı, thread havuzu) her sorguda yeniden
+ödenir. Sunucu modunda (bkz. serve.py) aynı anda onlarca sorgu geldiğinde bu
+çağrıları birleştirmek CPU'yu çok daha verimli kullanır.
+
+`MicroBatchEmbeddings` gelen sorguları bir kuyruğa koyar; tek bir işçi thread'i
+kuyruktan ilk metni alınca en fazla `max_wait_ms` milisaniye ya da
+`max_batch_size` metin birikene kadar bekler, hepsini tek `embed_documents`
+çağrısıyla encode eder ve sonuçları çağıranlara dağıtır. Tek başına gelen bir
+sorgu en fazla `max_wait_ms` kadar gecikir.
+
+Önbellekten (embedding_cache.py) dönen sorgular batch'e hiç girmez:
+`resources.get_embedding` bu sınıfı önbelleğin *içine*, modelin hemen önüne
+koyar. `embed_documents` (ingestion) olduğu gibi modele gider.
+"""
+
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from langchain_core.embeddings import Embeddings
+
+# Batch boyutları ve bekleme süreleri metriklere yazılır.
+from instrumentation import metrics, COUNT_BUCKETS
+
+
+class MicroBatchEmbeddings(Embeddings):
+    """`embed_query` çağrılarını mikro batch'lerde birleştiren `Embeddings` sarmalayıcısı.
+
+    Args:
+        inner: Asıl embedding modeli (ör. HuggingFaceEmbeddings).
+        max_batch_size: Bir batch'teki en fazla metin sayısı.
+        max_wait_ms: İlk metinden sonra batch'in dolmasını bekleme süresi.
+    """
+
+    def __init__(self, inner: Embeddings, max_batch_size: int = 16, max_wait_ms: float = 5.0):
+        self.inner = inner
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        # (metin, future, kuyruğa girme zamanı)
+        self._queue: queue.Queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self) -> None:
+        # İşçi thread'i ilk sorguda başlatılır (ingestion'da hiç başlamaz).
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+                    self._worker.start()
+
+    def submit(self, text: str) -> Future:
+        """Metni sıradaki batch'e ekler; vektör hazır olunca tamamlanan bir Future döndürür."""
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def _collect(self) -> list:
+        # İlk eleman gelene kadar bekler, sonra süre ya da boyut sınırına kadar toplar.
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            # Aynı metin batch'te birden fazla kez varsa bir kez encode edilir.
+            texts = list(dict.fromkeys(text for text, _, _ in batch))
+            metrics.observe("embedding_batch_size", len(batch), buckets=COUNT_BUCKETS,
+                            help="Mikro batch başına sorgu sayısı.")
+            for _, _, queued in batch:
+                metrics.observe("embedding_batch_wait_seconds", started - queued,
+                                help="Sorgunun batch'in başlamasını beklediği süre.")
+            try:
+                vectors = dict(zip(texts, self.inner.embed_documents(texts)))
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for text, future, _ in batch:
+                future.set_result(vectors[text])
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.submit(text).result()
+
+    async def aembed_query(self, text: str) -> list[float]:
+        # Event loop thread'i bloklanmaz; batch bitince future loop'a sonucu bildirir.
+        return await asyncio.wrap_future(self.submit(text))
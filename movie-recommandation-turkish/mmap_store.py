@@ -0,0 +1,689 @@
+"""
+Bellek eşlemeli (memory-mapped), sıkıştırılmış vektör deposu.
+
+Korpusumuzun boyutunda Chroma'nın kalıcı deposu (HNSW indeksi + SQLite) hem
+çok RAM kullanıyor hem de açılışı uzun sürüyordu; filtreli benzerlik araması
+dışındaki özelliklerine ise ihtiyacımız yok. `MmapVectorStore` aynı işi tam
+(exact) arama ile yapan, LangChain `VectorStore` arayüzünü ve projenin
+kullandığı Chroma çağrılarını (`get`, `delete`, `persist`, `where` filtreleri)
+destekleyen bir alternatiftir; `movie_retriever` yerine doğrudan kullanılabilir
+(bkz. resources.get_vectorstore, `python ingestion.py --backend mmap`).
+
+Disk düzeni (her `persist` yeni bir nesil/generation yazar):
+
+- `vectors-<n>.npy`: normalize embedding'ler, float16 veya int8 (satır başına
+  ölçekli simetrik kuantizasyon; ölçekler `scales-<n>.npy`). Dosya `mmap` ile
+  açılır; sadece erişilen sayfalar belleğe gelir.
+- `texts-<n>.bin`: chunk metinleri ve JSON metadata'lar arka arkaya (mmap).
+- `columns-<n>.pkl`: sütunsal metadata yan dosyası: id'ler, metin ofsetleri ve
+  her metadata alanı için değer → satırlar (metin/bool) veya satır/sayı
+  dizileri (sayısal). `where` filtreleri bu sütunlardan boolean maskeye çevrilir.
+- `manifest.json`: geçerli nesil; en son yazılır, okuyucular buna bakar.
+
+Arama, sorgu matrisi ile vektör bloklarının matris çarpımı ve blok başına
+top-k (argpartition) ile yapılır; filtre az satır bırakıyorsa sadece o satırlar
+okunur. Yazmalar (upsert/delete) `persist` çağrılana kadar bellekte bekler ve
+arama/okumalarda görünür; `persist` canlı satırları yeni nesle sıkıştırır.
+"""
+
+import os
+import json
+import uuid
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable, Optional
+
+import numpy as np
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+
+# Bu kadar satır bellekte beklerse otomatik olarak diske yazılır (ingestion belleği sınırlı kalsın).
+AUTO_PERSIST_ROWS = 50_000
+
+# Tam taramada aynı anda float32'ye çevrilen satır sayısı.
+BLOCK_ROWS = 8192
+
+# Filtre en fazla bu kadar satır bırakıyorsa sadece o satırlar okunur (tam tarama yerine).
+GATHER_ROWS = 8192
+
+SUPPORTED_DTYPES = ("float16", "int8")
+
+# Yükleme sırasında okunan nesli başka bir sürecin `persist`'i silerse yeni nesille kaç kez denenir.
+RELOAD_ATTEMPTS = 5
+
+_EMPTY_ROWS = np.zeros(0, dtype=np.int32)
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> tuple[np.ndarray, Optional[np.ndarray]]:
+    """float32 vektörleri depolama tipine çevirir; int8 için satır ölçeklerini de döndürür."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    scales = np.abs(vectors).max(axis=1) / 127.0 if len(vectors) else np.zeros(0, dtype=np.float32)
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def _dequantize(vectors: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    out = np.asarray(vectors, dtype=np.float32)
+    return out * scales[:, None] if scales is not None else out
+
+
+def _rows_mask(n: int, rows: np.ndarray) -> np.ndarray:
+    mask = np.zeros(n, dtype=bool)
+    mask[rows] = True
+    return mask
+
+
+def match_where(meta: dict, where: Optional[dict]) -> bool:
+    """Tek bir metadata sözlüğünün Chroma `where` koşuluna uyup uymadığı."""
+    if not where:
+        return True
+    if "$and" in where:
+        return all(match_where(meta, w) for w in where["$and"])
+    if "$or" in where:
+        return any(match_where(meta, w) for w in where["$or"])
+    for field, cond in where.items():
+        if not isinstance(cond, dict):
+            cond = {"$eq": cond}
+        value = meta.get(field)
+        for op, target in cond.items():
+            if op == "$eq":
+                ok = value is not None and value == target
+            elif op == "$ne":
+                ok = value is not None and value != target
+            elif op == "$in":
+                ok = value in target
+            elif op == "$nin":
+                ok = value is not None and value not in target
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                ok = {"$gt": value > target, "$gte": value >= target,
+                      "$lt": value < target, "$lte": value <= target}[op]
+            else:
+                ok = False
+            if not ok:
+                return False
+    return True
+
+
+def _build_columns(metadatas: Iterable[dict], offset: int = 0) -> dict:
+    # Metadata sözlüklerinden sütunsal indeks: alan → {"rows", "values" | "numbers"}.
+    raw: dict[str, dict] = {}
+    for row, meta in enumerate(metadatas, offset):
+        for field, value in (meta or {}).items():
+            column = raw.setdefault(field, {"rows": [], "values": {}, "num_rows": [], "numbers": []})
+            column["rows"].append(row)
+            if isinstance(value, (str, bool)):
+                column["values"].setdefault(value, []).append(row)
+            elif isinstance(value, (int, float)):
+                column["num_rows"].append(row)
+                column["numbers"].append(value)
+    return {
+        field: {
+            "rows": np.asarray(c["rows"], dtype=np.int32),
+            "values": {v: np.asarray(r, dtype=np.int32) for v, r in c["values"].items()},
+            "num_rows": np.asarray(c["num_rows"], dtype=np.int32),
+            "numbers": np.asarray(c["numbers"], dtype=np.float64),
+        }
+        for field, c in raw.items()
+    }
+
+
+def _remap_columns(columns: dict, remap: np.ndarray) -> dict:
+    # Sıkıştırmada eski satır numaralarını yenilerine çevirir; silinen satırlar (-1) düşer.
+    def move(rows):
+        new = remap[rows] if len(rows) else _EMPTY_ROWS
+        return new[new >= 0].astype(np.int32)
+
+    out = {}
+    for field, c in columns.items():
+        keep = remap[c["num_rows"]] >= 0 if len(c["num_rows"]) else np.zeros(0, dtype=bool)
+        out[field] = {
+            "rows": move(c["rows"]),
+            "values": {v: move(r) for v, r in c["values"].items()},
+            "num_rows": move(c["num_rows"]),
+            "numbers": c["numbers"][keep],
+        }
+    return out
+
+
+def _merge_columns(base: dict, extra: dict) -> dict:
+    out = dict(base)
+    for field, c in extra.items():
+        if field not in out:
+            out[field] = c
+            continue
+        b = out[field]
+        values = dict(b["values"])
+        for v, rows in c["values"].items():
+            values[v] = np.concatenate([values[v], rows]) if v in values else rows
+        out[field] = {
+            "rows": np.concatenate([b["rows"], c["rows"]]),
+            "values": values,
+            "num_rows": np.concatenate([b["num_rows"], c["num_rows"]]),
+            "numbers": np.concatenate([b["numbers"], c["numbers"]]),
+        }
+    return out
+
+
+class _Snapshot:
+    # Bir aramanın/okumanın gördüğü tutarlı durum; persist sırasında değişmez.
+    __slots__ = ("vectors", "scales", "alive", "columns", "ids", "row", "blob", "doc_offsets", "meta_offsets",
+                 "pending_ids", "pending_vectors", "pending_items")
+
+    def __init__(self, **kwargs):
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+
+class MmapVectorStore(VectorStore):
+    """float16/int8 vektörleri bellek eşlemeli dosyada tutan, tam aramalı vektör deposu.
+
+    Args:
+        path: Deponun dizini (her koleksiyon için ayrı dizin).
+        embedding_function: Metinleri/sorguları vektöre çeviren embedding nesnesi.
+        dtype: Diskteki vektör tipi: "float16" veya "int8".
+        auto_persist_rows: Bellekte bu kadar yazma birikince otomatik `persist`.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        embedding_function: Optional[Embeddings] = None,
+        dtype: str = "float16",
+        auto_persist_rows: int = AUTO_PERSIST_ROWS,
+    ):
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Desteklenmeyen vektör tipi: {dtype} (seçenekler: {SUPPORTED_DTYPES})")
+        self.path = path
+        self._embedding = embedding_function
+        self.dtype = dtype
+        self.auto_persist_rows = auto_persist_rows
+        self._lock = threading.RLock()
+        self._loaded_stamp = None
+        self._closed = False
+        self._reset()
+        self._reload_if_changed()
+
+    def close(self) -> None:
+        """Bellek eşlemelerini bırakır; depo bundan sonra boş görünür ve diskten yeniden yüklenmez."""
+        with self._lock:
+            self._closed = True
+            self._reset()
+
+    # ---- yükleme ----
+
+    def _reset(self) -> None:
+        self._generation = 0
+        self._dim = None
+        self._vectors = np.zeros((0, 0), dtype=np.float16)
+        self._scales = None
+        self._blob = b""
+        self._doc_offsets = np.zeros(1, dtype=np.int64)
+        self._meta_offsets = np.zeros(0, dtype=np.int64)
+        self._ids: list[str] = []
+        self._row: dict[str, int] = {}
+        self._columns: dict = {}
+        self._alive = np.zeros(0, dtype=bool)
+        # id → (float16 vektör, metin, metadata); persist'e kadar bekleyen yazmalar.
+        self._pending: OrderedDict[str, tuple] = OrderedDict()
+        self._pending_cache = None
+
+    def _file(self, kind: str, generation: int, ext: str) -> str:
+        return os.path.join(self.path, f"{kind}-{generation}.{ext}")
+
+    @property
+    def _manifest_path(self) -> str:
+        return os.path.join(self.path, "manifest.json")
+
+    def _manifest_stamp(self) -> Optional[tuple]:
+        # Manifest'in değiştiğini anlamak için (mtime_ns, inode). Manifest her yazımda yeni bir
+        # dosyadan `os.replace` ile geldiği için inode, aynı zaman dilimine (kaba mtime
+        # çözünürlüğü) düşen iki yazımı da ayırt eder.
+        try:
+            st = os.stat(self._manifest_path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_ino
+
+    def _read_manifest(self) -> dict:
+        with open(self._manifest_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _reload_if_changed(self) -> None:
+        # Başka bir süreç (ingestion) yeni nesil yazdıysa onu açar; bekleyen yazma varken yüklemez.
+        if self._closed:
+            return
+        stamp = self._manifest_stamp()
+        if stamp is None or stamp == self._loaded_stamp or self._pending or not self._alive.all():
+            return
+        with self._lock:
+            for _ in range(RELOAD_ATTEMPTS):
+                if stamp is None or stamp == self._loaded_stamp:
+                    return
+                manifest = self._read_manifest()
+                try:
+                    self._load_generation(manifest)
+                except FileNotFoundError:
+                    # Manifest okunduktan sonra yazan süreç yeni nesli yayınlayıp bu nesli sildi;
+                    # manifest gerçekten değiştiyse yeni nesille tekrar denenir.
+                    if self._read_manifest()["generation"] == manifest["generation"]:
+                        raise
+                    stamp = self._manifest_stamp()
+                    continue
+                self._loaded_stamp = stamp
+                return
+            raise RuntimeError(f"{self.path}: manifest yükleme sırasında sürekli değişti.")
+
+    def _load_generation(self, manifest: dict) -> None:
+        # Neslin tüm dosyaları önce açılır, durum en son tek seferde değiştirilir; bir dosya
+        # eksikse (FileNotFoundError) depo önceki neslinde kalır.
+        generation = manifest["generation"]
+        with open(self._file("columns", generation, "pkl"), "rb") as f:
+            side = pickle.load(f)
+        vectors = np.load(self._file("vectors", generation, "npy"), mmap_mode="r")
+        scales = np.load(self._file("scales", generation, "npy")) if manifest["dtype"] == "int8" else None
+        texts_path = self._file("texts", generation, "bin")
+        blob = np.memmap(texts_path, dtype=np.uint8, mode="r") if os.path.getsize(texts_path) else b""
+
+        self._generation = generation
+        self._dim = manifest["dim"]
+        self._vectors = vectors
+        self._scales = scales
+        self._blob = blob
+        self._doc_offsets = side["doc_offsets"]
+        self._meta_offsets = side["meta_offsets"]
+        self._ids = side["ids"]
+        self._row = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+        self._columns = side["columns"]
+        self._alive = np.ones(len(side["ids"]), dtype=bool)
+
+    # ---- LangChain arayüzü ----
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embedding
+
+    @classmethod
+    def from_texts(cls, texts: list[str], embedding: Embeddings, metadatas: Optional[list[dict]] = None,
+                   ids: Optional[list[str]] = None, path: str = "./.chroma/mmap", **kwargs: Any) -> "MmapVectorStore":
+        store = cls(path, embedding_function=embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        store.persist()
+        return store
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[list[dict]] = None,
+                  ids: Optional[list[str]] = None, **kwargs: Any) -> list[str]:
+        texts = list(texts)
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        vectors = self._embedding.embed_documents(texts)
+        self.upsert_embeddings(ids, vectors, metadatas or [{} for _ in texts], texts)
+        return ids
+
+    def upsert_embeddings(self, ids: list[str], embeddings, metadatas: list[dict], documents: list[str]) -> None:
+        """Embedding'i hesaplanmış kayıtları ekler veya günceller (Chroma `collection.upsert` karşılığı)."""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if not len(ids):
+            return
+        with self._lock:
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(f"Vektör boyutu {vectors.shape[1]}, depo boyutu {self._dim}.")
+            for chunk_id, vector, meta, text in zip(ids, vectors.astype(np.float16), metadatas, documents):
+                row = self._row.get(chunk_id)
+                if row is not None:
+                    self._alive[row] = False
+                self._pending.pop(chunk_id, None)
+                self._pending[chunk_id] = (vector, text or "", dict(meta or {}))
+            self._pending_cache = None
+            if len(self._pending) >= self.auto_persist_rows:
+                self.persist()
+
+    @property
+    def dirty(self) -> bool:
+        """Henüz diske yazılmamış ekleme/güncelleme/silme var mı."""
+        return bool(self._pending) or not self._alive.all()
+
+    def delete(self, ids: Optional[list[str]] = None, **kwargs: Any) -> None:
+        with self._lock:
+            for chunk_id in ids or []:
+                if self._pending.pop(chunk_id, None) is not None:
+                    self._pending_cache = None
+                row = self._row.get(chunk_id)
+                if row is not None:
+                    self._alive[row] = False
+
+    # ---- anlık görüntü ----
+
+    def _snapshot(self) -> _Snapshot:
+        self._reload_if_changed()
+        with self._lock:
+            if self._pending_cache is None:
+                items = list(self._pending.items())
+                matrix = (np.stack([v for _, (v, _, _) in items]).astype(np.float32)
+                          if items else np.zeros((0, self._dim or 0), dtype=np.float32))
+                self._pending_cache = ([k for k, _ in items], matrix, [(t, m) for _, (_, t, m) in items])
+            pending_ids, pending_vectors, pending_items = self._pending_cache
+            return _Snapshot(
+                vectors=self._vectors, scales=self._scales, alive=self._alive.copy(), columns=self._columns,
+                ids=self._ids, row=self._row, blob=self._blob, doc_offsets=self._doc_offsets, meta_offsets=self._meta_offsets,
+                pending_ids=pending_ids, pending_vectors=pending_vectors, pending_items=pending_items,
+            )
+
+    @staticmethod
+    def _base_item(snap: _Snapshot, row: int) -> tuple[str, dict]:
+        # Satırın kaydı: blob[doc[row]:meta[row]] metin, blob[meta[row]:doc[row + 1]] metadata.
+        start, middle, end = snap.doc_offsets[row], snap.meta_offsets[row], snap.doc_offsets[row + 1]
+        return bytes(snap.blob[start:middle]).decode("utf-8"), json.loads(bytes(snap.blob[middle:end]))
+
+    # ---- filtreler ----
+
+    def _where_mask(self, snap: _Snapshot, where: dict) -> np.ndarray:
+        # `where` koşulunu diskteki satırlar için boolean maskeye çevirir.
+        n = len(snap.ids)
+        if "$and" in where:
+            mask = np.ones(n, dtype=bool)
+            for sub in where["$and"]:
+                mask &= self._where_mask(snap, sub)
+            return mask
+        if "$or" in where:
+            mask = np.zeros(n, dtype=bool)
+            for sub in where["$or"]:
+                mask |= self._where_mask(snap, sub)
+            return mask
+        mask = np.ones(n, dtype=bool)
+        for field, cond in where.items():
+            if not isinstance(cond, dict):
+                cond = {"$eq": cond}
+            for op, target in cond.items():
+                mask &= self._field_mask(snap, field, op, target)
+        return mask
+
+    @staticmethod
+    def _field_mask(snap: _Snapshot, field: str, op: str, target) -> np.ndarray:
+        n = len(snap.ids)
+        column = snap.columns.get(field)
+        if column is None:
+            return np.zeros(n, dtype=bool)
+
+        def equals(value) -> np.ndarray:
+            if isinstance(value, (str, bool)):
+                return _rows_mask(n, column["values"].get(value, _EMPTY_ROWS))
+            return _rows_mask(n, column["num_rows"][column["numbers"] == value])
+
+        if op == "$eq":
+            return equals(target)
+        if op in ("$in", "$nin"):
+            mask = np.zeros(n, dtype=bool)
+            for value in target:
+                mask |= equals(value)
+            return mask if op == "$in" else _rows_mask(n, column["rows"]) & ~mask
+        if op == "$ne":
+            return _rows_mask(n, column["rows"]) & ~equals(target)
+        compare = {"$gt": np.greater, "$gte": np.greater_equal, "$lt": np.less, "$lte": np.less_equal}.get(op)
+        if compare is None:
+            raise ValueError(f"Desteklenmeyen filtre operatörü: {op}")
+        return _rows_mask(n, column["num_rows"][compare(column["numbers"], target)])
+
+    def _base_mask(self, snap: _Snapshot, where: Optional[dict]) -> np.ndarray:
+        return snap.alive & self._where_mask(snap, where) if where else snap.alive
+
+    def _pending_mask(self, snap: _Snapshot, where: Optional[dict]) -> np.ndarray:
+        return np.array([match_where(meta, where) for _, meta in snap.pending_items], dtype=bool)
+
+    # ---- okuma ----
+
+    def get(self, ids: Optional[list[str]] = None, where: Optional[dict] = None, limit: Optional[int] = None,
+            offset: Optional[int] = None, include: Optional[list[str]] = None, **kwargs: Any) -> dict:
+        """Chroma `get` karşılığı: id ve/veya `where` ile kayıtları döndürür."""
+        include = ["documents", "metadatas"] if include is None else include
+        snap = self._snapshot()
+        pending_pos = {chunk_id: i for i, chunk_id in enumerate(snap.pending_ids)}
+
+        # (kaynak, konum) listesi: ("p", bekleyen sırası) veya ("b", disk satırı).
+        if ids is not None:
+            refs = []
+            for chunk_id in dict.fromkeys(ids):
+                if chunk_id in pending_pos:
+                    refs.append(("p", pending_pos[chunk_id]))
+                elif chunk_id in snap.row and snap.alive[snap.row[chunk_id]]:
+                    refs.append(("b", snap.row[chunk_id]))
+            if where:
+                base_ok = self._base_mask(snap, where)
+                refs = [(src, i) for src, i in refs if (base_ok[i] if src == "b" else
+                        match_where(snap.pending_items[i][1], where))]
+        else:
+            refs = [("b", int(row)) for row in np.flatnonzero(self._base_mask(snap, where))]
+            refs += [("p", int(i)) for i in np.flatnonzero(self._pending_mask(snap, where))]
+
+        start = offset or 0
+        refs = refs[start:start + limit] if limit is not None else refs[start:]
+
+        result = {"ids": [], "documents": None, "metadatas": None, "embeddings": None}
+        documents, metadatas, embeddings = [], [], []
+        for src, i in refs:
+            if src == "p":
+                result["ids"].append(snap.pending_ids[i])
+                text, meta = snap.pending_items[i]
+                vector = snap.pending_vectors[i]
+            else:
+                result["ids"].append(snap.ids[i])
+                text, meta = self._base_item(snap, i) if ("documents" in include or "metadatas" in include) else ("", {})
+                vector = None
+                if "embeddings" in include:
+                    scales = snap.scales[i:i + 1] if snap.scales is not None else None
+                    vector = _dequantize(snap.vectors[i:i + 1], scales)[0]
+            documents.append(text)
+            metadatas.append(meta)
+            embeddings.append(vector)
+        if "documents" in include:
+            result["documents"] = documents
+        if "metadatas" in include:
+            result["metadatas"] = metadatas
+        if "embeddings" in include:
+            result["embeddings"] = [np.asarray(v, dtype=np.float32).tolist() for v in embeddings]
+        return result
+
+    def count(self) -> int:
+        snap = self._snapshot()
+        return int(snap.alive.sum()) + len(snap.pending_ids)
+
+    # ---- arama ----
+
+    def _block(self, snap: _Snapshot, start: int, end: int) -> np.ndarray:
+        scales = snap.scales[start:end] if snap.scales is not None else None
+        return _dequantize(snap.vectors[start:end], scales)
+
+    def _gather(self, snap: _Snapshot, rows: np.ndarray) -> np.ndarray:
+        scales = snap.scales[rows] if snap.scales is not None else None
+        return _dequantize(snap.vectors[rows], scales)
+
+    def search_by_vectors(self, vectors, k: int = 4, filter: Optional[dict] = None) -> list[list[tuple[Document, float]]]:
+        """Birden çok sorgu vektörü için toplu tam arama; her sorgu için (Document, kosinüs) listesi.
+
+        Sorgular tek bir matris olarak bloklarla çarpılır; her blokta sorgu başına
+        top-k seçilip sonunda birleştirilir.
+        """
+        queries = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        snap = self._snapshot()
+        m = len(queries)
+        cand_scores, cand_refs = [], []
+
+        base_mask = self._base_mask(snap, filter)
+        selected = int(base_mask.sum())
+        if selected and selected <= GATHER_ROWS:
+            # Filtre az satır bırakıyor (ör. tek film): sadece o satırları oku.
+            rows = np.flatnonzero(base_mask)
+            scores = self._gather(snap, rows) @ queries.T
+            cand_scores.append(scores)
+            cand_refs.append(np.repeat(rows[:, None], m, axis=1))
+        elif selected:
+            for start in range(0, len(snap.ids), BLOCK_ROWS):
+                end = min(start + BLOCK_ROWS, len(snap.ids))
+                block_mask = base_mask[start:end]
+                if not block_mask.any():
+                    continue
+                scores = self._block(snap, start, end) @ queries.T
+                scores[~block_mask] = -np.inf
+                top = min(k, end - start)
+                idx = np.argpartition(-scores, top - 1, axis=0)[:top]
+                cand_scores.append(np.take_along_axis(scores, idx, axis=0))
+                cand_refs.append(idx + start)
+
+        if snap.pending_ids:
+            pending_mask = self._pending_mask(snap, filter) if filter else np.ones(len(snap.pending_ids), dtype=bool)
+            if pending_mask.any():
+                rows = np.flatnonzero(pending_mask)
+                cand_scores.append(snap.pending_vectors[rows] @ queries.T)
+                # Bekleyen kayıtlar disk satırlarından sonra numaralanır.
+                cand_refs.append(np.repeat((rows + len(snap.ids))[:, None], m, axis=1))
+
+        if not cand_scores:
+            return [[] for _ in range(m)]
+        scores = np.concatenate(cand_scores, axis=0)
+        refs = np.concatenate(cand_refs, axis=0)
+
+        results = []
+        for j in range(m):
+            column = scores[:, j]
+            top = min(k, len(column))
+            idx = np.argpartition(-column, top - 1)[:top]
+            idx = idx[np.argsort(-column[idx])]
+            hits = []
+            for i in idx:
+                if not np.isfinite(column[i]):
+                    continue
+                ref = int(refs[i, j])
+                if ref < len(snap.ids):
+                    chunk_id = snap.ids[ref]
+                    text, meta = self._base_item(snap, ref)
+                else:
+                    chunk_id = snap.pending_ids[ref - len(snap.ids)]
+                    text, meta = snap.pending_items[ref - len(snap.ids)]
+                hits.append((Document(id=chunk_id, page_content=text, metadata=meta), float(column[i])))
+            results.append(hits)
+        return results
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 4, filter: Optional[dict] = None,
+                                    **kwargs: Any) -> list[Document]:
+        return [doc for doc, _ in self.search_by_vectors([embedding], k=k, filter=filter)[0]]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None,
+                                     **kwargs: Any) -> list[tuple[Document, float]]:
+        return self.search_by_vectors([self._embedding.embed_query(query)], k=k, filter=filter)[0]
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    def _select_relevance_score_fn(self):
+        # Skor kosinüs benzerliğidir ([-1, 1]); [0, 1] aralığına taşınır.
+        return lambda score: (score + 1.0) / 2.0
+
+    # ---- yazma ----
+
+    def persist(self) -> None:
+        """Bekleyen yazmaları ve silmeleri yeni bir nesle sıkıştırıp diske yazar."""
+        with self._lock:
+            retype = len(self._ids) and self._vectors.dtype != np.dtype(self.dtype)
+            if not self.dirty and not retype and os.path.exists(self._manifest_path):
+                return
+            os.makedirs(self.path, exist_ok=True)
+            generation = self._generation + 1
+            keep = np.flatnonzero(self._alive)
+            pending = list(self._pending.items())
+            count = len(keep) + len(pending)
+            dim = self._dim or 0
+
+            # 1) Vektörler: canlı satırlar bloklar halinde kopyalanır (tip değiştiyse yeniden
+            #    kuantize edilir), bekleyenler kuantize edilip sona eklenir.
+            dtype = np.int8 if self.dtype == "int8" else np.float16
+            out = np.lib.format.open_memmap(self._file("vectors", generation, "npy"), mode="w+",
+                                            dtype=dtype, shape=(count, dim))
+            scales = np.ones(count, dtype=np.float32) if self.dtype == "int8" else None
+            same_type = self._vectors.dtype == dtype and (self._scales is not None) == (scales is not None)
+            for start in range(0, len(keep), BLOCK_ROWS):
+                rows = keep[start:start + BLOCK_ROWS]
+                if same_type:
+                    out[start:start + len(rows)] = self._vectors[rows]
+                    if scales is not None:
+                        scales[start:start + len(rows)] = self._scales[rows]
+                else:
+                    quantized, block_scales = quantize(self._gather_rows(rows), self.dtype)
+                    out[start:start + len(rows)] = quantized
+                    if scales is not None:
+                        scales[start:start + len(rows)] = block_scales
+            if pending:
+                quantized, pending_scales = quantize(
+                    np.stack([v for _, (v, _, _) in pending]).astype(np.float32), self.dtype
+                )
+                out[len(keep):] = quantized
+                if scales is not None:
+                    scales[len(keep):] = pending_scales
+            out.flush()
+            del out
+            if scales is not None:
+                np.save(self._file("scales", generation, "npy"), scales)
+
+            # 2) Metinler ve metadata: her satır [metin][metadata JSON] olarak arka arkaya yazılır;
+            #    canlı satırların baytları aynen kopyalanır.
+            doc_offsets = np.zeros(count + 1, dtype=np.int64)
+            meta_offsets = np.zeros(count, dtype=np.int64)
+            position = 0
+            with open(self._file("texts", generation, "bin"), "wb") as f:
+                for new_row, row in enumerate(keep):
+                    record = bytes(self._blob[self._doc_offsets[row]:self._doc_offsets[row + 1]])
+                    f.write(record)
+                    doc_offsets[new_row] = position
+                    meta_offsets[new_row] = position + self._meta_offsets[row] - self._doc_offsets[row]
+                    position += len(record)
+                for new_row, (_, (_, text, meta)) in enumerate(pending, len(keep)):
+                    text = text.encode("utf-8")
+                    meta = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+                    f.write(text)
+                    f.write(meta)
+                    doc_offsets[new_row] = position
+                    meta_offsets[new_row] = position + len(text)
+                    position += len(text) + len(meta)
+                doc_offsets[count] = position
+
+            # 3) Sütunsal metadata: eski sütunlar yeni satır numaralarına taşınır, bekleyenler eklenir.
+            remap = np.full(len(self._ids), -1, dtype=np.int64)
+            remap[keep] = np.arange(len(keep))
+            columns = _merge_columns(
+                _remap_columns(self._columns, remap),
+                _build_columns((meta for _, (_, _, meta) in pending), offset=len(keep)),
+            )
+            ids = [self._ids[row] for row in keep] + [chunk_id for chunk_id, _ in pending]
+            with open(self._file("columns", generation, "pkl"), "wb") as f:
+                pickle.dump({"ids": ids, "doc_offsets": doc_offsets, "meta_offsets": meta_offsets,
+                             "columns": columns}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+            # 4) Manifest en son yazılır; okuyucular yeni nesle ancak bundan sonra geçer.
+            tmp = self._manifest_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"generation": generation, "dim": dim, "dtype": self.dtype, "count": count}, f)
+            os.replace(tmp, self._manifest_path)
+
+            old = self._generation
+            self._pending.clear()
+            self._pending_cache = None
+            self._alive = np.ones(0, dtype=bool)
+            self._loaded_stamp = None
+            self._reload_if_changed()
+            # Eski nesli açık tutan okuyucular (mmap) dosya silinse de okumaya devam edebilir.
+            for kind, ext in (("vectors", "npy"), ("scales", "npy"), ("texts", "bin"), ("columns", "pkl")):
+                if old:
+                    try:
+                        os.remove(self._file(kind, old, ext))
+                    except OSError:
+                        pass
+
+    def _gather_rows(self, rows: np.ndarray) -> np.ndarray:
+        scales = self._scales[rows] if self._scales is not None else None
+        return _dequantize(self._vectors[rows], scales)
@@ -0,0 +1,203 @@
+"""
+Gecikme ve hata enjekte eden yerel, OpenAI uyumlu sahte sunucu.
+
+`ChatOpenRouter`ın süre sınırı, tekrar deneme, hedge ve yedek model
+davranışını (bkz. llm_resilience.py) gerçek OpenRouter'a çıkmadan denemek
+için kullanılır. `/v1/chat/completions` uç noktasını normal ve stream (SSE)
+modda taklit eder; yapılandırılmış çıktı isteklerinde (`response_format`
+json_schema veya `tools`) şemaya uyan en basit JSON'u döndürür.
+
+- `--delay-ms` / `--jitter-ms`: her isteğin ilk cevaba kadar gecikmesi.
+- `--slow-rate` / `--slow-ms`: isteklerin bu oranı ek olarak bu kadar gecikir
+  (kuyruk gecikmesi; hedge'in etkisini görmek için).
+- `--error-rate`: isteklerin bu oranı 503 döner (tekrar deneme için).
+- `--fail-models`: bu modellere gelen her istek 503 döner (yedek model için).
+- `--token-delay-ms`: stream modunda parçalar arası gecikme.
+
+Kullanım:
+    python mock_openrouter.py --port 8008 --delay-ms 100 --slow-rate 0.1 --slow-ms 3000
+    OPENROUTER_BASE_URL=http://localhost:8008/v1 OPENROUTER_API_KEY=test LLM_HEDGE=1 \\
+        python batch_runner.py questions.jsonl
+"""
+
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+REPLY = "Bu, sahte sunucunun ürettiği bir test cevabıdır. Önerim: Esaretin Bedeli."
+
+
+def sample_from_schema(schema: dict):
+    # JSON şemasına uyan en basit değer (enum varsa ilk seçenek).
+    if "enum" in schema:
+        return schema["enum"][0]
+    kind = schema.get("type")
+    if kind == "object" or "properties" in schema:
+        return {name: sample_from_schema(prop) for name, prop in schema.get("properties", {}).items()}
+    if kind == "array":
+        return []
+    if kind in ("integer", "number"):
+        return 0
+    if kind == "boolean":
+        return False
+    if "anyOf" in schema:
+        return sample_from_schema(schema["anyOf"][0])
+    return ""
+
+
+class MockState:
+    # Sunucu ayarları ve istek sayaçları (thread'ler arasında paylaşılır).
+
+    def __init__(self, args):
+        self.args = args
+        self.fail_models = {m.strip() for m in args.fail_models.split(",") if m.strip()}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.slow = 0
+
+    def delay(self) -> float:
+        seconds = (self.args.delay_ms + random.uniform(0, self.args.jitter_ms)) / 1000
+        if random.random() < self.args.slow_rate:
+            with self.lock:
+                self.slow += 1
+            seconds += self.args.slow_ms / 1000
+        return seconds
+
+
+class Handler(BaseHTTPRequestHandler):
+    state: MockState = None
+
+    def log_message(self, format, *args):
+        if self.state.args.verbose:
+            super().log_message(format, *args)
+
+    def _json(self, status: int, body: dict) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            state = self.state
+            self._json(200, {"requests": state.requests, "errors": state.errors, "slow": state.slow})
+        else:
+            self._json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._json(404, {"error": {"message": "not found"}})
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        state = self.state
+        model = body.get("model", "mock")
+        with state.lock:
+            state.requests += 1
+
+        time.sleep(state.delay())
+        if model in state.fail_models or random.random() < state.args.error_rate:
+            with state.lock:
+                state.errors += 1
+            self._json(503, {"error": {"message": f"{model} geçici olarak kullanılamıyor", "code": 503}})
+            return
+
+        content, tool_calls = self._reply(body)
+        if body.get("stream"):
+            self._stream(body, model, content, tool_calls)
+        else:
+            message = {"role": "assistant", "content": content}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            self._json(200, {
+                "id": f"mock-{time.time_ns()}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_calls else "stop"}],
+                "usage": self._usage(body, content),
+            })
+
+    @staticmethod
+    def _usage(body: dict, content) -> dict:
+        prompt = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+        completion = len((content or "").split())
+        return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+    @staticmethod
+    def _reply(body: dict):
+        # Yapılandırılmış çıktı istenmişse şemaya uyan JSON, değilse sabit metin.
+        response_format = body.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            schema = response_format.get("json_schema", {}).get("schema", {})
+            return json.dumps(sample_from_schema(schema), ensure_ascii=False), None
+        if response_format.get("type") == "json_object":
+            return "{}", None
+        if body.get("tools"):
+            function = body["tools"][0]["function"]
+            arguments = json.dumps(sample_from_schema(function.get("parameters", {})), ensure_ascii=False)
+            return None, [{"id": f"call-{time.time_ns()}", "type": "function",
+                           "function": {"name": function["name"], "arguments": arguments}}]
+        return REPLY, None
+
+    def _stream(self, body: dict, model: str, content, tool_calls) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        base = {"id": f"mock-{time.time_ns()}", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+
+        def send(delta: dict, finish=None, usage=None) -> None:
+            chunk = {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": finish}] if usage is None else []}
+            if usage is not None:
+                chunk["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        send({"role": "assistant", "content": ""})
+        if tool_calls:
+            send({"tool_calls": [{"index": 0, **tool_calls[0]}]})
+        else:
+            for word in content.split(" "):
+                send({"content": word + " "})
+                time.sleep(self.state.args.token_delay_ms / 1000)
+        send({}, finish="tool_calls" if tool_calls else "stop")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            send({}, usage=self._usage(body, content))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Gecikme/hata enjekte eden sahte OpenAI uyumlu sunucu.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8008)
+    parser.add_argument("--delay-ms", type=float, default=50.0, help="İlk cevaba kadar taban gecikme.")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="Gecikmeye eklenen rastgele süre üst sınırı.")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Ek gecikme alan isteklerin oranı (0-1).")
+    parser.add_argument("--slow-ms", type=float, default=3000.0, help="Yavaş isteklere eklenen gecikme.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="503 dönen isteklerin oranı (0-1).")
+    parser.add_argument("--fail-models", default="", help="Her zaman 503 dönen modeller (virgülle).")
+    parser.add_argument("--token-delay-ms", type=float, default=5.0, help="Stream parçaları arası gecikme.")
+    parser.add_argument("--seed", type=int, default=None, help="Rastgelelik tohumu.")
+    parser.add_argument("--verbose", action="store_true", help="Her isteği logla.")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    Handler.state = MockState(args)
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    print(f"🧪 Sahte OpenRouter: http://{args.host}:{args.port}/v1 (istatistikler: /v1/stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
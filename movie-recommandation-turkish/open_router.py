@@ -1,22 +1,36 @@
 # Standart kütüphaneden: ortam değişkenlerine erişim için kullanılır.
 import os
+import json
+import asyncio
+from itertools import chain
 
 # typing araçları: Optional bir değerin None olabileceğini belirtmek için kullanılır.
-from typing import Optional
+from typing import Any, Optional
 
 # .env dosyasını yüklemek için: geliştirme ortamında gizli anahtarları
 # .env dosyasından almak için kullanıyoruz.
 from dotenv import load_dotenv
 
+# OpenAI istemcisinin kullandığı HTTP kütüphanesi; bağlantı havuzu ve timeout
+# ayarlarını buradan yapıyoruz.
+import httpx
+
 # LangChain helper: environment'dan gizli anahtar almak için küçük bir yardımcı.
 from langchain_core.utils.utils import secret_from_env
 
 # LangChain/OpenAI uyumlu Chat modelinin temel sınıfı.
 from langchain_openai import ChatOpenAI
 
+# Önbellekten dönen cevapları LangChain sonuç/mesaj tiplerine çevirmek için.
+from langchain_core.messages import AIMessageChunk, message_chunk_to_message
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
 # Pydantic alan tipleri: Field ile alias/default_factory tanımlanır,
 # SecretStr ise gizli anahtarları güvenli tutmak için kullanılır.
-from pydantic import Field, SecretStr
+from pydantic import Field, PrivateAttr, SecretStr
+
+# Süre sınırı, tekrar deneme, hedge ve yedek model politikası.
+from llm_resilience import CallPolicy, LatencyWindow, call_with_policy, acall_with_policy
 
 
 # .env dosyasındaki değişkenleri yükle. Bu, local geliştirme sırasında
@@ -37,8 +51,36 @@ class ChatOpenRouter(ChatOpenAI):
       default_factory kullanılarak env'den okunur.
     - `lc_secrets` property ile LangChain'e hangi environment
       değişkeninin gizli olduğunu bildiriyoruz.
+    - Senkron ve asenkron çağrılar, ayarlanabilir bağlantı havuzu (pool),
+      keep-alive ve istek başı timeout'a sahip paylaşılan httpx istemcilerini
+      kullanır. Böylece tek bir süreç çok sayıda eşzamanlı konuşmayı, her
+      çağrı için yeni TCP/TLS bağlantısı açmadan yürütebilir.
+    - `OPENROUTER_BASE_URL` ile farklı (ör. yerel, OpenAI uyumlu mock) bir
+      sunucu hedeflenebilir.
+    - `response_cache` (bkz. llm_cache.LLMCache) verilirse aynı model,
+      temperature, parametre ve normalize prompt için daha önce alınmış cevap
+      ağa çıkmadan döndürülür. Stream edilen çağrılarda önbellekteki cevap tek
+      parça olarak akıtılır; kaçırılan cevaplar akış bitince önbelleğe yazılır.
+    - `request_limiter` (bkz. rate_limit.TokenBucket) sadece ağa giden
+      isteklerden önce beklenir; önbellekten dönen cevaplar hız sınırına takılmaz.
+    - Ağa giden her çağrı `call_policy` ile sarılır: toplam süre sınırı, jitter'lı
+      tekrar deneme, yavaş isteklerin hedge edilmesi ve sıralı yedek modeller
+      (bkz. llm_resilience.py). Tekrar denemeleri bu katman yaptığı için OpenAI
+      istemcisinin kendi tekrar denemesi varsayılan olarak kapalıdır.
     """
 
+    # Cevap önbelleği (None ise kapalı).
+    response_cache: Optional[Any] = Field(default=None, exclude=True)
+
+    # OpenRouter istek hızı sınırlayıcısı (None ise sınır yok).
+    request_limiter: Optional[Any] = Field(default=None, exclude=True)
+
+    # Süre sınırı, tekrar deneme, hedge ve yedek model ayarları (bkz. llm_resilience.py).
+    call_policy: CallPolicy = Field(default_factory=CallPolicy, exclude=True)
+
+    # Otomatik hedge eşiği için tam cevap ve ilk token gecikmeleri.
+    _latency: dict = PrivateAttr(default_factory=lambda: {"invoke": LatencyWindow(), "stream": LatencyWindow()})
+
     openai_api_key: Optional[SecretStr] = Field(
         alias="api_key",
         default_factory=secret_from_env("OPENROUTER_API_KEY", default=None),
@@ -52,19 +94,215 @@ class ChatOpenRouter(ChatOpenAI):
 
     def __init__(self,
                  openai_api_key: Optional[str] = None,
+                 max_connections: int = 100,
+                 max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 30.0,
+                 request_timeout: float = 60.0,
+                 connect_timeout: float = 5.0,
                  **kwargs):
+        """
+        Args:
+            openai_api_key: Verilmezse OPENROUTER_API_KEY ortam değişkeninden okunur.
+            max_connections: Havuzdaki en fazla eşzamanlı bağlantı sayısı.
+            max_keepalive_connections: Boşta açık tutulacak (keep-alive) bağlantı sayısı.
+            keepalive_expiry: Boştaki bir bağlantının kapatılmadan önce bekleyeceği saniye.
+            request_timeout: Tek bir isteğin toplam süre sınırı (saniye).
+            connect_timeout: Bağlantı kurma süre sınırı (saniye).
+        """
         # Eğer __init__'e açıkça api_key verilmediyse, environment değişkeninden al.
         openai_api_key = (
             openai_api_key or os.environ.get("OPENROUTER_API_KEY")
         )
+
+        # Bağlantı havuzu ve timeout ayarları. Aynı ayarlarla bir senkron bir de
+        # asenkron istemci oluşturuyoruz; dışarıdan istemci verilmişse ona dokunmuyoruz.
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        timeout = httpx.Timeout(request_timeout, connect=connect_timeout)
+        kwargs.setdefault("http_client", httpx.Client(limits=limits, timeout=timeout))
+        kwargs.setdefault("http_async_client", httpx.AsyncClient(limits=limits, timeout=timeout))
+        kwargs.setdefault("timeout", request_timeout)
+        # Stream edilen cevaplarda da token kullanımını (usage) almak için.
+        kwargs.setdefault("stream_usage", True)
+        # Tekrar denemeler call_policy'de; istemci ayrıca denemesin.
+        kwargs.setdefault("max_retries", 0)
+
         # ChatOpenAI'in constructor'ına base_url ve api_key vererek OpenRouter'ı hedefliyoruz.
         super().__init__(
-            base_url="https://openrouter.ai/api/v1",
+            base_url=os.environ.get("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1"),
             api_key=openai_api_key,
             **kwargs
         )
 
 
-# Proje genelinde kullanılacak LLM örneğini oluşturuyoruz.
-# model parametresi ve temperature gibi ayarlar burada belirlenir.
-llm = ChatOpenRouter(model="openai/gpt-5-nano", temperature=0.7)
\ No newline at end of file
+    # ---- cevap önbelleği ----
+
+    def _cache_key(self, messages, stop, kwargs) -> Optional[str]:
+        if self.response_cache is None:
+            return None
+        return self.response_cache.make_key(self.model_name, self.temperature, messages, stop=stop, **kwargs)
+
+    def _cached(self, key: Optional[str]):
+        return self.response_cache.lookup(key) if key else None
+
+    def _store(self, key: Optional[str], message) -> None:
+        # Boş cevaplar (ne metin ne tool çağrısı/yapılandırılmış çıktı) saklanmaz.
+        parsed = message.additional_kwargs.get("parsed")
+        if not key or not (message.content or message.tool_calls or parsed):
+            return
+        if hasattr(parsed, "model_dump"):
+            # Yapılandırılmış çıktının Pydantic nesnesi serileştirilemez; sözlük olarak
+            # saklanır (LangChain'in parser'ı sözlüğü şemaya geri çevirir).
+            message = message.model_copy(update={
+                "additional_kwargs": {**message.additional_kwargs, "parsed": parsed.model_dump()}
+            })
+        self.response_cache.update(key, message)
+
+    def _acquire(self) -> None:
+        if self.request_limiter is not None:
+            self.request_limiter.acquire(blocking=True)
+
+    async def _aacquire(self) -> None:
+        if self.request_limiter is not None:
+            await self.request_limiter.aacquire(blocking=True)
+
+    @staticmethod
+    def _replay_chunk(message) -> ChatGenerationChunk:
+        # Önbellekteki tam mesajı tek bir stream parçasına çevirir.
+        tool_call_chunks = [
+            {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+            for i, call in enumerate(message.tool_calls)
+        ]
+        return ChatGenerationChunk(message=AIMessageChunk(
+            content=message.content,
+            additional_kwargs=message.additional_kwargs,
+            response_metadata={**message.response_metadata, "cached": True},
+            tool_call_chunks=tool_call_chunks,
+            id=message.id,
+        ))
+
+    # ---- süre sınırı, tekrar deneme, hedge ve yedek model ----
+
+    def _attempt_kwargs(self, kwargs: dict, model: str) -> dict:
+        # İstek gövdesindeki model alanı kwargs ile ezilir (yedek modeller için).
+        return {**kwargs, "model": model}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        key = self._cache_key(messages, stop, kwargs)
+        cached = self._cached(key)
+        if cached is not None:
+            return ChatResult(generations=[ChatGeneration(message=cached)])
+
+        generate = super()._generate
+
+        def attempt(model):
+            self._acquire()
+            return generate(messages, stop=stop, run_manager=run_manager, **self._attempt_kwargs(kwargs, model))
+
+        result = call_with_policy(attempt, self.model_name, self.call_policy, self._latency["invoke"])
+        if len(result.generations) == 1:
+            self._store(key, result.generations[0].message)
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        key = self._cache_key(messages, stop, kwargs)
+        cached = self._cached(key)
+        if cached is not None:
+            return ChatResult(generations=[ChatGeneration(message=cached)])
+
+        agenerate = super()._agenerate
+
+        async def attempt(model):
+            await self._aacquire()
+            return await agenerate(messages, stop=stop, run_manager=run_manager, **self._attempt_kwargs(kwargs, model))
+
+        result = await acall_with_policy(attempt, self.model_name, self.call_policy, self._latency["invoke"])
+        if len(result.generations) == 1:
+            self._store(key, result.generations[0].message)
+        return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        key = self._cache_key(messages, stop, kwargs)
+        cached = self._cached(key)
+        if cached is not None:
+            chunk = self._replay_chunk(cached)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+            return
+
+        stream = super()._stream
+
+        def open_stream(model):
+            # Politika ilk parçaya kadar geçen süreye uygulanır. Token callback'lerini
+            # burada değil aşağıda çağırıyoruz; böylece kaybeden hedge isteğinin
+            # parçaları arayüze akmaz.
+            self._acquire()
+            iterator = stream(messages, stop=stop, run_manager=None, **self._attempt_kwargs(kwargs, model))
+            return next(iterator, None), iterator
+
+        first, iterator = call_with_policy(
+            open_stream, self.model_name, self.call_policy, self._latency["stream"],
+            discard=lambda opened: opened[1].close(),
+        )
+        aggregate = None
+        for chunk in chain([first] if first is not None else [], iterator):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            aggregate = chunk.message if aggregate is None else aggregate + chunk.message
+            yield chunk
+        # Akış yarıda kesilirse (hata/iptal) buraya gelinmez; eksik cevap saklanmaz.
+        if aggregate is not None:
+            self._store(key, message_chunk_to_message(aggregate))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        key = self._cache_key(messages, stop, kwargs)
+        cached = self._cached(key)
+        if cached is not None:
+            chunk = self._replay_chunk(cached)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+            return
+
+        astream = super()._astream
+
+        async def open_stream(model):
+            await self._aacquire()
+            iterator = astream(messages, stop=stop, run_manager=None, **self._attempt_kwargs(kwargs, model))
+            try:
+                return await iterator.__anext__(), iterator
+            except StopAsyncIteration:
+                return None, iterator
+
+        first, iterator = await acall_with_policy(
+            open_stream, self.model_name, self.call_policy, self._latency["stream"],
+            discard=lambda opened: asyncio.ensure_future(opened[1].aclose()),
+        )
+        aggregate = None
+
+        async def chunks():
+            if first is not None:
+                yield first
+            async for chunk in iterator:
+                yield chunk
+
+        async for chunk in chunks():
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            aggregate = chunk.message if aggregate is None else aggregate + chunk.message
+            yield chunk
+        if aggregate is not None:
+            self._store(key, message_chunk_to_message(aggregate))
+
+def __getattr__(name: str):
+    # Proje genelinde kullanılan LLM örneği artık import anında değil, ilk erişimde
+    # oluşturulur (bkz. resources.get_llm; model ve temperature ayarları oradadır).
+    # `from open_router import llm` yazan eski kodlar çalışmaya devam eder.
+    if name == "llm":
+        from resources import get_llm
+        return get_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,107 @@
+"""
+Çok süreçli (multi-process) embedding yardımcıları.
+
+Ingestion sırasında tek bir süreçte çalışan BERT modeli CPU çekirdeklerinin
+çoğunu boşta bırakır. Bu modüldeki `ParallelEmbedder`, her biri kendi
+`HuggingFaceEmbeddings` örneğini yükleyen N adet işçi süreç başlatır ve
+chunk metinlerini parçalara (shard) bölerek bu süreçlere dağıtır.
+
+Sonuçlar gönderildiği sırayla geri toplanır; böylece Chroma'ya yazma işini
+ana süreçteki tek bir yazıcı sırayı bozmadan yapabilir. Bir embedding önbelleği
+(`embedding_cache.CachedEmbeddings`) verilirse önbellekte olan metinler işçilere
+hiç gönderilmez, yeni hesaplananlar da önbelleğe yazılır.
+
+Not: Bu modül bilerek hafif tutuldu (ingestion'ı import etmez); işçi süreçler
+yalnızca bu modülü ve embedding modelini yükler.
+"""
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain_huggingface import HuggingFaceEmbeddings
+
+
+# Her işçi süreçte bir kez oluşturulan embedding modeli.
+_worker_embedding = None
+
+
+def _init_worker(model_name: str, model_kwargs: dict, encode_kwargs: dict, threads: int) -> None:
+    # İşçi süreç başlarken çağrılır. Her süreçte torch'un thread sayısını
+    # sınırlıyoruz; aksi halde N süreç x tüm çekirdekler kadar thread açılır
+    # ve süreçler birbirini yavaşlatır (oversubscription).
+    import torch
+    torch.set_num_threads(threads)
+
+    global _worker_embedding
+    _worker_embedding = HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs=model_kwargs,
+        encode_kwargs=encode_kwargs
+    )
+
+
+def _encode_shard(texts: list[str]) -> list[list[float]]:
+    # Tek bir shard'ı işçi süreçteki model ile encode eder.
+    return _worker_embedding.embed_documents(texts)
+
+
+class ParallelEmbedder:
+    """Chunk metinlerini birden fazla süreçte paralel olarak embed eder.
+
+    Kullanım:
+        with ParallelEmbedder(embedding, workers=4) as embedder:
+            pending = embedder.submit(texts)
+            vectors = embedder.collect(pending)
+
+    `submit` hemen döner; böylece bir sonraki batch encode edilirken önceki
+    batch Chroma'ya yazılabilir.
+    """
+
+    def __init__(self, embedding: HuggingFaceEmbeddings, workers: int, shard_size: int = 256, cache=None):
+        self.workers = workers
+        self.cache = cache
+        self.shard_size = shard_size
+        self._init_args = (
+            embedding.model_name,
+            embedding.model_kwargs,
+            embedding.encode_kwargs,
+            max(1, (os.cpu_count() or 1) // workers),
+        )
+        self._executor = None
+
+    def __enter__(self):
+        # fork yerine spawn kullanıyoruz: torch thread havuzları fork sonrası
+        # kilitlenebiliyor.
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=self._init_args,
+        )
+        return self
+
+    def __exit__(self, *exc):
+        self._executor.shutdown()
+        self._executor = None
+
+    def submit(self, texts: list[str]) -> tuple:
+        # Önbellekte olmayan (ve batch içinde tekrarlanmayan) metinleri shard'lara
+        # bölüp işçilere gönderir; `collect`e verilecek bekleyen batch'i döner.
+        cached = self.cache.lookup(texts) if self.cache else [None] * len(texts)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, cached) if v is None))
+        futures = [
+            self._executor.submit(_encode_shard, missing[i:i + self.shard_size])
+            for i in range(0, len(missing), self.shard_size)
+        ]
+        return texts, cached, missing, futures
+
+    def collect(self, pending: tuple) -> list[list[float]]:
+        # Future'ları gönderildikleri sırayla bekler, önbellekten gelenlerle
+        # birleştirip metinlerin orijinal sırasıyla vektör listesi döner.
+        texts, cached, missing, futures = pending
+        computed = [vector for future in futures for vector in future.result()]
+        if self.cache and missing:
+            self.cache.store(missing, computed)
+        by_text = dict(zip(missing, computed))
+        return [v if v is not None else by_text[t] for t, v in zip(texts, cached)]
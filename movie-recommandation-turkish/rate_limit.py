@@ -0,0 +1,80 @@
+"""
+OpenRouter istekleri için token bucket hız sınırlayıcı.
+
+Kova en fazla `burst` jeton tutar ve saniyede `requests_per_second` jeton dolar;
+her LLM isteği bir jeton harcar. Kova boşsa istek jeton gelene kadar bekler.
+Böylece kısa patlamalara izin verilirken uzun vadeli istek hızı sağlayıcının
+sınırını (ör. OpenRouter'ın dakikalık limiti) geçmez.
+
+`TokenBucket`, LangChain'in `BaseRateLimiter` arayüzünü uygular; `ChatOpenRouter`a
+`request_limiter=` olarak verildiğinde ağa giden senkron ve asenkron her
+istekten önce jeton bekler (bkz. resources.get_llm; önbellekten dönen cevaplar
+beklemez). Herhangi bir LangChain chat modeline `rate_limiter=` olarak da
+verilebilir. Kova thread'ler ve event loop'lar arasında paylaşılır; batch
+çalıştırıcıdaki tüm eşzamanlı sorular aynı sınırı paylaşır.
+"""
+
+import time
+import asyncio
+import threading
+
+from langchain_core.rate_limiters import BaseRateLimiter
+
+# Bekleme süreleri metrik olarak kaydedilir.
+from instrumentation import metrics
+
+
+class TokenBucket(BaseRateLimiter):
+    """Thread-safe token bucket.
+
+    Args:
+        requests_per_second: Kovanın dolma hızı (jeton/sn).
+        burst: Kovanın kapasitesi; art arda beklemeden yapılabilecek istek sayısı.
+    """
+
+    def __init__(self, requests_per_second: float, burst: int = 1):
+        if requests_per_second <= 0:
+            raise ValueError("requests_per_second pozitif olmalıdır.")
+        self.rate = requests_per_second
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _try_take(self) -> float:
+        # Jeton varsa alır ve 0 döner; yoksa bir jeton dolana kadar beklenecek süreyi döner.
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def _record(self, waited: float) -> None:
+        metrics.observe("rate_limit_wait_seconds", waited, help="LLM isteklerinin hız sınırında beklediği süre.")
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        """Bir jeton alır; `blocking=False` iken jeton yoksa hemen False döner."""
+        started = time.perf_counter()
+        while True:
+            wait = self._try_take()
+            if not wait:
+                self._record(time.perf_counter() - started)
+                return True
+            if not blocking:
+                return False
+            time.sleep(wait)
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        """`acquire`ın asenkron sürümü; beklerken event loop'u bloklamaz."""
+        started = time.perf_counter()
+        while True:
+            wait = self._try_take()
+            if not wait:
+                self._record(time.perf_counter() - started)
+                return True
+            if not blocking:
+                return False
+            await asyncio.sleep(wait)
@@ -0,0 +1,170 @@
+"""
+CPU üzerinde çalışan cross-encoder ile yeniden sıralama (rerank) ve değişken bağlam boyutu.
+
+`movie_retriever` ve hibrit arama (retrieval.py) sabit `k=6` dokümanı kosinüs
+benzerliği / RRF sırasıyla döndürür; `generate` alakalı olsun olmasın hepsini
+alır. Cross-encoder soru ile dokümanı birlikte okuduğu için alaka sıralaması
+çok daha isabetlidir ama her çift için ayrı bir model geçişi gerekir.
+
+`CrossEncoderReranker` isteğe bağlı bir ikinci aşamadır (`RERANK=1`):
+
+- Arama `RERANK_CANDIDATES` kadar geniş bir aday kümesi getirir.
+- Tüm (soru, chunk) çiftleri tek bir batch'te, CPU'da skorlanır.
+- Skoru `threshold` üzerindeki dokümanlar skor sırasıyla (en fazla `k`) tutulur;
+  hiçbiri geçemese bile en iyi `min_docs` doküman bırakılır. Çoğu soruda LLM'e
+  daha az ve daha alakalı chunk gider.
+
+Gecikme bütçesi: model çift başına süreyi hareketli ortalama ile öğrenir. Tüm
+adaylar için tahmini süre `budget_ms` bütçesini aşıyorsa sadece bütçeye sığan
+ilk adaylar skorlanır; bu sayı `k`'nın altında kalıyorsa, ya da model henüz
+yüklenmediyse (yükleme arka planda başlatılır) rerank atlanır ve arama
+sonucunun ilk `k` dokümanı olduğu gibi döner. Tahmin tek bir yavaş ölçümle
+şişip rerank'ı kalıcı olarak kapatmasın diye her `PROBE_EVERY` atlamada bir
+ölçüm için yine de çalıştırılır.
+"""
+
+import time
+import logging
+import threading
+from typing import Optional
+
+from langchain_core.documents import Document
+
+# Cross-encoder modeli ve ayarları paylaşılan kaynaklardan gelir.
+import resources
+
+# Rerank süresi, atlanma nedenleri ve tutulan doküman sayısı izlenir.
+from instrumentation import metrics, span, annotate, COUNT_BUCKETS
+
+
+logger = logging.getLogger(__name__)
+
+# Çift başına süre tahmininde yeni ölçümün ağırlığı (üstel hareketli ortalama).
+COST_SMOOTHING = 0.2
+
+# Isıtmada skorlanan örnek çift sayısı (ilk süre tahmini için).
+WARM_UP_PAIRS = 8
+
+# Bütçe yüzünden art arda bu kadar atlamadan sonra süre tahmini için bir kez çalıştırılır.
+PROBE_EVERY = 50
+
+
+class CrossEncoderReranker:
+    """Aday dokümanları cross-encoder skoruna göre süzen ve sıralayan aşama.
+
+    Args:
+        threshold: Dokümanın tutulması için gereken en düşük skor (0-1, sigmoid).
+        min_docs: Eşiği geçen olmasa bile tutulacak en az doküman.
+        budget_ms: Rerank için gecikme bütçesi (milisaniye); tahmin aşarsa atlanır.
+        model: `predict(pairs)` sağlayan nesne; verilmezse `resources.get_cross_encoder()`
+            arka planda yüklenir.
+    """
+
+    def __init__(self, threshold: float = 0.3, min_docs: int = 2, budget_ms: float = 200.0, model=None):
+        self.threshold = threshold
+        self.min_docs = min_docs
+        self.budget = budget_ms / 1000
+        self._model = model
+        # Çift başına saniye (tahmin); ilk ölçüme kadar None.
+        self.seconds_per_pair: Optional[float] = None
+        self._over_budget = 0
+        self._lock = threading.Lock()
+        self._loader = None
+
+    @property
+    def ready(self) -> bool:
+        return self._model is not None
+
+    def _load(self) -> None:
+        try:
+            self.warm_up()
+        except Exception:
+            logger.exception("Cross-encoder modeli yüklenemedi; rerank atlanacak.")
+
+    def ensure_loading(self) -> None:
+        # Model ilk istekte arka planda yüklenir; istek yüklemeyi beklemez.
+        with self._lock:
+            if self._model is None and self._loader is None:
+                self._loader = threading.Thread(target=self._load, name="rerank-loader", daemon=True)
+                self._loader.start()
+
+    def warm_up(self) -> None:
+        """Modeli yükler ve örnek bir batch ile çift başına süreyi ölçer."""
+        model = self._model or resources.get_cross_encoder()
+        texts = ["Bir bilim kurgu filmi."] * WARM_UP_PAIRS
+        # İlk çağrı (thread havuzu, bellek ayırma) tahmine girmesin diye iki kez skorlanır.
+        model.predict([("film önerisi", text) for text in texts], show_progress_bar=False)
+        self._score(model, "film önerisi", texts)
+        self._model = model
+
+    def _score(self, model, query: str, texts: list[str]) -> list[float]:
+        started = time.perf_counter()
+        scores = model.predict([(query, text) for text in texts], batch_size=max(1, len(texts)),
+                               show_progress_bar=False)
+        per_pair = (time.perf_counter() - started) / max(1, len(texts))
+        previous = self.seconds_per_pair
+        self.seconds_per_pair = per_pair if previous is None else (
+            (1 - COST_SMOOTHING) * previous + COST_SMOOTHING * per_pair
+        )
+        return [float(s) for s in scores]
+
+    def estimate(self, pairs: int) -> Optional[float]:
+        """`pairs` çift için tahmini süre (saniye); henüz ölçüm yoksa None."""
+        return None if self.seconds_per_pair is None else self.seconds_per_pair * pairs
+
+    def rerank(self, query: str, docs: list[Document], k: int) -> list[Document]:
+        """Adayları skorlar; eşiği geçenleri (en az `min_docs`, en fazla `k`) skor sırasıyla döndürür.
+
+        Rerank atlanırsa adayların ilk `k` tanesi olduğu gibi döner.
+        """
+        if len(docs) <= 1:
+            return docs[:k]
+        if not self.ready:
+            self.ensure_loading()
+            return self._skip("cold", docs, k)
+        estimate = self.estimate(len(docs))
+        if estimate is not None and estimate > self.budget:
+            annotate(rerank_estimate_ms=round(estimate * 1000, 1))
+            fits = int(self.budget / self.seconds_per_pair)
+            self._over_budget += 1
+            if fits >= k:
+                # Bütçeye sığan ilk adaylar skorlanır; kalanlar zaten arama sırasında daha geride.
+                docs = docs[:fits]
+            elif self._over_budget < PROBE_EVERY:
+                return self._skip("over_budget", docs, k)
+        self._over_budget = 0
+
+        with span("rerank", candidates=len(docs)):
+            started = time.perf_counter()
+            try:
+                scores = self._score(self._model, query, [doc.page_content for doc in docs])
+            except Exception:
+                logger.exception("Rerank başarısız oldu; arama sırası kullanılıyor.")
+                return self._skip("error", docs, k)
+            elapsed = time.perf_counter() - started
+
+            ranked = sorted(zip(scores, range(len(docs))), key=lambda item: item[0], reverse=True)
+            kept = [i for score, i in ranked[:k] if score >= self.threshold]
+            if len(kept) < self.min_docs:
+                kept = [i for _, i in ranked[:min(self.min_docs, k)]]
+            annotate(kept=len(kept), top_score=round(ranked[0][0], 3))
+
+        metrics.inc("rerank_total", help="Rerank aşaması.", result="ok")
+        metrics.observe("rerank_seconds", elapsed, help="Cross-encoder skorlama süresi.")
+        metrics.observe("rerank_kept_docs", len(kept), buckets=COUNT_BUCKETS,
+                        help="Rerank sonrası LLM'e giden doküman sayısı.")
+        return [docs[i] for i in kept]
+
+    @staticmethod
+    def _skip(reason: str, docs: list[Document], k: int) -> list[Document]:
+        metrics.inc("rerank_total", help="Rerank aşaması.", result=reason)
+        annotate(rerank_skipped=reason)
+        return docs[:k]
+
+
+# Arama tarafından kullanılan paylaşılan örnek (RERANK=1 ise).
+reranker = CrossEncoderReranker(
+    threshold=resources.rerank_threshold,
+    min_docs=resources.rerank_min_docs,
+    budget_ms=resources.rerank_budget_ms,
+)
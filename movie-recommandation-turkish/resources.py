@@ -0,0 +1,483 @@
+"""
+Süreç genelinde paylaşılan, tembel (lazy) oluşturulan kaynaklar.
+
+Eskiden `graph.graph` import edilince `ingestion` da import ediliyor; BERT modeli
+yükleniyor, veritabanı yoksa tüm korpus ingest ediliyor ve Chroma açılıyordu.
+`open_router` da LLM istemcisini import anında kuruyordu. Streamlit'in soğuk
+açılışı bu yüzden uzun sürüyordu.
+
+Bu modül sadece yolları/ayarları tanımlar ve ağır nesneleri ilk kullanımda
+oluşturan `get_*` fonksiyonları sağlar. Her fonksiyon kilitli bir `lru_cache` ile
+sarılıdır; nesne süreç başına bir kez kurulur (warm-up thread'i ile ilk istek
+aynı anda gelse bile) ve tüm Streamlit oturumları ile yeniden
+çalıştırmalar (rerun) arasında paylaşılır. Ağır kütüphaneler de fonksiyon
+içinde import edilir.
+
+`warm_up()` bu kaynakları arka planda bir thread'de hazırlar; böylece uygulama
+hemen açılır ve ilk soru da model yüklemesini beklemez.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+
+
+logger = logging.getLogger(__name__)
+
+# Türkçe için eğitilmiş BERT tabanlı cümle embedding modeli.
+embedding_model_name = "emrecan/bert-base-turkish-cased-mean-nli-stsb-tr"
+embedding_model_kwargs = {"device": "cpu"}
+embedding_encode_kwargs = {"normalize_embeddings": True}
+
+# Embedding önbelleği (bkz. embedding_cache.py); LRU ile tahliye edilen en fazla kayıt.
+embedding_cache_path = "./.chroma/embedding_cache.sqlite"
+embedding_cache_max_entries = 500_000
+
+# Sorgu embedding'lerinin mikro batch'lenmesi (bkz. micro_batch.py): önbellekte olmayan
+# eşzamanlı sorgular en fazla bu kadar milisaniye beklenip tek model çağrısında encode
+# edilir. 1 ise kapalıdır; sunucu modu (serve.py) `--embed-batch-size` ile açar.
+embedding_batch_size = int(os.environ.get("EMBED_BATCH_SIZE", 1))
+embedding_batch_wait_ms = float(os.environ.get("EMBED_BATCH_WAIT_MS", 5))
+
+# Aramadan sonra isteğe bağlı cross-encoder rerank aşaması (bkz. rerank.py): RERANK=1 ise
+# arama `rerank_candidates` aday getirir, CPU'da tek batch'te skorlanır ve skoru eşiğin
+# üzerindeki dokümanlar (en az `rerank_min_docs`) LLM'e gider. Tahmini süre
+# `rerank_budget_ms` bütçesini aşarsa aday sayısı bütçeye göre kısaltılır ya da rerank atlanır.
+rerank_enabled = os.environ.get("RERANK") == "1"
+rerank_model_name = os.environ.get("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+rerank_candidates = int(os.environ.get("RERANK_CANDIDATES", 20))
+rerank_threshold = float(os.environ.get("RERANK_THRESHOLD", 0.3))
+rerank_min_docs = int(os.environ.get("RERANK_MIN_DOCS", 2))
+rerank_budget_ms = float(os.environ.get("RERANK_BUDGET_MS", 200))
+
+# Chroma veritabanının kaydedildiği dizin ve koleksiyon adları.
+db_path = "./.chroma/movie"
+collection_name = "movie-db"
+# Film seviyesi koleksiyon: her film için tek bir birleşik vektör (bkz. retrieval.py).
+movie_collection_name = "movie-level-db"
+
+# Vektör deposu arka ucu: "chroma" veya "mmap" (bkz. mmap_store.py; float16/int8
+# vektörler, bellek eşlemeli dosyada tam arama). Ingestion `--backend` ile seçer ve
+# seçimi `vector_backend_path` dosyasına yazar; uygulama aynı depoyu açar.
+# VECTOR_BACKEND / VECTOR_DTYPE ortam değişkenleri dosyadaki seçimi geçersiz kılar.
+vector_backend_path = "./.chroma/vector_backend.json"
+mmap_db_path = "./.chroma/movie-mmap"
+
+
+def _read_vector_backend() -> tuple[str, str]:
+    saved = {}
+    if os.path.exists(vector_backend_path):
+        with open(vector_backend_path, encoding="utf-8") as f:
+            saved = json.load(f)
+    return (
+        os.environ.get("VECTOR_BACKEND") or saved.get("backend", "chroma"),
+        os.environ.get("VECTOR_DTYPE") or saved.get("dtype", "float16"),
+    )
+
+
+vector_backend, vector_dtype = _read_vector_backend()
+
+# Ingestion'ın ürettiği tür/yönetmen sözlüğü, film tablosu (olgu soruları için) ve
+# sözcüksel indeks dosyaları.
+facets_path = "./.chroma/movie_facets.json"
+movie_facts_path = "./.chroma/movie_facts.json"
+lexical_index_path = "./.chroma/movie_lexical.pkl"
+
+# Sürümlü indeks anlık görüntüleri (bkz. snapshots.py). Ingestion yukarıdaki çalışma
+# dizinlerine yazar ve sonunda değişmez bir anlık görüntü yayınlar; uygulama
+# (main.py, serve.py) etkin anlık görüntüden okur, yenisi yayınlanınca kesintisiz geçer.
+# INDEX_SNAPSHOTS=0 ile uygulama doğrudan çalışma dizinini açar (eski davranış).
+snapshots_path = "./.chroma/snapshots"
+index_snapshots = os.environ.get("INDEX_SNAPSHOTS", "1") != "0"
+# Etkin sürüm dışında diskte tutulan en fazla anlık görüntü ve `CURRENT` kontrol aralığı.
+snapshot_keep = int(os.environ.get("SNAPSHOT_KEEP", 2))
+snapshot_poll_seconds = float(os.environ.get("SNAPSHOT_POLL_SECONDS", 10))
+
+# Chunk boyutu bu tiktoken kodlamasıyla sayılır; bağlam bütçesi de (context_builder.py)
+# aynı kodlamayı kullanır.
+splitter_encoding = "gpt2"
+
+# LLM cevap önbelleği (bkz. llm_cache.py). LLM_CACHE: "sqlite" (bellek + disk),
+# "memory" (sadece bellek) veya "off".
+llm_cache_mode = os.environ.get("LLM_CACHE", "sqlite")
+llm_cache_path = "./.chroma/llm_cache.sqlite"
+llm_cache_max_entries = 100_000
+
+# Varsayılan LLM ayarları.
+llm_model = "openai/gpt-5-nano"
+llm_temperature = 0.7
+
+# LLM çağrılarının süre sınırı, tekrar deneme, hedge ve yedek model ayarları
+# (bkz. llm_resilience.py). LLM_HEDGE_AFTER verilmezse hedge eşiği son çağrıların
+# p95 gecikmesidir; LLM_FALLBACK_MODELS virgülle ayrılmış sıralı model listesidir.
+llm_deadline = float(os.environ["LLM_DEADLINE"]) if os.environ.get("LLM_DEADLINE") else None
+llm_retries = int(os.environ.get("LLM_RETRIES", 2))
+llm_hedge = os.environ.get("LLM_HEDGE") == "1"
+llm_hedge_after = float(os.environ["LLM_HEDGE_AFTER"]) if os.environ.get("LLM_HEDGE_AFTER") else None
+llm_fallback_models = [m.strip() for m in os.environ.get("LLM_FALLBACK_MODELS", "").split(",") if m.strip()]
+
+# OpenRouter istek hızı sınırı (istek/sn, token bucket); 0 ise sınır yok. Batch
+# çalıştırıcı bu sınırı `--rps`/`--burst` ile ayarlar.
+llm_requests_per_second = float(os.environ.get("LLM_REQUESTS_PER_SECOND", 0))
+llm_burst = int(os.environ.get("LLM_BURST", 1))
+
+
+# Kaynaklar birbirini çağırdığı için (ör. vektör deposu → embedding) yeniden girilebilir kilit.
+_init_lock = threading.RLock()
+
+
+def _singleton(func):
+    # lru_cache'i bir kilitle sarar: ilk oluşturma tek thread'de yapılır, sonraki
+    # çağrılar kilide girmeden önbellekten döner. `override(obj)` ile kaynak başka
+    # bir nesneyle değiştirilebilir (ör. benchmark'ta sahte LLM/embedder).
+    cached = lru_cache(maxsize=None)(func)
+    overridden = []
+
+    @wraps(func)
+    def wrapper():
+        if overridden:
+            return overridden[0]
+        if cached.cache_info().currsize:
+            return cached()
+        with _init_lock:
+            return cached()
+
+    def override(obj) -> None:
+        overridden[:] = [] if obj is None else [obj]
+
+    wrapper.cache_clear = cached.cache_clear
+    wrapper.override = override
+    return wrapper
+
+
+@_singleton
+def get_hf_embedding():
+    """BERT embedding modeli (ilk çağrıda yüklenir)."""
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(
+        model_name=embedding_model_name,
+        model_kwargs=embedding_model_kwargs,
+        encode_kwargs=embedding_encode_kwargs,
+    )
+
+
+@_singleton
+def get_embedding():
+    """Disk önbellekli embedding nesnesi; ingestion ve sorgu zamanında ortak kullanılır."""
+    from embedding_cache import CachedEmbeddings
+
+    model = get_hf_embedding()
+    if embedding_batch_size > 1:
+        # Batch'leyici önbelleğin içinde durur: önbellekten dönen sorgular beklemez.
+        from micro_batch import MicroBatchEmbeddings
+
+        model = MicroBatchEmbeddings(model, embedding_batch_size, embedding_batch_wait_ms)
+    os.makedirs(os.path.dirname(embedding_cache_path), exist_ok=True)
+    return CachedEmbeddings(
+        model,
+        model_name=embedding_model_name,
+        path=embedding_cache_path,
+        max_entries=embedding_cache_max_entries,
+    )
+
+
+@_singleton
+def get_cross_encoder():
+    """Rerank için çok dilli cross-encoder (CPU, skorlar sigmoid ile 0-1 aralığında)."""
+    from sentence_transformers import CrossEncoder
+
+    return CrossEncoder(rerank_model_name, device="cpu", max_length=256)
+
+
+def open_vector_store(name: str, backend: str = None, dtype: str = None, root: str = None):
+    """Koleksiyonu açar; iki arka uç da aynı VectorStore/`get` arayüzünü sunar.
+
+    Verilmeyen arka uç, vektör tipi ve dizin için seçili arka ucun çalışma dizini
+    kullanılır; anlık görüntüler (snapshots.py) kendi dizinlerini verir.
+    """
+    backend = backend or vector_backend
+    if backend == "mmap":
+        from mmap_store import MmapVectorStore
+
+        return MmapVectorStore(os.path.join(root or mmap_db_path, name), embedding_function=get_embedding(),
+                               dtype=dtype or vector_dtype)
+    from langchain_community.vectorstores import Chroma
+
+    return Chroma(collection_name=name, persist_directory=root or db_path, embedding_function=get_embedding())
+
+
+def close_vector_store(store) -> None:
+    """`open_vector_store` ile açılmış bir depoyu kapatır ve belleğini bırakır.
+
+    chromadb, açtığı System'i (SQLite bağlantısı, HNSW segmentleri) `persist_directory`
+    anahtarıyla sınıf seviyesindeki `SharedSystemClient._identifier_to_system` önbelleğinde
+    tutar; depo nesnesi bırakılsa da System süreç ömrü boyunca bellekte kalır. Burada
+    System durdurulur ve önbellekten çıkarılır. mmap deposunun eşlemeleri bırakılır.
+    """
+    close = getattr(store, "close", None)
+    if callable(close):
+        close()
+        return
+    client = getattr(store, "_client", None)
+    system = getattr(client, "_system", None)
+    # Aynı dizindeki ikinci koleksiyonun System'i ilkiyle birlikte durdurulmuş olabilir.
+    if system is None or not getattr(system, "_running", True):
+        return
+    # Önbellek sözlüğü sürüme göre farklı sınıflarda tanımlı; MRO'da aranır.
+    for cls in type(client).__mro__:
+        cache = cls.__dict__.get("_identifier_to_system")
+        if cache is not None:
+            if cache.get(getattr(client, "_identifier", None)) is system:
+                cache.pop(client._identifier, None)
+            break
+    system.stop()
+
+
+def as_movie_retriever(store):
+    """Chunk koleksiyonu üzerinde benzerlik araması yapan retriever (k=6)."""
+    return store.as_retriever(search_type="similarity", search_kwargs={"k": 6})
+
+
+def vector_db_path() -> str:
+    """Seçili arka ucun veritabanı dizini."""
+    return mmap_db_path if vector_backend == "mmap" else db_path
+
+
+def set_vector_backend(backend: str, dtype: str = None) -> None:
+    """Vektör deposu arka ucunu seçer, seçimi diske yazar ve açık depoları kapatır.
+
+    Ingestion `--backend` ile çağırır; sonraki `get_vectorstore` vb. çağrılar yeni
+    arka ucu açar ve uygulama da yeniden başlatıldığında aynı seçimi okur.
+    """
+    global vector_backend, vector_dtype
+    if backend not in ("chroma", "mmap"):
+        raise ValueError(f"Bilinmeyen vektör deposu arka ucu: {backend}")
+    with _init_lock:
+        vector_backend = backend
+        vector_dtype = dtype or vector_dtype
+        os.makedirs(os.path.dirname(vector_backend_path), exist_ok=True)
+        with open(vector_backend_path, "w", encoding="utf-8") as f:
+            json.dump({"backend": vector_backend, "dtype": vector_dtype}, f)
+        get_vectorstore.cache_clear()
+        get_movie_level_store.cache_clear()
+        get_movie_retriever.cache_clear()
+
+
+# Uygulama süreçlerinde etkin anlık görüntüyü tutan yönetici; ingestion'da None kalır.
+_snapshot_manager = None
+
+
+def start_snapshot_watcher():
+    """Anlık görüntü yöneticisini kurar ve `CURRENT` izleyicisini başlatır (süreç başına bir kez)."""
+    global _snapshot_manager
+    from snapshots import SnapshotManager
+
+    with _init_lock:
+        if _snapshot_manager is None:
+            _snapshot_manager = SnapshotManager(snapshots_path, snapshot_poll_seconds)
+            _snapshot_manager.start()
+    return _snapshot_manager
+
+
+# `snapshot_lease` bloğu içinde kiralanmış anlık görüntü (istek boyunca hep aynı sürüm).
+_leased_snapshot: contextvars.ContextVar = contextvars.ContextVar("leased_snapshot", default=None)
+
+
+def active_snapshot():
+    """Etkin indeks anlık görüntüsü; izleyici başlatılmadıysa veya hiç yayın yoksa None.
+
+    `snapshot_lease` bloğu içinde, blok başında kiralanan sürüm döner.
+    """
+    snapshot = _leased_snapshot.get()
+    if snapshot is not None:
+        return snapshot
+    manager = _snapshot_manager
+    return manager.get() if manager is not None else None
+
+
+@contextmanager
+def snapshot_lease():
+    """Bir istek boyunca etkin anlık görüntüyü kiralar.
+
+    Blok içindeki `active_snapshot()` (ve `get_movie_retriever()` vb.) çağrıları, arada yeni
+    bir sürüme geçilse de kiralanan sürümü görür; eski sürüm son kiracısı çıkınca kapatılır.
+    İç içe bloklar dıştakinin kirasını kullanır; izleyici yoksa bir şey yapmaz.
+    """
+    manager = _snapshot_manager
+    if manager is None or _leased_snapshot.get() is not None:
+        yield
+        return
+    snapshot = manager.acquire()
+    token = _leased_snapshot.set(snapshot)
+    try:
+        yield
+    finally:
+        try:
+            _leased_snapshot.reset(token)
+        except ValueError:
+            # Generator'larda blok farklı bir context'te kapanabilir; o durumda token geçersizdir.
+            _leased_snapshot.set(None)
+        if snapshot is not None:
+            manager.release(snapshot)
+
+
+def index_file(path: str) -> str:
+    """Ingestion çıktısı bir dosyanın (ör. `facets_path`) okunacağı yol: etkin anlık görüntüdeki kopyası
+    veya çalışma dizinindeki dosya."""
+    snapshot = active_snapshot()
+    return snapshot.file(path) if snapshot is not None else path
+
+
+def _from_snapshot(attr: str, working):
+    # Etkin bir anlık görüntü varsa kaynak ondan, yoksa çalışma dizinindeki tekil nesneden
+    # döner. Her çağrıda okunduğu için geçişten sonraki çağrılar yeni sürümü görür.
+    @wraps(working)
+    def wrapper():
+        snapshot = active_snapshot()
+        return getattr(snapshot, attr) if snapshot is not None else working()
+
+    wrapper.cache_clear = working.cache_clear
+    wrapper.override = working.override
+    return wrapper
+
+
+@_singleton
+def _working_vectorstore():
+    """Chunk koleksiyonu (açıklama ve yorum chunk'ları)."""
+    return open_vector_store(collection_name)
+
+
+@_singleton
+def _working_movie_level_store():
+    """Film seviyesi koleksiyon (film başına tek vektör)."""
+    return open_vector_store(movie_collection_name)
+
+
+@_singleton
+def _working_movie_retriever():
+    """Chunk koleksiyonu üzerinde benzerlik araması yapan retriever (k=6)."""
+    path = vector_db_path()
+    if not os.path.exists(path) or not os.listdir(path):
+        # Uygulama artık ingestion'ı kendisi başlatmaz; veritabanı açıkça kurulmalıdır.
+        logger.warning("Film veritabanı bulunamadı (%s); önce `python ingestion.py` çalıştırın.", path)
+    return as_movie_retriever(_working_vectorstore())
+
+
+get_vectorstore = _from_snapshot("vectorstore", _working_vectorstore)
+get_movie_level_store = _from_snapshot("movie_level_store", _working_movie_level_store)
+get_movie_retriever = _from_snapshot("movie_retriever", _working_movie_retriever)
+
+
+@_singleton
+def get_rate_limiter():
+    """LLM istekleri için paylaşılan token bucket; sınır ayarlı değilse None."""
+    if llm_requests_per_second <= 0:
+        return None
+    from rate_limit import TokenBucket
+
+    return TokenBucket(llm_requests_per_second, llm_burst)
+
+
+@_singleton
+def get_llm_cache():
+    """Paylaşılan LLM cevap önbelleği; LLM_CACHE=off ise None."""
+    if llm_cache_mode == "off":
+        return None
+    from llm_cache import LLMCache
+
+    path = llm_cache_path if llm_cache_mode == "sqlite" else None
+    return LLMCache(path=path, max_entries=llm_cache_max_entries)
+
+
+@_singleton
+def get_llm():
+    """Proje genelinde kullanılan OpenRouter LLM istemcisi."""
+    from open_router import ChatOpenRouter
+    from instrumentation import llm_metrics_callback
+    from llm_resilience import CallPolicy
+
+    # Callback her çağrının süresini ve token kullanımını istek izine/metriklere yazar;
+    # rate limiter (varsa) ağa giden her istekten önce jeton bekler. Önbellekte cevabı
+    # olan istekler ağa hiç çıkmaz, hız sınırına da takılmaz.
+    return ChatOpenRouter(
+        model=llm_model,
+        temperature=llm_temperature,
+        callbacks=[llm_metrics_callback],
+        request_limiter=get_rate_limiter(),
+        response_cache=get_llm_cache(),
+        call_policy=CallPolicy(
+            deadline=llm_deadline,
+            retries=llm_retries,
+            hedge=llm_hedge,
+            hedge_after=llm_hedge_after,
+            fallback_models=llm_fallback_models,
+        ),
+    )
+
+
+@_singleton
+def get_token_encoder():
+    """Text splitter ile aynı tiktoken kodlayıcısı."""
+    import tiktoken
+
+    return tiktoken.get_encoding(splitter_encoding)
+
+
+def _warm_up() -> None:
+    # Kaynakları ilk sorgunun izleyeceği sırayla hazırlar.
+    from retrieval import lexical_index
+    from graph.chains.route import get_question_router
+    from graph.chains.fast_intent import fast_intent_classifier
+    from graph.chains.fact_question import fact_table
+
+    started = time.perf_counter()
+    try:
+        get_embedding().embed_query("merhaba")
+        get_movie_retriever()
+        get_movie_level_store()
+        lexical_index.get()
+        fact_table.refresh()
+        get_token_encoder()
+        get_question_router()
+        fast_intent_classifier.warm_up()
+        if rerank_enabled:
+            from rerank import reranker
+
+            reranker.warm_up()
+    except Exception:
+        logger.exception("Kaynak ısıtma (warm-up) başarısız oldu.")
+        return
+    logger.info("Kaynaklar hazır (%.1f sn).", time.perf_counter() - started)
+
+
+_warm_up_lock = threading.Lock()
+_warm_up_thread = None
+
+
+def warm_up(background: bool = True):
+    """Embedder, vektör veritabanı, sözcüksel indeks ve LLM istemcisini önceden hazırlar.
+
+    Anlık görüntüler açıksa (`index_snapshots`) yeni sürümleri izleyen thread de başlatılır.
+
+    Süreç başına yalnızca bir kez çalışır; sonraki çağrılar aynı thread'i döndürür.
+
+    Args:
+        background: True ise iş daemon bir thread'de yapılır ve hemen dönülür.
+    """
+    global _warm_up_thread
+    # Uygulama indeksi anlık görüntülerden okur; ilk yükleme warm-up thread'inde yapılır.
+    if index_snapshots:
+        start_snapshot_watcher()
+    with _warm_up_lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(target=_warm_up, name="warm-up", daemon=True)
+            _warm_up_thread.start()
+    if not background:
+        _warm_up_thread.join()
+    return _warm_up_thread
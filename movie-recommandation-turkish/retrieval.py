@@ -0,0 +1,381 @@
+"""
+Film arama stratejisi: isim kısa devresi + sözcüksel/vektör hibrit arama.
+
+`movie_retrieve` node'u dokümanları doğrudan `movie_retriever` yerine bu
+modüldeki `search` / `asearch` fonksiyonlarıyla getirir:
+
+1. Sorguda bir film adı geçiyorsa ("Avatar yorumları nasıl?") arama doğrudan o
+   filmin chunk'larıyla sınırlandırılır (`movie_id` filtresi). Yönetmen adı
+   geçiyorsa da o yönetmenin filmleriyle sınırlandırılır.
+2. Aksi halde vektör araması iki aşamalıdır: önce film seviyesi koleksiyondan
+   (film başına tek vektör) aday filmler seçilir, sonra bu filmlerle sınırlı
+   (`movie_id $in`) tek bir chunk araması her filmden birkaç temsilci chunk getirir.
+   Çok yorumlu bir film bu aramayı doldurursa boş kalan filmler ayrıca aranır.
+   Böylece binlerce yorumu olan popüler filmler aday listesini doldurmaz ve arama
+   maliyeti yorum sayısıyla değil film sayısıyla büyür.
+   Vektör adayları ile BM25 sözcüksel arama adayları Reciprocal Rank Fusion (RRF)
+   ile birleştirilir; her filmden en fazla `MAX_CHUNKS_PER_MOVIE` chunk alınır.
+3. Sorgudan çıkarılan metadata filtreleri (graph/chains/query_filters.py) her iki
+   aramaya da uygulanır; filtreli arama boş dönerse filtresiz aramaya düşülür.
+4. Rerank açıksa (`RERANK=1`) yukarıdaki adımlar `k` yerine daha geniş bir aday
+   kümesi getirir; adaylar cross-encoder ile skorlanır ve skoru eşiğin üzerindeki
+   (değişken sayıda, en fazla `k`) doküman döner (bkz. rerank.py).
+
+Sözcüksel indeks (lexical_index.py) ingestion sonunda diske yazılır; burada
+uygulama açılırken yüklenir ve dosya değiştiğinde yeniden okunur.
+"""
+
+import os
+import asyncio
+import hashlib
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from langchain_core.documents import Document
+
+# Vektör veritabanı/retriever (ilk kullanımda açılan paylaşılan örnekler) ve
+# sözcüksel indeksin dosya yolu.
+import resources
+from resources import get_movie_retriever, get_movie_level_store, get_embedding, lexical_index_path, active_snapshot
+from lexical_index import LexicalIndex
+
+# Arama adımlarının süreleri istek izine yazılır.
+from instrumentation import traced, span, annotate
+
+# Takip sorularını (önceki filmlere atıf) tanımak için.
+from conversation_memory import is_follow_up
+
+
+# LLM'e gidecek doküman sayısı.
+TOP_K = 6
+
+# Füzyon için her aramadan alınan aday sayısı.
+CANDIDATES = 20
+
+# İki aşamalı aramada seçilen aday film sayısı ve film başına getirilen (ortalama) chunk sayısı.
+CANDIDATE_MOVIES = 8
+CHUNKS_PER_MOVIE = 2
+
+# Aday filmlerle sınırlı chunk aramasında film başına kaç kat fazla sonuç istendiği; çok yorumlu
+# bir film ilk sıraları doldursa da diğer filmlerin chunk'ları genelde aynı aramada gelir.
+CHUNK_OVERFETCH = 4
+
+# LLM'e gidecek bağlamda aynı filmden en fazla kaç chunk olabileceği.
+MAX_CHUNKS_PER_MOVIE = 2
+
+# RRF sabiti: büyüdükçe alt sıralardaki adayların ağırlığı artar (literatürde 60).
+RRF_K = 60
+
+
+class _LexicalIndexHolder:
+    # İndeksi ilk kullanımda yükler; ingestion dosyayı yenilediyse tekrar okur. Etkin bir
+    # indeks anlık görüntüsü varsa onun (geçişten önce yüklenmiş) indeksi kullanılır.
+
+    def __init__(self, path: str):
+        self.path = path
+        self._index = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[LexicalIndex]:
+        snapshot = active_snapshot()
+        if snapshot is not None:
+            return snapshot.lexical_index
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return None
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._index = LexicalIndex.load(self.path)
+                    self._mtime = mtime
+        return self._index
+
+
+lexical_index = _LexicalIndexHolder(lexical_index_path)
+
+# Ortak chunk aramasında eksik kalan filmlerin (senkron yolda) eşzamanlı arandığı thread havuzu.
+_chunk_search_pool = ThreadPoolExecutor(max_workers=CANDIDATE_MOVIES, thread_name_prefix="movie-chunks")
+
+
+def and_filters(*wheres: Optional[dict]) -> Optional[dict]:
+    """Birden fazla Chroma `where` koşulunu `$and` ile birleştirir (None olanları atlar)."""
+    conditions = [w for w in wheres if w]
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def _doc_key(doc: Document) -> str:
+    # Aynı chunk'ın farklı aramalardan gelen kopyalarını tanımak için anahtar. Chroma'nın
+    # vektör araması Document'lara id koymazken BM25 sonuçları (`_fetch_by_ids`) gerçek
+    # chunk id'sini taşır; iki tarafın aynı anahtarı üretmesi için id'ye hiç bakılmaz,
+    # her zaman film + içerik hash'i kullanılır.
+    return hashlib.sha1(f"{doc.metadata.get('movie_id')}\x1f{doc.page_content}".encode("utf-8")).hexdigest()
+
+
+def rrf_fuse(ranked_lists: list[list[Document]], k: int, per_movie: Optional[int] = None) -> list[Document]:
+    """Sıralı doküman listelerini Reciprocal Rank Fusion ile birleştirir.
+
+    `per_movie` verilirse aynı filmden en fazla o kadar chunk döndürülür.
+    """
+    scores, docs = {}, {}
+    for ranked in ranked_lists:
+        for rank, doc in enumerate(ranked):
+            key = _doc_key(doc)
+            # Aynı chunk'ın kopyalarından id taşıyanı (BM25 tarafı) tercih edilir.
+            if key not in docs or (getattr(doc, "id", None) and not getattr(docs[key], "id", None)):
+                docs[key] = doc
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+    result, per_movie_count = [], {}
+    for key in sorted(scores, key=scores.get, reverse=True):
+        movie_id = docs[key].metadata.get("movie_id")
+        if per_movie is not None and per_movie_count.get(movie_id, 0) >= per_movie:
+            continue
+        per_movie_count[movie_id] = per_movie_count.get(movie_id, 0) + 1
+        result.append(docs[key])
+        if len(result) == k:
+            break
+    return result
+
+
+def _fetch_by_ids(ids: list[str], where: Optional[dict]) -> list[Document]:
+    # BM25 sonuçlarını (chunk id'leri) filtreyi de uygulayarak Document'lara çevirir;
+    # BM25 sırası korunur.
+    if not ids:
+        return []
+    result = get_movie_retriever().vectorstore.get(ids=ids, where=where, include=["documents", "metadatas"])
+    by_id = {
+        chunk_id: Document(id=chunk_id, page_content=text or "", metadata=meta or {})
+        for chunk_id, text, meta in zip(result["ids"], result["documents"], result["metadatas"])
+    }
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def _type_filter(filters, where: Optional[dict]) -> Optional[dict]:
+    # Filtreli denemede chunk aramasına sadece doküman tipi taşınır; tür/puan koşulları
+    # film seviyesinde zaten uygulandı.
+    return {"type": filters.doc_type} if where and filters.doc_type else None
+
+
+def _group_by_movie(movie_ids: list[str], docs: list[Document]) -> dict[str, list[Document]]:
+    # Chunk'ları aday filmlere dağıtır; her filmden en fazla CHUNKS_PER_MOVIE (skor sırasıyla).
+    groups = {movie_id: [] for movie_id in movie_ids}
+    for doc in docs:
+        group = groups.get(doc.metadata.get("movie_id"))
+        if group is not None and len(group) < CHUNKS_PER_MOVIE:
+            group.append(doc)
+    return groups
+
+
+def _short_movies(groups: dict[str, list[Document]], docs: list[Document], k: int) -> list[str]:
+    # Ortak arama `k` sonucun hepsini döndürdüyse (doydu) eksik kalan filmlerin daha fazla
+    # chunk'ı olabilir; doymadıysa o filmlerde gerçekten başka chunk yoktur.
+    if len(docs) < k:
+        return []
+    return [movie_id for movie_id, group in groups.items() if len(group) < CHUNKS_PER_MOVIE]
+
+
+def _movie_chunks_search(store, vector, movie_id: str, type_filter: Optional[dict]) -> list[Document]:
+    return store.similarity_search_by_vector(
+        vector, k=CHUNKS_PER_MOVIE, filter=and_filters({"movie_id": movie_id}, type_filter)
+    )
+
+
+@traced("vector_search")
+def _vector_candidates(query: str, filters, where: Optional[dict]) -> list[Document]:
+    # İki aşamalı vektör araması: aday filmler → bu filmlerle sınırlı, fazladan sonuç isteyen tek
+    # chunk araması. Her aday film en fazla CHUNKS_PER_MOVIE chunk alır; çok yorumlu bir film
+    # sonuçları doldurup başka bir filmi boş bırakırsa sadece o filmler ayrıca (eşzamanlı) aranır.
+    # Sıralama film sırasını izler (en alakalı filmin chunk'ları önce).
+    vector = get_embedding().embed_query(query)
+    movie_where = filters.to_where(include_type=False) if where else None
+    movies = get_movie_level_store().similarity_search_by_vector(vector, k=CANDIDATE_MOVIES, filter=movie_where)
+    store = get_movie_retriever().vectorstore
+    if not movies:
+        # Film seviyesi koleksiyon henüz kurulmadıysa düz chunk aramasına düşeriz.
+        return store.similarity_search_by_vector(vector, k=CANDIDATES, filter=where)
+    movie_ids = list(dict.fromkeys(m.metadata.get("movie_id") for m in movies))
+    type_filter = _type_filter(filters, where)
+    k = CHUNKS_PER_MOVIE * len(movie_ids) * CHUNK_OVERFETCH
+    docs = store.similarity_search_by_vector(
+        vector, k=k, filter=and_filters({"movie_id": {"$in": movie_ids}}, type_filter)
+    )
+    groups = _group_by_movie(movie_ids, docs)
+    short = _short_movies(groups, docs, k)
+    if short:
+        annotate(per_movie_searches=len(short))
+        ctx = contextvars.copy_context()
+        results = _chunk_search_pool.map(
+            lambda movie_id: ctx.copy().run(_movie_chunks_search, store, vector, movie_id, type_filter), short
+        )
+        groups.update(zip(short, results))
+    return [doc for movie_id in movie_ids for doc in groups[movie_id]]
+
+
+@traced("vector_search")
+async def _avector_candidates(query: str, filters, where: Optional[dict]) -> list[Document]:
+    # `_vector_candidates`in asenkron sürümü; Chroma çağrıları thread'de çalışır.
+    vector = await get_embedding().aembed_query(query)
+    movie_where = filters.to_where(include_type=False) if where else None
+    movies = await asyncio.to_thread(
+        get_movie_level_store().similarity_search_by_vector, vector, k=CANDIDATE_MOVIES, filter=movie_where
+    )
+    store = get_movie_retriever().vectorstore
+    if not movies:
+        return await asyncio.to_thread(store.similarity_search_by_vector, vector, k=CANDIDATES, filter=where)
+    movie_ids = list(dict.fromkeys(m.metadata.get("movie_id") for m in movies))
+    type_filter = _type_filter(filters, where)
+    k = CHUNKS_PER_MOVIE * len(movie_ids) * CHUNK_OVERFETCH
+    docs = await asyncio.to_thread(
+        store.similarity_search_by_vector,
+        vector,
+        k=k,
+        filter=and_filters({"movie_id": {"$in": movie_ids}}, type_filter),
+    )
+    groups = _group_by_movie(movie_ids, docs)
+    short = _short_movies(groups, docs, k)
+    if short:
+        annotate(per_movie_searches=len(short))
+        results = await asyncio.gather(*(
+            asyncio.to_thread(_movie_chunks_search, store, vector, movie_id, type_filter) for movie_id in short
+        ))
+        groups.update(zip(short, results))
+    return [doc for movie_id in movie_ids for doc in groups[movie_id]]
+
+
+@traced("lexical_search")
+def _lexical_candidates(index: Optional[LexicalIndex], query: str, where: Optional[dict]) -> list[Document]:
+    # BM25 adayları (filtre uygulanmış Document'lar olarak).
+    ids = [chunk_id for chunk_id, _ in index.search(query, CANDIDATES)] if index else []
+    return _fetch_by_ids(ids, where)
+
+
+def _entity_filter(index: Optional[LexicalIndex], query: str, filters) -> Optional[dict]:
+    # Sorguda film veya yönetmen adı geçiyorsa aramayı o filmlere daraltan filtre.
+    if index is None:
+        return None
+    movies = index.match_titles(query)
+    if movies:
+        # Film adı verildiyse tür/puan filtreleri anlamsızdır; sadece doküman tipi korunur.
+        type_filter = {"type": filters.doc_type} if filters.doc_type else None
+        return and_filters({"movie_id": {"$in": movies}}, type_filter)
+    movies = index.match_directors(query)
+    if movies:
+        return and_filters({"movie_id": {"$in": movies}}, filters.to_where())
+    return None
+
+
+def follow_up_docs(query: str, filters, movie_ids: list[str], previous_docs: Optional[list] = None,
+                   k: int = TOP_K) -> Optional[list[Document]]:
+    """Takip sorusu için önceki filmlerin dokümanları; takip sorusu değilse None.
+
+    Mesaj kısa bir atıf ("peki yönetmeni kim?") içeriyor, yeni bir film adı veya
+    filtre içermiyorsa önceki turun dokümanları olduğu gibi kullanılır; yoksa
+    hatırlanan filmlerin chunk'ları vektör araması yapılmadan id ile okunur.
+    """
+    if not movie_ids or not is_follow_up(query):
+        return None
+    if filters.genres or filters.directors or filters.min_rating is not None:
+        return None
+    index = lexical_index.get()
+    if index is not None and index.match_titles(query):
+        return None
+
+    with span("follow_up_reuse"):
+        wanted = set(movie_ids)
+        # Olgu kısa yolunun (FactLookup) cevap dokümanları sadece filmi işaret eder; chunk değildir.
+        docs = [
+            d for d in previous_docs or []
+            if d.metadata.get("movie_id") in wanted and d.metadata.get("type") != "fact"
+        ]
+        if filters.doc_type:
+            docs = [d for d in docs if d.metadata.get("type") == filters.doc_type] or docs
+        if not docs:
+            type_filter = {"type": filters.doc_type} if filters.doc_type else None
+            result = get_movie_retriever().vectorstore.get(
+                where=and_filters({"movie_id": {"$in": list(movie_ids)}}, type_filter),
+                limit=k,
+                include=["documents", "metadatas"],
+            )
+            docs = [
+                Document(id=chunk_id, page_content=text or "", metadata=meta or {})
+                for chunk_id, text, meta in zip(result["ids"], result["documents"], result["metadatas"])
+            ]
+        annotate(docs=len(docs), reused=bool(previous_docs))
+    return docs or None
+
+
+def search(query: str, filters, k: int = TOP_K) -> list[Document]:
+    """Sorgu için en alakalı `k` chunk'ı getirir (rerank açıksa en fazla `k`).
+
+    Args:
+        query: Kullanıcı mesajı.
+        filters: `extract_filters` ile çıkarılmış `QueryFilters`.
+        k: Döndürülecek doküman sayısı.
+    """
+    if not resources.rerank_enabled:
+        return _search(query, filters, k)
+    from rerank import reranker
+
+    candidates = _search(query, filters, max(k, resources.rerank_candidates))
+    return reranker.rerank(query, candidates, k)
+
+
+async def asearch(query: str, filters, k: int = TOP_K) -> list[Document]:
+    """`search`ün asenkron sürümü; vektör ve sözcüksel arama eşzamanlı çalışır."""
+    if not resources.rerank_enabled:
+        return await _asearch(query, filters, k)
+    from rerank import reranker
+
+    candidates = await _asearch(query, filters, max(k, resources.rerank_candidates))
+    # Skorlama CPU işidir; event loop bloklanmasın diye thread'de yapılır.
+    return await asyncio.to_thread(reranker.rerank, query, candidates, k)
+
+
+def _search(query: str, filters, k: int) -> list[Document]:
+    index = lexical_index.get()
+
+    # 1) Film/yönetmen adı kısa devresi.
+    entity_where = _entity_filter(index, query, filters)
+    if entity_where:
+        with span("entity_search"):
+            docs = get_movie_retriever().invoke(query, k=k, filter=entity_where)
+            annotate(docs=len(docs))
+        if docs:
+            return docs
+
+    # 2) Hibrit arama; filtreli sonuç yoksa filtresiz tekrar deneriz.
+    where = filters.to_where()
+    for attempt in ([where, None] if where else [None]):
+        vector_docs = _vector_candidates(query, filters, attempt)
+        docs = rrf_fuse([vector_docs, _lexical_candidates(index, query, attempt)], k, MAX_CHUNKS_PER_MOVIE)
+        if docs:
+            return docs
+    return []
+
+
+async def _asearch(query: str, filters, k: int) -> list[Document]:
+    index = await asyncio.to_thread(lexical_index.get)
+
+    entity_where = _entity_filter(index, query, filters)
+    if entity_where:
+        with span("entity_search"):
+            docs = await get_movie_retriever().ainvoke(query, k=k, filter=entity_where)
+            annotate(docs=len(docs))
+        if docs:
+            return docs
+
+    where = filters.to_where()
+    for attempt in ([where, None] if where else [None]):
+        vector_docs, lexical = await asyncio.gather(
+            _avector_candidates(query, filters, attempt),
+            asyncio.to_thread(_lexical_candidates, index, query, attempt),
+        )
+        docs = rrf_fuse([vector_docs, lexical], k, MAX_CHUNKS_PER_MOVIE)
+        if docs:
+            return docs
+    return []
@@ -0,0 +1,293 @@
+"""
+RAG grafını Streamlit olmadan sunan HTTP/WebSocket servisi.
+
+Streamlit arayüzü her etkileşimde betiği yeniden çalıştırır ve her soru BERT'ten
+tek başına geçer. Bu servis derlenmiş grafı (`graph.graph.app`) tek bir asenkron
+süreçte sunar; eşzamanlı isteklerin sorgu embedding'leri mikro batch'lerde
+birleştirilir (bkz. micro_batch.py, `--embed-batch-size`/`--embed-batch-wait-ms`).
+
+Uç noktalar:
+- `POST /v1/ask` `{"message", "session_id"?}` → `{"answer", "intent", "movies", "trace_id", "seconds"}`
+- `POST /v1/retrieve` `{"query", "k"?}` → `{"docs": [...], "trace_id", "seconds"}` (sadece arama)
+- `WS /v1/ws`: her mesaj `{"message", "session_id"?}`; cevap token'ları
+  `{"type": "token", "content"}` olarak akar, sonunda `{"type": "done", ...}` gelir.
+- `GET /healthz` (etkin indeks sürümüyle), `GET /metrics` (Prometheus).
+
+Ingestion yeni bir indeks anlık görüntüsü yayınladığında servis onu arka planda
+yükleyip ısıtır ve yeniden başlatmadan geçer (bkz. snapshots.py, `--snapshot-poll`).
+
+`session_id` verilen istekler konuşma hafızasını (conversation_memory.py)
+paylaşır; oturumlar LRU ile sınırlı tutulur. Verilmezse her istek bağımsızdır.
+
+Kullanım:
+    python serve.py --port 8080 --embed-batch-size 16 --embed-batch-wait-ms 5
+    curl -s localhost:8080/v1/ask -d '{"message": "Bilim kurgu önerir misin?"}'
+"""
+
+import json
+import time
+import asyncio
+import logging
+import argparse
+from collections import OrderedDict
+from typing import Optional
+
+import tornado.web
+import tornado.websocket
+
+import resources
+
+# Her istek kendi trace'iyle çalışır; süreler ve durumlar metriklere yazılır.
+from instrumentation import start_trace, metrics
+
+# Oturum başına konuşma hafızası (Streamlit'teki `st.session_state.memory` karşılığı).
+from conversation_memory import ConversationMemory
+
+
+logger = logging.getLogger(__name__)
+
+# Bellekte tutulan en fazla oturum (konuşma hafızası) sayısı.
+MAX_SESSIONS = 10_000
+
+
+class SessionStore:
+    """session_id → ConversationMemory; sınır aşılınca en uzun süredir kullanılmayan oturum atılır."""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._sessions: OrderedDict[str, ConversationMemory] = OrderedDict()
+
+    def get(self, session_id: Optional[str]) -> ConversationMemory:
+        # Tüm handler'lar aynı event loop'ta çalıştığı için kilide gerek yok.
+        if not session_id:
+            return ConversationMemory()
+        memory = self._sessions.get(session_id)
+        if memory is None:
+            memory = self._sessions[session_id] = ConversationMemory()
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(session_id)
+        return memory
+
+
+def _movies(docs) -> list[str]:
+    # Getirilen dokümanlardaki film adları (ilk geçiş sırasıyla).
+    movies = []
+    for doc in docs or []:
+        name = doc.metadata.get("name")
+        if name and name not in movies:
+            movies.append(name)
+    return movies
+
+
+class _Handler(tornado.web.RequestHandler):
+    # Ortak ayarlar `make_app` tarafından `initialize` ile verilir.
+
+    def initialize(self, graph, sessions: SessionStore, timeout: Optional[float]):
+        self.graph = graph
+        self.sessions = sessions
+        self.timeout = timeout
+        self.started = time.perf_counter()
+
+    def body(self) -> dict:
+        try:
+            body = json.loads(self.request.body or b"{}")
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="Geçersiz JSON")
+        if not isinstance(body, dict):
+            raise tornado.web.HTTPError(400, reason="Gövde bir JSON nesnesi olmalı")
+        return body
+
+    def write_error(self, status_code: int, **kwargs) -> None:
+        self.finish({"error": self._reason, "status": status_code})
+
+    def on_finish(self) -> None:
+        endpoint = self.request.path
+        metrics.inc("server_requests_total", help="Sunucuya gelen HTTP istekleri.",
+                    endpoint=endpoint, status=str(self.get_status()))
+        metrics.observe("server_request_seconds", time.perf_counter() - self.started,
+                        help="HTTP isteklerinin süresi.", endpoint=endpoint)
+
+
+class AskHandler(_Handler):
+    async def post(self):
+        from graph.state import GraphState
+
+        body = self.body()
+        message = (body.get("message") or "").strip()
+        if not message:
+            raise tornado.web.HTTPError(400, reason="`message` boş olamaz")
+        memory = self.sessions.get(body.get("session_id"))
+        state = GraphState(message=message, **memory.state_fields())
+        with start_trace(message_chars=len(message), endpoint="ask") as trace, resources.snapshot_lease():
+            try:
+                result = await asyncio.wait_for(self.graph.ainvoke(state), self.timeout)
+            except asyncio.TimeoutError:
+                raise tornado.web.HTTPError(504, reason="Süre sınırı aşıldı")
+        memory.add_turn(message, result.get("answer") or "", result.get("retrieved_docs"))
+        self.write({
+            "answer": result.get("answer"),
+            "intent": result.get("intent"),
+            "movies": _movies(result.get("retrieved_docs")),
+            "trace_id": trace.trace_id,
+            "seconds": round(time.perf_counter() - self.started, 4),
+        })
+
+
+class RetrieveHandler(_Handler):
+    async def post(self):
+        from retrieval import asearch, TOP_K
+        from graph.chains.query_filters import extract_filters
+
+        body = self.body()
+        query = (body.get("query") or "").strip()
+        if not query:
+            raise tornado.web.HTTPError(400, reason="`query` boş olamaz")
+        with start_trace(message_chars=len(query), endpoint="retrieve") as trace, resources.snapshot_lease():
+            try:
+                docs = await asyncio.wait_for(asearch(query, extract_filters(query), int(body.get("k") or TOP_K)),
+                                              self.timeout)
+            except asyncio.TimeoutError:
+                raise tornado.web.HTTPError(504, reason="Süre sınırı aşıldı")
+        self.write({
+            "docs": [
+                {"id": doc.id, "name": doc.metadata.get("name"), "type": doc.metadata.get("type"),
+                 "text": doc.page_content}
+                for doc in docs
+            ],
+            "trace_id": trace.trace_id,
+            "seconds": round(time.perf_counter() - self.started, 4),
+        })
+
+
+class HealthHandler(tornado.web.RequestHandler):
+    def get(self):
+        # Etkin indeks anlık görüntüsü (bkz. snapshots.py); yoksa çalışma dizini kullanılıyordur.
+        snapshot = resources.active_snapshot()
+        self.write({"status": "ok", "index_version": snapshot.version if snapshot is not None else None})
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.write(metrics.render_prometheus())
+
+
+class StreamHandler(tornado.websocket.WebSocketHandler):
+    # Bağlantı başına mesajlar sırayla işlenir (tornado bir mesaj bitmeden sonrakini vermez).
+
+    def initialize(self, graph, sessions: SessionStore, timeout: Optional[float]):
+        self.graph = graph
+        self.sessions = sessions
+
+    def check_origin(self, origin: str) -> bool:
+        # Servis başsız (headless) çalışır; istemciler farklı origin'lerden bağlanabilir.
+        return True
+
+    async def on_message(self, raw):
+        from graph.graph import astream_answer
+        from graph.state import GraphState
+
+        try:
+            body = json.loads(raw)
+            message = (body.get("message") or "").strip()
+        except (ValueError, AttributeError):
+            message, body = "", {}
+        if not message:
+            await self.write_message({"type": "error", "error": "`message` boş olamaz"})
+            return
+
+        started = time.perf_counter()
+        memory = self.sessions.get(body.get("session_id"))
+        state = GraphState(message=message, **memory.state_fields())
+        result: dict = {}
+        try:
+            async for token in astream_answer(state, result, self.graph):
+                await self.write_message({"type": "token", "content": token})
+        except tornado.websocket.WebSocketClosedError:
+            return
+        except Exception as e:
+            logger.exception("WebSocket isteği başarısız oldu.")
+            await self.write_message({"type": "error", "error": f"{type(e).__name__}: {e}"})
+            return
+        finally:
+            metrics.observe("server_request_seconds", time.perf_counter() - started,
+                            help="HTTP isteklerinin süresi.", endpoint="/v1/ws")
+        memory.add_turn(message, result.get("answer") or "", result.get("retrieved_docs"))
+        await self.write_message({
+            "type": "done",
+            "answer": result.get("answer"),
+            "intent": result.get("intent"),
+            "movies": _movies(result.get("retrieved_docs")),
+            "trace_id": result.get("trace_id"),
+        })
+
+
+def make_app(graph=None, sessions: Optional[SessionStore] = None, timeout: Optional[float] = None):
+    """Servisin tornado uygulaması.
+
+    Args:
+        graph: Derlenmiş graf; verilmezse `graph.graph.app`.
+        sessions: Oturum deposu; verilmezse yeni bir tane oluşturulur.
+        timeout: İstek başına süre sınırı (saniye).
+    """
+    if graph is None:
+        from graph.graph import app as graph
+    options = {"graph": graph, "sessions": sessions or SessionStore(), "timeout": timeout}
+    return tornado.web.Application([
+        (r"/v1/ask", AskHandler, options),
+        (r"/v1/retrieve", RetrieveHandler, options),
+        (r"/v1/ws", StreamHandler, options),
+        (r"/healthz", HealthHandler),
+        (r"/metrics", MetricsHandler),
+    ])
+
+
+async def serve(host: str, port: int, graph=None, max_sessions: int = MAX_SESSIONS,
+                timeout: Optional[float] = None) -> None:
+    app = make_app(graph, SessionStore(max_sessions), timeout)
+    app.listen(port, address=host)
+    logger.info("Servis http://%s:%d adresinde (WebSocket: /v1/ws).", host, port)
+    await asyncio.Event().wait()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="RAG grafını HTTP/WebSocket üzerinden sunar.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--embed-batch-size", type=int, default=max(resources.embedding_batch_size, 16),
+                        help="Sorgu embedding mikro batch'inin en fazla boyutu (1: kapalı).")
+    parser.add_argument("--embed-batch-wait-ms", type=float, default=resources.embedding_batch_wait_ms,
+                        help="Batch'in dolmasını bekleme süresi (ms).")
+    parser.add_argument("--timeout", type=float, default=None, help="İstek başına süre sınırı (saniye).")
+    parser.add_argument("--max-sessions", type=int, default=MAX_SESSIONS, help="Bellekte tutulan en fazla oturum.")
+    parser.add_argument("--speculative", action="store_true", help="Spekülatif retrieval grafını kullan.")
+    parser.add_argument("--snapshot-poll", type=float, default=resources.snapshot_poll_seconds,
+                        help="Yeni indeks anlık görüntüsü kontrol aralığı (saniye).")
+    parser.add_argument("--rerank", action="store_true", default=resources.rerank_enabled,
+                        help="Arama sonuçlarını cross-encoder ile yeniden sırala (bkz. rerank.py).")
+    parser.add_argument("--rerank-budget-ms", type=float, default=resources.rerank_budget_ms,
+                        help="Rerank gecikme bütçesi (milisaniye).")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    # Batch ayarları embedding nesnesi ilk kez oluşturulmadan önce yapılmalıdır.
+    resources.embedding_batch_size = args.embed_batch_size
+    resources.embedding_batch_wait_ms = args.embed_batch_wait_ms
+    resources.snapshot_poll_seconds = args.snapshot_poll
+    # Rerank modülü ilk aramada (ya da ısıtmada) içe aktarılır ve ayarları o an okur.
+    resources.rerank_enabled = args.rerank
+    resources.rerank_budget_ms = args.rerank_budget_ms
+    resources.warm_up(background=True)
+
+    from graph.graph import sequential_app, speculative_app
+    graph = speculative_app if args.speculative else sequential_app
+    try:
+        asyncio.run(serve(args.host, args.port, graph, args.max_sessions, args.timeout))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
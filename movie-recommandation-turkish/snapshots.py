@@ -0,0 +1,447 @@
+"""
+Sürümlü, değişmez indeks anlık görüntüleri (snapshot) ve çalışan uygulamada sıcak geçiş.
+
+Ingestion vektör deposunu (`./.chroma/movie` veya `./.chroma/movie-mmap`) ve yan
+dosyaları (tür/yönetmen sözlüğü, film tablosu, sözcüksel indeks) yerinde
+günceller. Uygulama aynı dizini açtığı için korpusu yenilemek uygulamayı
+durdurup yeniden başlatmak, her seferinde de uzun bir soğuk açılış demekti.
+
+Artık ingestion bittiğinde çalışma dizininin bir kopyası değişmez bir anlık
+görüntü olarak yayınlanır:
+
+    ./.chroma/snapshots/
+        CURRENT                       → etkin sürümün adı (atomik olarak değiştirilir)
+        20261018-142501-123456-3fa9c1/
+            store/                    → vektör deposu (Chroma dizini veya mmap koleksiyonları)
+            movie_facets.json
+            movie_facts.json
+            movie_lexical.pkl
+            manifest.json             → sürüm, arka uç, model, istatistikler; en son yazılır
+
+Anlık görüntü önce `.tmp-<sürüm>` adıyla kurulur ve tamamlanınca yeniden
+adlandırılır; `CURRENT` ancak ondan sonra değişir. mmap deposunun dosyaları
+nesil numaralı ve değişmez olduğu için kopyalanmaz, hard link ile bağlanır;
+Chroma dizini ise (SQLite yerinde güncellendiği için) kopyalanır.
+
+Uygulama tarafında `SnapshotManager` `CURRENT` dosyasını arka planda izler.
+Yeni bir sürüm görünce depoları ve sözcüksel indeksi açar, bir sorgu ile
+ısıtır, sonra etkin anlık görüntüyü tek bir referans atamasıyla değiştirir.
+Her istek başında etkin sürümü kiralar (`acquire`, bkz.
+`resources.snapshot_lease`) ve bitince bırakır (`release`); istek boyunca hep
+aynı sürümü görür. Etkinlikten çıkan sürüm, onu kiralamış son istek bitince
+kapatılır (Chroma System'i durdurulup chromadb'nin süreç genelindeki
+önbelleğinden çıkarılır); aksi halde her geçiş eski depoyu süreç ömrü boyunca
+bellekte tutardı. Chunk id'leri içerikten türetildiği için (bkz.
+ingestion.movie_chunks) farklı sürümlerden gelen sonuçlarda aynı chunk aynı
+id'yi taşır.
+
+Eski anlık görüntüler her yayından sonra yayınlayan süreçte silinir: etkin
+sürüm, bir önceki etkin sürüm (uygulama henüz geçiş yapmamış olabilir) ve en
+yeni `keep` sürüm tutulur. Bir sürümü açan her süreç `.leases/` altına bir
+kira dosyası yazar ve izleyici thread'i bu dosyayı düzenli olarak tazeler;
+kirası canlı (son `LEASE_TTL_SECONDS` içinde tazelenmiş) sürümler başka bir
+süreçten de silinmez. Çöken bir sürecin kirası süresi dolunca geçersiz olur.
+Yarım kalmış yayınların `.tmp-*` dizinleri de sadece yayınlayan süreçte ve
+`STALE_TMP_SECONDS`ten eskiyse silinir (aynı anda yayınlayan başka bir
+ingestion'ın dizinine dokunulmasın diye).
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+import resources
+
+# Anlık görüntüdeki sözcüksel indeks ısıtma sırasında belleğe yüklenir.
+from lexical_index import LexicalIndex
+
+# Geçişler ve yükleme süreleri metriklere yazılır.
+from instrumentation import metrics
+
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+STORE_DIR = "store"
+TMP_PREFIX = ".tmp-"
+LEASES_DIR = ".leases"
+
+# Bu süre içinde tazelenmemiş kira dosyaları (çökmüş süreç) geçersiz sayılır. İzleyici
+# thread kiraları bu sürenin en fazla dörtte birinde bir tazeler.
+LEASE_TTL_SECONDS = 120.0
+
+# Bu süreden eski `.tmp-*` dizinleri yarıda kalmış (çökmüş) bir yayından kalmıştır.
+STALE_TMP_SECONDS = 6 * 3600
+
+# Anlık görüntüye kopyalanan ingestion çıktıları (çalışma yolları).
+INDEX_FILES = (resources.facets_path, resources.movie_facts_path, resources.lexical_index_path)
+
+# Isıtma sorgusu: depoların ilk aramasının (HNSW/mmap sayfaları) maliyeti isteğe yansımasın.
+WARM_UP_QUERY = "film"
+
+def _new_version() -> str:
+    # Zamana göre sıralanabilen, çakışmayan sürüm adı; aynı saniyedeki yayınlar da mikrosaniye
+    # sayesinde sıralı kalır (gc en yenileri ada göre seçer).
+    return f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{uuid.uuid4().hex[:6]}"
+
+
+def _write_atomic(path: str, text: str) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    # Değişmez dosyalar hard link ile bağlanır; farklı dosya sistemindeyse kopyalanır.
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _write_lease(root: str, version: str) -> str:
+    # Kira dosyası: `<sürüm>@<pid>-<rastgele>`; aynı süreç bir sürümü birden fazla açabilir.
+    directory = os.path.join(root, LEASES_DIR)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{version}@{os.getpid()}-{uuid.uuid4().hex[:6]}")
+    with open(path, "w", encoding="utf-8"):
+        pass
+    return path
+
+
+def leased_versions(root: str = None) -> set[str]:
+    """Herhangi bir süreçte açık olan (kirası canlı) sürümler; süresi dolmuş kiraları da siler."""
+    directory = os.path.join(root or resources.snapshots_path, LEASES_DIR)
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return set()
+    now = time.time()
+    versions = set()
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            if now - os.path.getmtime(path) <= LEASE_TTL_SECONDS:
+                versions.add(name.split("@", 1)[0])
+            else:
+                os.remove(path)
+        except OSError:
+            continue
+    return versions
+
+
+def current_version(root: str = None) -> Optional[str]:
+    """Etkin anlık görüntünün adı; hiç yayınlanmamışsa None."""
+    try:
+        with open(os.path.join(root or resources.snapshots_path, CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def read_manifest(version: str = None, root: str = None) -> Optional[dict]:
+    """Anlık görüntünün (verilmezse etkin olanın) manifest'i; yoksa None."""
+    root = root or resources.snapshots_path
+    version = version or current_version(root)
+    if version is None:
+        return None
+    try:
+        with open(os.path.join(root, version, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except OSError:
+        return None
+
+
+def list_snapshots(root: str = None) -> list[str]:
+    """Tamamlanmış (manifest'i yazılmış) anlık görüntüler, eskiden yeniye."""
+    root = root or resources.snapshots_path
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        name for name in os.listdir(root)
+        if not name.startswith(".") and os.path.isfile(os.path.join(root, name, MANIFEST_FILE))
+    )
+
+
+def publish_snapshot(stats: dict = None, root: str = None, keep: int = None) -> str:
+    """Çalışma dizinindeki indeksi yeni bir anlık görüntü olarak yayınlar ve sürüm adını döndürür.
+
+    Ingestion tüm yazmaları (persist) bitirdikten sonra çağrılmalıdır.
+
+    Args:
+        stats: Manifest'e yazılacak ingestion istatistikleri.
+        root: Anlık görüntü dizini; verilmezse `resources.snapshots_path`.
+        keep: Etkin sürüm dışında tutulacak en fazla anlık görüntü; verilmezse `resources.snapshot_keep`.
+    """
+    root = root or resources.snapshots_path
+    previous = current_version(root)
+    version = _new_version()
+    tmp_dir = os.path.join(root, TMP_PREFIX + version)
+    os.makedirs(os.path.join(tmp_dir, STORE_DIR))
+
+    started = time.perf_counter()
+    source = resources.vector_db_path()
+    # Chroma dosyaları yerinde güncellendiği için kopyalanır; mmap nesil dosyaları değişmezdir.
+    place = _link_or_copy if resources.vector_backend == "mmap" else shutil.copy2
+    files = []
+    for directory, _, names in os.walk(source):
+        target = os.path.join(tmp_dir, STORE_DIR, os.path.relpath(directory, source))
+        os.makedirs(target, exist_ok=True)
+        for name in names:
+            if name.endswith(".tmp"):
+                continue
+            place(os.path.join(directory, name), os.path.join(target, name))
+            files.append(os.path.relpath(os.path.join(target, name), tmp_dir))
+    for path in INDEX_FILES:
+        if os.path.exists(path):
+            shutil.copy2(path, os.path.join(tmp_dir, os.path.basename(path)))
+            files.append(os.path.basename(path))
+
+    manifest = {
+        "version": version,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "backend": resources.vector_backend,
+        "dtype": resources.vector_dtype,
+        "embedding_model": resources.embedding_model_name,
+        "collections": [resources.collection_name, resources.movie_collection_name],
+        "files": files,
+        "stats": stats or {},
+    }
+    _write_atomic(os.path.join(tmp_dir, MANIFEST_FILE), json.dumps(manifest, ensure_ascii=False, indent=2))
+    os.rename(tmp_dir, os.path.join(root, version))
+    _write_atomic(os.path.join(root, CURRENT_FILE), version)
+    metrics.observe("index_snapshot_publish_seconds", time.perf_counter() - started,
+                    help="Anlık görüntü yayınlama süresi.")
+
+    gc_snapshots(root, keep, previous=previous)
+    return version
+
+
+def gc_snapshots(root: str = None, keep: int = None, previous: str = None) -> list[str]:
+    """Eski anlık görüntüleri siler; silinenleri döndürür. Yayınlayan süreçte çağrılır.
+
+    Etkin sürüm, `previous` (yayından önce etkin olan sürüm), en yeni `keep` anlık görüntü ve
+    herhangi bir süreçte kirası canlı olan sürümler tutulur. `.tmp-*` dizinlerinden sadece
+    `STALE_TMP_SECONDS`ten eski olanlar (çökmüş yayınlar) silinir.
+    """
+    root = root or resources.snapshots_path
+    keep = resources.snapshot_keep if keep is None else keep
+    current = current_version(root)
+    protected = {previous} | leased_versions(root)
+    others = [name for name in list_snapshots(root) if name != current]
+    removed = [name for name in (others[:-keep] if keep > 0 else others) if name not in protected]
+    now = time.time()
+    for name in os.listdir(root) if os.path.isdir(root) else []:
+        if name.startswith(TMP_PREFIX):
+            try:
+                if now - os.path.getmtime(os.path.join(root, name)) > STALE_TMP_SECONDS:
+                    removed.append(name)
+            except OSError:
+                continue
+    for name in removed:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    return removed
+
+
+class Snapshot:
+    """Açılmış bir anlık görüntü: depolar, retriever ve sözcüksel indeks.
+
+    Açıkken sürümün kira dosyası tutulur; böylece başka süreçlerdeki temizlik onu silmez.
+
+    Args:
+        root: Anlık görüntü dizini.
+        version: Açılacak sürüm.
+    """
+
+    def __init__(self, root: str, version: str):
+        self.version = version
+        self.path = os.path.join(root, version)
+        # Okuyucu (istek) sayısı; SnapshotManager.acquire/release tutar.
+        self.readers = 0
+        self.closed = False
+        self.vectorstore = self.movie_level_store = self.movie_retriever = None
+        # Kira, dosyalar okunmadan önce alınır; aradaki bir temizlik sürümü silmesin.
+        self._lease = _write_lease(root, version)
+        try:
+            with open(os.path.join(self.path, MANIFEST_FILE), encoding="utf-8") as f:
+                self.manifest = json.load(f)
+            store = os.path.join(self.path, STORE_DIR)
+            backend, dtype = self.manifest["backend"], self.manifest.get("dtype")
+            self.vectorstore = resources.open_vector_store(resources.collection_name, backend, dtype, store)
+            self.movie_level_store = resources.open_vector_store(resources.movie_collection_name, backend, dtype, store)
+            self.movie_retriever = resources.as_movie_retriever(self.vectorstore)
+
+            lexical_path = self.file(resources.lexical_index_path)
+            self.lexical_index = LexicalIndex.load(lexical_path) if os.path.exists(lexical_path) else None
+        except Exception:
+            self.close()
+            raise
+
+    def file(self, path: str) -> str:
+        """Bir ingestion çıktısının (ör. `resources.facets_path`) bu anlık görüntüdeki yolu."""
+        return os.path.join(self.path, os.path.basename(path))
+
+    def renew_lease(self) -> None:
+        """Kira dosyasını tazeler (silinmişse yeniden yazar)."""
+        if self.closed:
+            return
+        try:
+            os.utime(self._lease)
+        except OSError:
+            self._lease = _write_lease(os.path.dirname(self.path), self.version)
+
+    def close(self) -> None:
+        """Depoları kapatır ve sürümün kirasını bırakır (tekrar çağrılırsa bir şey yapmaz)."""
+        if self.closed:
+            return
+        self.closed = True
+        # İki koleksiyon aynı Chroma dizinini (aynı System'i) paylaşır; ikincisi zaten kapalıdır.
+        for store in (self.vectorstore, self.movie_level_store):
+            if store is not None:
+                try:
+                    resources.close_vector_store(store)
+                except Exception:
+                    logger.exception("Anlık görüntü deposu kapatılamadı (%s).", self.version)
+        self.vectorstore = self.movie_level_store = self.movie_retriever = None
+        self.lexical_index = None
+        try:
+            os.remove(self._lease)
+        except OSError:
+            pass
+
+    def warm(self) -> None:
+        # Her iki depoda da bir arama yapılır; Chroma HNSW indeksini, mmap deposu sayfaları yükler.
+        vector = resources.get_embedding().embed_query(WARM_UP_QUERY)
+        self.vectorstore.similarity_search_by_vector(vector, k=1)
+        self.movie_level_store.similarity_search_by_vector(vector, k=1)
+
+
+class SnapshotManager:
+    """Etkin anlık görüntüyü tutar; `CURRENT` değişince yenisini arka planda yükleyip geçiş yapar.
+
+    İstekler etkin sürümü `acquire` ile kiralayıp `release` ile bırakır. Geçişte
+    etkinlikten çıkan sürüm, okuyucusu kalmadığında (hemen ya da son `release`te) kapatılır.
+
+    Args:
+        root: Anlık görüntü dizini.
+        poll_seconds: `CURRENT` dosyasının kontrol aralığı.
+    """
+
+    def __init__(self, root: str, poll_seconds: float = 10.0):
+        self.root = root
+        self.poll_seconds = poll_seconds
+        self._active: Optional[Snapshot] = None
+        # Etkinlikten çıkmış, okuyucuları bitmeyi bekleyen sürümler.
+        self._retiring: list[Snapshot] = []
+        self._loaded = False
+        # Yükleme/geçiş tek thread'de yapılır (`_lock`); okuyucu sayaçları ve etkin sürüm
+        # ataması kısa süreli `_readers_lock` altında değişir.
+        self._lock = threading.Lock()
+        self._readers_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def version(self) -> Optional[str]:
+        snapshot = self._active
+        return snapshot.version if snapshot is not None else None
+
+    def get(self) -> Optional[Snapshot]:
+        """Etkin anlık görüntü (kiralamadan); ilk çağrıda (yoksa None döner) mevcut sürüm yüklenir."""
+        if not self._loaded:
+            self.refresh()
+        return self._active
+
+    def acquire(self) -> Optional[Snapshot]:
+        """Etkin anlık görüntüyü bir okuyucu için kiralar; dönen nesne `release` edilene kadar
+        kapatılmaz. Anlık görüntü yoksa None."""
+        if not self._loaded:
+            self.refresh()
+        with self._readers_lock:
+            snapshot = self._active
+            if snapshot is not None:
+                snapshot.readers += 1
+        return snapshot
+
+    def release(self, snapshot: Snapshot) -> None:
+        """`acquire` ile alınan anlık görüntüyü bırakır; etkinlikten çıkmış ve son okuyucusuysa kapatır."""
+        with self._readers_lock:
+            snapshot.readers -= 1
+            if snapshot.readers > 0 or snapshot not in self._retiring:
+                return
+            self._retiring.remove(snapshot)
+        self._close(snapshot)
+
+    def refresh(self) -> bool:
+        """`CURRENT` başka bir sürümü gösteriyorsa onu açar, ısıtır ve etkin yapar."""
+        with self._lock:
+            try:
+                version = current_version(self.root)
+                if version is None or version == self.version:
+                    return False
+                started = time.perf_counter()
+                snapshot = None
+                try:
+                    snapshot = Snapshot(self.root, version)
+                    snapshot.warm()
+                except Exception:
+                    if snapshot is not None:
+                        snapshot.close()
+                    # Bozuk/yarım bir sürüm etkin olanı düşürmez; bir sonraki kontrolde tekrar denenir.
+                    logger.exception("İndeks anlık görüntüsü yüklenemedi (%s).", version)
+                    metrics.inc("index_snapshot_swaps_total", help="İndeks anlık görüntüsü geçişleri.",
+                                result="error")
+                    return False
+                previous = self.version
+                # Geçiş tek bir referans ataması; süren istekler kiraladıkları eski sürümle tamamlanır.
+                with self._readers_lock:
+                    outgoing, self._active = self._active, snapshot
+                    idle = outgoing is not None and outgoing.readers == 0
+                    if outgoing is not None and not idle:
+                        self._retiring.append(outgoing)
+            finally:
+                self._loaded = True
+        if idle:
+            self._close(outgoing)
+        elapsed = time.perf_counter() - started
+        metrics.inc("index_snapshot_swaps_total", help="İndeks anlık görüntüsü geçişleri.", result="ok")
+        metrics.observe("index_snapshot_load_seconds", elapsed, help="Anlık görüntü yükleme + ısıtma süresi.")
+        logger.info("İndeks anlık görüntüsü etkin: %s (önceki: %s, %.1f sn).", version, previous, elapsed)
+        return True
+
+    def _close(self, snapshot: Snapshot) -> None:
+        snapshot.close()
+        metrics.inc("index_snapshot_closed_total", help="Kapatılan eski anlık görüntüler.")
+        logger.info("Eski indeks anlık görüntüsü kapatıldı: %s.", snapshot.version)
+
+    def renew_leases(self) -> None:
+        """Açık sürümlerin (etkin ve okuyucusu süren eski sürümler) kira dosyalarını tazeler."""
+        with self._readers_lock:
+            snapshots = [s for s in (self._active, *self._retiring) if s is not None]
+        for snapshot in snapshots:
+            snapshot.renew_lease()
+
+    def _run(self) -> None:
+        # Kiralar süreleri dolmadan tazelensin diye kontrol aralığı TTL'in dörtte birini geçmez.
+        while not self._stop.wait(min(self.poll_seconds, LEASE_TTL_SECONDS / 4)):
+            self.refresh()
+            self.renew_leases()
+
+    def start(self) -> None:
+        """`CURRENT` dosyasını izleyen daemon thread'i başlatır (tekrar çağrılırsa bir şey yapmaz)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="snapshot-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,8 @@
+# Proje modülleri paket değil, üst dizinde duran tekil dosyalardır (retrieval.py,
+# mmap_store.py, ...). Testlerin onları `import retrieval` ile bulabilmesi için üst
+# dizini import yoluna ekliyoruz.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,51 @@
+# Bağlam paketleyicinin (context_builder.ContextBuilder) token bütçesi için testler.
+
+import pytest
+from langchain_core.documents import Document
+
+import context_builder
+from context_builder import ContextBuilder
+
+
+class _CharEncoder:
+    # Her karakteri bir token sayan sahte tiktoken kodlayıcısı.
+
+    def encode(self, text, disallowed_special=()):
+        return [ord(c) for c in text]
+
+    def decode(self, tokens):
+        return "".join(chr(t) for t in tokens)
+
+
+def _docs():
+    docs = []
+    for m in range(4):
+        meta = {"movie_id": f"m{m}", "name": f"Film {m}", "genre": "Dram", "directors": "Yönetmen",
+                "rating": 7.5}
+        for i in range(3):
+            text = " ".join(f"film{m} yorum{i} kelime{j}" for j in range(40))
+            docs.append(Document(page_content=text, metadata={**meta, "type": "review"}))
+    return docs
+
+
+@pytest.mark.parametrize("budget", [60, 150, 333, 500, 1200, 5000])
+def test_context_never_exceeds_budget(monkeypatch, budget):
+    monkeypatch.setattr(context_builder, "get_token_encoder", _CharEncoder)
+    builder = ContextBuilder(budget=budget, max_chunk_tokens=300)
+
+    context, stats = builder.build(_docs())
+
+    assert len(context) == stats.tokens <= budget
+    if stats.chunks_used:
+        assert context.endswith("---")
+
+
+def test_trim_counts_ellipsis(monkeypatch):
+    monkeypatch.setattr(context_builder, "get_token_encoder", _CharEncoder)
+    builder = ContextBuilder()
+
+    trimmed = builder._trim("a" * 100, 50)
+
+    assert trimmed.endswith("…")
+    assert len(trimmed) == 50
+    assert builder._trim("kısa metin", 50) == "kısa metin"
@@ -0,0 +1,202 @@
+# Bellek eşlemeli vektör deposu (mmap_store.py) için testler: kalıcılık, silme ve yeniden
+# ekleme, `where` filtrelerinin `match_where` ile aynı sonucu vermesi, float16 ↔ int8
+# dönüşümü ve aynı dizini açan ikinci bir örneğin yeni nesilleri görmesi.
+
+import random
+import hashlib
+
+import numpy as np
+import pytest
+
+from mmap_store import MmapVectorStore, match_where
+
+DIM = 16
+
+
+class HashEmbeddings:
+    # Metinden deterministik, normalize vektör üreten sahte embedder.
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        rng = np.random.default_rng(seed)
+        vector = rng.standard_normal(DIM).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+GENRES = ["dram", "komedi", "korku", "bilim kurgu"]
+
+WHERE_CASES = [
+    {"genre": "dram"},
+    {"genre": {"$eq": "komedi"}},
+    {"genre": {"$ne": "dram"}},
+    {"genre": {"$in": ["korku", "bilim kurgu"]}},
+    {"genre": {"$nin": ["dram", "komedi"]}},
+    {"rating": {"$gt": 7}},
+    {"rating": {"$gte": 7.5}},
+    {"rating": {"$lt": 5}},
+    {"rating": {"$lte": 5.5}},
+    {"rating": {"$gte": 5, "$lt": 8}},
+    {"genre_dram": True},
+    {"type": "review", "genre": "korku"},
+    {"$and": [{"type": "description"}, {"rating": {"$gte": 6}}]},
+    {"$or": [{"genre": "komedi"}, {"rating": {"$gte": 9}}]},
+    {"$and": [{"$or": [{"genre": "dram"}, {"genre": "korku"}]}, {"movie_id": {"$in": ["m1", "m2", "m3"]}}]},
+    {"missing_field": "x"},
+]
+
+
+def _records(n, seed=0):
+    # Bazı alanları eksik, karışık tipli metadata'lar (puanı olmayan filmler, bool bayraklar).
+    rng = random.Random(seed)
+    records = []
+    for i in range(n):
+        genre = rng.choice(GENRES)
+        meta = {"movie_id": f"m{i % 7}", "type": rng.choice(["review", "description"]), "genre": genre,
+                f"genre_{genre.replace(' ', '_')}": True}
+        if rng.random() < 0.8:
+            meta["rating"] = round(rng.uniform(3, 10), 1)
+        records.append((f"c{i}", f"{genre} film yorumu {i}", meta))
+    return records
+
+
+def _store(path, dtype="float16", **kwargs):
+    return MmapVectorStore(str(path), embedding_function=HashEmbeddings(), dtype=dtype, **kwargs)
+
+
+def _add(store, records):
+    ids, texts, metas = zip(*records)
+    store.add_texts(list(texts), metadatas=list(metas), ids=list(ids))
+
+
+def _expected(records, where):
+    return {chunk_id for chunk_id, _, meta in records if match_where(meta, where)}
+
+
+def test_persist_delete_and_reupsert(tmp_path):
+    store = _store(tmp_path)
+    records = _records(30)
+    _add(store, records)
+    store.persist()
+    assert store.count() == 30
+
+    store.delete(ids=["c0", "c1"])
+    _add(store, [("c2", "güncellenmiş metin", {"movie_id": "m9", "type": "review"})])
+    # Yazmalar persist'ten önce de görünür.
+    assert store.count() == 28
+    assert store.get(ids=["c0", "c1"])["ids"] == []
+    assert store.get(ids=["c2"])["documents"] == ["güncellenmiş metin"]
+    store.persist()
+
+    reopened = _store(tmp_path)
+    assert reopened.count() == 28
+    assert reopened.get(ids=["c0", "c1"])["ids"] == []
+    got = reopened.get(ids=["c2", "c3"])
+    assert got["ids"] == ["c2", "c3"]
+    assert got["documents"][0] == "güncellenmiş metin"
+    assert got["metadatas"][0] == {"movie_id": "m9", "type": "review"}
+    assert got["documents"][1] == records[3][1]
+    # Güncellenen kaydın eski metadata'sı sütun indeksinden de düşmüş olmalı.
+    assert "c2" not in reopened.get(where={"genre": records[2][2]["genre"]})["ids"]
+
+    # Silinen id aynı depoya yeniden eklenebilir.
+    _add(reopened, [records[0]])
+    reopened.persist()
+    assert _store(tmp_path).get(ids=["c0"])["documents"] == [records[0][1]]
+
+    # Kayıt kendi metniyle arandığında ilk sırada gelir.
+    hits = reopened.similarity_search_with_score(records[5][1], k=3)
+    assert hits[0][0].id == "c5"
+    assert hits[0][1] == pytest.approx(1.0, abs=1e-2)
+
+
+@pytest.mark.parametrize("where", WHERE_CASES)
+def test_where_matches_match_where(tmp_path, where):
+    records = _records(60)
+    store = _store(tmp_path)
+    # Yarısı diskte, yarısı bekleyen yazma: iki yol da aynı anlamı vermeli.
+    _add(store, records[:30])
+    store.persist()
+    _add(store, records[30:])
+    assert set(store.get(where=where)["ids"]) == _expected(records, where)
+
+    store.persist()
+    assert set(store.get(where=where)["ids"]) == _expected(records, where)
+
+    # Silme sonrası sütunlar yeni satır numaralarına taşınır.
+    store.delete(ids=[f"c{i}" for i in range(0, 60, 3)])
+    store.persist()
+    alive = [r for i, r in enumerate(records) if i % 3]
+    assert set(_store(tmp_path).get(where=where)["ids"]) == _expected(alive, where)
+
+    # Arama da aynı filtreyi uygular.
+    hits = store.similarity_search_by_vector(HashEmbeddings().embed_query("sorgu"), k=100, filter=where)
+    assert {doc.id for doc in hits} == _expected(alive, where)
+
+
+def test_retype_float16_int8(tmp_path):
+    records = _records(40)
+    store = _store(tmp_path, dtype="float16")
+    _add(store, records)
+    store.persist()
+    before = np.asarray(store.get(include=["embeddings"])["embeddings"])
+
+    as_int8 = _store(tmp_path, dtype="int8")
+    as_int8.persist()
+    assert as_int8._vectors.dtype == np.int8
+    after = np.asarray(_store(tmp_path, dtype="int8").get(include=["embeddings"])["embeddings"])
+    assert after.shape == before.shape
+    assert np.allclose(after, before, atol=0.02)
+    query = HashEmbeddings().embed_query(records[7][1])
+    assert as_int8.similarity_search_by_vector(query, k=1)[0].id == "c7"
+
+    back = _store(tmp_path, dtype="float16")
+    back.persist()
+    assert back._vectors.dtype == np.float16
+    assert back._scales is None
+    assert np.allclose(np.asarray(back.get(include=["embeddings"])["embeddings"]), before, atol=0.02)
+    assert back.get(ids=["c7"])["metadatas"] == [records[7][2]]
+
+
+def test_second_instance_sees_new_generations(tmp_path):
+    writer = _store(tmp_path)
+    _add(writer, _records(10))
+    writer.persist()
+    reader = _store(tmp_path)
+    assert reader.count() == 10
+
+    # Art arda (aynı mtime dilimine düşebilecek) iki persist de okuyucuya yansır.
+    writer.delete(ids=["c0"])
+    writer.persist()
+    _add(writer, [("n1", "yeni kayıt", {"movie_id": "m1", "type": "review"})])
+    writer.persist()
+    assert reader.count() == 10
+    assert reader.get(ids=["n1"])["documents"] == ["yeni kayıt"]
+    assert reader.get(ids=["c0"])["ids"] == []
+
+
+def test_reload_retries_when_generation_is_replaced(tmp_path):
+    writer = _store(tmp_path)
+    _add(writer, _records(10))
+    writer.persist()
+    reader = _store(tmp_path)
+
+    writer.delete(ids=["c0"])
+    writer.persist()
+
+    # Okuyucu manifest'te N. nesli gördükten sonra yazan süreç N+1'i yayınlayıp N'i siler.
+    load = reader._load_generation
+    raced = []
+
+    def racing_load(manifest):
+        if not raced:
+            raced.append(manifest["generation"])
+            writer.delete(ids=["c1"])
+            writer.persist()
+        return load(manifest)
+
+    reader._load_generation = racing_load
+    assert reader.count() == 8
+    assert reader._generation == raced[0] + 1
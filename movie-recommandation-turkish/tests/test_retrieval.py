@@ -0,0 +1,116 @@
+# Hibrit aramanın füzyon adımı (retrieval.rrf_fuse) ve aday filmlerle sınırlı chunk araması
+# (retrieval._vector_candidates) için testler.
+
+import asyncio
+
+from langchain_core.documents import Document
+
+import retrieval
+from mmap_store import match_where
+from retrieval import rrf_fuse
+
+
+def _chroma_hit(text: str, movie_id: str) -> Document:
+    # Chroma'nın vektör araması Document'lara id koymaz.
+    return Document(page_content=text, metadata={"movie_id": movie_id, "type": "review"})
+
+
+def _bm25_hit(chunk_id: str, text: str, movie_id: str) -> Document:
+    # BM25 sonuçları (`_fetch_by_ids`) gerçek chunk id'sini taşır.
+    return Document(id=chunk_id, page_content=text, metadata={"movie_id": movie_id, "type": "review"})
+
+
+def test_same_chunk_from_both_searches_is_fused_once():
+    shared_text = "Görsel efektler muhteşem, hikaye biraz zayıf."
+    vector_docs = [_chroma_hit("Sadece vektör aramasında.", "m1"), _chroma_hit(shared_text, "m2")]
+    lexical_docs = [_bm25_hit("c-9", "Sadece BM25 aramasında.", "m3"), _bm25_hit("c-2", shared_text, "m2")]
+
+    fused = rrf_fuse([vector_docs, lexical_docs], k=10)
+
+    shared = [d for d in fused if d.page_content == shared_text]
+    assert len(shared) == 1
+    # İki listede de 2. sırada; skorlar toplanınca (2 / (RRF_K + 2)) tek listede birinci
+    # olan adayların (1 / (RRF_K + 1)) önüne geçer.
+    assert fused[0] is shared[0]
+    # Kopyalardan chunk id'sini taşıyan tutulur.
+    assert shared[0].id == "c-2"
+    assert len(fused) == 3
+
+
+def test_duplicate_chunk_does_not_fill_per_movie_slots():
+    shared_text = "Oyunculuklar çok iyi."
+    vector_docs = [_chroma_hit(shared_text, "m1"), _chroma_hit("Müzikleri akılda kalıcı.", "m1")]
+    lexical_docs = [_bm25_hit("c-1", shared_text, "m1")]
+
+    fused = rrf_fuse([vector_docs, lexical_docs], k=6, per_movie=2)
+
+    assert [d.page_content for d in fused] == [shared_text, "Müzikleri akılda kalıcı."]
+
+
+class _FakeChunkStore:
+    # Skoru metadata'da duran chunk'ları `where` filtresiyle (mmap_store.match_where) döndüren
+    # sahte vektör deposu; yapılan aramaların filtrelerini kaydeder.
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.filters = []
+
+    @property
+    def vectorstore(self):
+        return self
+
+    def similarity_search_by_vector(self, vector, k=4, filter=None):
+        self.filters.append(filter)
+        hits = [d for d in self.docs if filter is None or match_where(d.metadata, filter)]
+        return sorted(hits, key=lambda d: d.metadata["score"], reverse=True)[:k]
+
+
+class _FakeEmbedding:
+    def embed_query(self, text):
+        return [1.0]
+
+    async def aembed_query(self, text):
+        return [1.0]
+
+
+def _chunk(movie_id: str, i: int, score: float) -> Document:
+    return Document(page_content=f"{movie_id} yorum {i}",
+                    metadata={"movie_id": movie_id, "type": "review", "score": score})
+
+
+def test_review_heavy_candidate_does_not_starve_other_movies(monkeypatch):
+    # m1'in çok sayıda yüksek skorlu yorumu ortak `$in` aramasını tamamen doldurur.
+    chunks = [_chunk("m1", i, 0.9) for i in range(100)]
+    chunks += [_chunk(movie_id, i, 0.5 - i / 10) for movie_id in ("m2", "m3") for i in range(3)]
+    movies = _FakeChunkStore([Document(page_content=m, metadata={"movie_id": m, "score": s})
+                              for m, s in (("m2", 0.8), ("m1", 0.7), ("m3", 0.6))])
+    store = _FakeChunkStore(chunks)
+    monkeypatch.setattr(retrieval, "get_embedding", _FakeEmbedding)
+    monkeypatch.setattr(retrieval, "get_movie_level_store", lambda: movies)
+    monkeypatch.setattr(retrieval, "get_movie_retriever", lambda: store)
+
+    expected = ["m2 yorum 0", "m2 yorum 1", "m1 yorum 0", "m1 yorum 1", "m3 yorum 0", "m3 yorum 1"]
+    for run in (lambda: retrieval._vector_candidates("q", None, None),
+                lambda: asyncio.run(retrieval._avector_candidates("q", None, None))):
+        store.filters.clear()
+        docs = run()
+        assert [d.page_content for d in docs] == expected
+        # Bir ortak arama, sonra sadece boş kalan iki film için ayrı aramalar.
+        assert store.filters[0] == {"movie_id": {"$in": ["m2", "m1", "m3"]}}
+        assert sorted(f["movie_id"] for f in store.filters[1:]) == ["m2", "m3"]
+
+
+def test_overfetch_covers_all_candidates_in_one_search(monkeypatch):
+    chunks = [_chunk("m1", i, 0.9) for i in range(5)]
+    chunks += [_chunk(movie_id, i, 0.5 - i / 10) for movie_id in ("m2", "m3") for i in range(3)]
+    movies = _FakeChunkStore([Document(page_content=m, metadata={"movie_id": m, "score": 1.0})
+                              for m in ("m1", "m2", "m3")])
+    store = _FakeChunkStore(chunks)
+    monkeypatch.setattr(retrieval, "get_embedding", _FakeEmbedding)
+    monkeypatch.setattr(retrieval, "get_movie_level_store", lambda: movies)
+    monkeypatch.setattr(retrieval, "get_movie_retriever", lambda: store)
+
+    docs = retrieval._vector_candidates("q", None, None)
+
+    assert [d.metadata["movie_id"] for d in docs] == ["m1", "m1", "m2", "m2", "m3", "m3"]
+    assert len(store.filters) == 1
@@ -0,0 +1,107 @@
+# Anlık görüntülerin (snapshots.py) temizliği ve sıcak geçişi için testler: başka bir sürecin
+# kiraladığı sürümler ve yayını süren `.tmp-*` dizinleri silinmez, eski sürüm son okuyucusu
+# bırakınca kapatılır.
+
+import os
+import time
+import hashlib
+
+import numpy as np
+import pytest
+
+import resources
+import snapshots
+from mmap_store import MmapVectorStore
+
+
+class HashEmbeddings:
+    # Metinden deterministik, normalize vektör üreten sahte embedder.
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        vector = np.random.default_rng(seed).standard_normal(8).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    # Çalışma dizini (./.chroma/...) geçici dizindir; mmap arka ucuyla küçük bir indeks kurulur.
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(resources, "vector_backend", "mmap")
+    resources.get_embedding.override(HashEmbeddings())
+    for name in (resources.collection_name, resources.movie_collection_name):
+        store = MmapVectorStore(os.path.join(resources.mmap_db_path, name), embedding_function=HashEmbeddings())
+        store.add_texts(["güzel bir film"], metadatas=[{"movie_id": "m1", "type": "review"}], ids=["c1"])
+        store.persist()
+    yield str(tmp_path / "snapshots")
+    resources.get_embedding.override(None)
+
+
+def _age(path: str, seconds: float) -> None:
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_gc_keeps_leased_previous_and_fresh_tmp(root):
+    v1 = snapshots.publish_snapshot(root=root, keep=0)
+    # v1'i başka bir süreç (sunucu) açmış: canlı kira dosyası.
+    lease = snapshots._write_lease(root, v1)
+    v2 = snapshots.publish_snapshot(root=root, keep=0)
+    v3 = snapshots.publish_snapshot(root=root, keep=0)
+    assert snapshots.list_snapshots(root) == [v1, v2, v3]
+
+    # Kirası düşen v1 ve bir önceki etkin sürüm olmaktan çıkan v2 bir sonraki yayında silinir.
+    _age(lease, snapshots.LEASE_TTL_SECONDS + 1)
+    fresh_tmp = os.path.join(root, snapshots.TMP_PREFIX + "yayinda")
+    stale_tmp = os.path.join(root, snapshots.TMP_PREFIX + "cokmus")
+    os.makedirs(fresh_tmp)
+    os.makedirs(stale_tmp)
+    _age(stale_tmp, snapshots.STALE_TMP_SECONDS + 1)
+    v4 = snapshots.publish_snapshot(root=root, keep=0)
+
+    assert snapshots.list_snapshots(root) == [v3, v4]
+    assert os.path.isdir(fresh_tmp)
+    assert not os.path.exists(stale_tmp)
+    assert not os.path.exists(lease)
+
+
+def test_retired_snapshot_closes_when_last_reader_releases(root):
+    snapshots.publish_snapshot(root=root)
+    manager = snapshots.SnapshotManager(root)
+    old = manager.acquire()
+    assert old is not None and old.readers == 1
+
+    snapshots.publish_snapshot(root=root)
+    assert manager.refresh()
+    new = manager.get()
+    assert new is not old
+    # Süren istek eski sürümle devam eder; sürüm kiralı olduğu için başka süreçte de silinmez.
+    assert not old.closed
+    assert old.version in snapshots.leased_versions(root)
+
+    manager.release(old)
+    assert old.closed
+    assert old.version not in snapshots.leased_versions(root)
+
+    # Okuyucusu olmayan sürüm geçişte hemen kapatılır.
+    snapshots.publish_snapshot(root=root)
+    assert manager.refresh()
+    assert new.closed
+
+
+def test_snapshot_lease_pins_version_for_the_request(root, monkeypatch):
+    snapshots.publish_snapshot(root=root)
+    manager = snapshots.SnapshotManager(root)
+    monkeypatch.setattr(resources, "_snapshot_manager", manager)
+
+    with resources.snapshot_lease():
+        pinned = resources.active_snapshot()
+        snapshots.publish_snapshot(root=root)
+        manager.refresh()
+        assert resources.active_snapshot() is pinned
+        assert not pinned.closed
+    assert pinned.closed
+    assert resources.active_snapshot() is manager.get() is not pinned
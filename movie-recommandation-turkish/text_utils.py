@@ -0,0 +1,37 @@
+# Bu dosya, Türkçe metinler için proje genelinde kullanılan küçük normalizasyon
+# yardımcılarını içerir (büyük/küçük harf, aksan/diakritik katlama, anahtar üretimi).
+# Sorgu anlama, metadata filtreleri ve sözlük tabanlı aramalar aynı kuralları
+# kullansın diye tek yerde tutuyoruz.
+
+import re
+
+
+# Türkçe'ye özgü harflerin ASCII karşılıkları. "Şahin" ile "sahin" veya
+# "Gölge" ile "golge" yazımlarının aynı anahtara düşmesi için kullanılır.
+_FOLD_TABLE = str.maketrans({
+    "ç": "c", "ğ": "g", "ı": "i", "ö": "o", "ş": "s", "ü": "u",
+    "â": "a", "î": "i", "û": "u",
+})
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def lower_tr(text: str) -> str:
+    # Python'un lower() fonksiyonu Türkçe I/İ harflerini yanlış çevirir.
+    return text.replace("I", "ı").replace("İ", "i").lower()
+
+
+def fold_tr(text: str) -> str:
+    # Küçük harfe çevirip Türkçe karakterleri ASCII karşılıklarına indirger.
+    return lower_tr(text).translate(_FOLD_TABLE)
+
+
+def normalize_phrase(text: str) -> str:
+    # Karşılaştırma için: katlanmış, harf/rakam dışı karakterleri tek boşluğa indirgenmiş metin.
+    # "Bilim-Kurgu" → "bilim kurgu", "James  Cameron" → "james cameron"
+    return _NON_ALNUM.sub(" ", fold_tr(text).replace("'", "").replace("’", "")).strip()
+
+
+def slugify(text: str) -> str:
+    # Metadata anahtarlarında kullanılabilecek güvenli kimlik: "Bilim Kurgu" → "bilim_kurgu"
+    return normalize_phrase(text).replace(" ", "_")